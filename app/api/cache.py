@@ -0,0 +1,237 @@
+import sqlite3
+import time
+import types
+from collections.abc import Callable
+
+import pydantic
+import structlog
+
+from app import metrics
+from app.api import client, models
+
+USE_CACHE = "use"
+REFRESH_CACHE = "refresh"
+BYPASS_CACHE = "bypass"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lookups (
+    namespace TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    response TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, identifier)
+);
+CREATE INDEX IF NOT EXISTS lookups_accessed_at ON lookups (accessed_at);
+"""
+_COMMIT_EVERY = 1000
+_FULL_PAYLOAD_SUFFIX = "+full"
+
+
+class LookupCache:
+    """SQLite-backed store of lookup responses.
+
+    Entries older than ``ttl`` seconds are treated as missing, and once the
+    cache holds more than ``max_entries`` the least recently used entries
+    are evicted. Writes are committed in batches, and the access times of
+    hits are only written with them. With ``keep_full_payload`` whole
+    responses are stored apart from the lean ones, so a hit returns every
+    attribute a lookup would.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float,
+        max_entries: int,
+        clock: Callable[[], float] = time.time,
+        keep_full_payload: bool = False,
+    ) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._clock = clock
+        self._response_model = (
+            models.FullLookupResponse if keep_full_payload else models.LookupResponse
+        )
+        self._namespace_suffix = _FULL_PAYLOAD_SUFFIX if keep_full_payload else ""
+        self._accessed: dict[tuple[str, str], float] = {}
+        self._uncommitted = 0
+
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._size = self._connection.execute(
+            "SELECT COUNT(*) FROM lookups",
+        ).fetchone()[0]
+        self._logger = structlog.get_logger(__name__)
+
+    def __enter__(self) -> "LookupCache":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: types.TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(self, namespace: str, identifier: str) -> models.LookupResponse | None:
+        namespace += self._namespace_suffix
+        row = self._connection.execute(
+            "SELECT response, stored_at FROM lookups"
+            " WHERE namespace = ? AND identifier = ?",
+            (namespace, identifier),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        response, stored_at = row
+        now = self._clock()
+
+        if now - stored_at > self._ttl:
+            self._delete(namespace, identifier)
+            return None
+
+        try:
+            cached_response = self._response_model.model_validate_json(response)
+        except pydantic.ValidationError:
+            self._logger.warning(
+                "Dropping unreadable cache entry {0}".format(identifier),
+            )
+            self._delete(namespace, identifier)
+
+            return None
+
+        self._accessed[namespace, identifier] = now
+
+        if len(self._accessed) >= _COMMIT_EVERY:
+            self._commit()
+
+        return cached_response
+
+    def put(
+        self,
+        namespace: str,
+        identifier: str,
+        response: models.LookupResponse,
+    ) -> None:
+        namespace += self._namespace_suffix
+        now = self._clock()
+        serialized = response.model_dump_json(by_alias=True)
+        inserted = self._connection.execute(
+            "INSERT OR IGNORE INTO lookups VALUES (?, ?, ?, ?, ?)",
+            (namespace, identifier, serialized, now, now),
+        ).rowcount
+
+        if inserted:
+            self._size += 1
+        else:
+            self._accessed.pop((namespace, identifier), None)
+            self._connection.execute(
+                "UPDATE lookups SET response = ?, stored_at = ?, accessed_at = ?"
+                " WHERE namespace = ? AND identifier = ?",
+                (serialized, now, now, namespace, identifier),
+            )
+
+        if self._size > self._max_entries:
+            self._write_access_times()
+            self._evict(self._size - self._max_entries)
+
+        self._uncommitted += 1
+
+        if self._uncommitted >= _COMMIT_EVERY:
+            self._commit()
+
+    def close(self) -> None:
+        self._commit()
+        self._connection.close()
+
+    def _commit(self) -> None:
+        self._write_access_times()
+        self._connection.commit()
+        self._uncommitted = 0
+
+    def _write_access_times(self) -> None:
+        self._connection.executemany(
+            "UPDATE lookups SET accessed_at = ?"
+            " WHERE namespace = ? AND identifier = ?",
+            [
+                (accessed_at, namespace, identifier)
+                for (namespace, identifier), accessed_at in self._accessed.items()
+            ],
+        )
+        self._accessed.clear()
+
+    def _delete(self, namespace: str, identifier: str) -> None:
+        self._accessed.pop((namespace, identifier), None)
+        self._size -= self._connection.execute(
+            "DELETE FROM lookups WHERE namespace = ? AND identifier = ?",
+            (namespace, identifier),
+        ).rowcount
+
+    def _evict(self, count: int) -> None:
+        self._size -= self._connection.execute(
+            "DELETE FROM lookups WHERE rowid IN"
+            " (SELECT rowid FROM lookups ORDER BY accessed_at LIMIT ?)",
+            (count,),
+        ).rowcount
+
+
+class CachedLookupClient(client.LookupClient):
+    """Answers lookups from a ``LookupCache`` before asking ``lookup_client``.
+
+    ``mode`` is one of ``use`` (read and write the cache), ``refresh`` (only
+    write fresh responses) and ``bypass`` (leave the cache untouched).
+    """
+
+    def __init__(
+        self,
+        lookup_client: client.LookupClient,
+        cache: LookupCache,
+        namespace: str,
+        mode: str = USE_CACHE,
+    ) -> None:
+        self._client = lookup_client
+        self._cache = cache
+        self._namespace = namespace
+        self._mode = mode
+        self._hits = 0
+        self._misses = 0
+        self._logger = structlog.get_logger(__name__)
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        if self._mode == USE_CACHE:
+            cached_response = self._cache.get(self._namespace, identifier)
+
+            if cached_response is not None:
+                self._hits += 1
+                metrics.get_metrics().increment("cache_lookups_total", result="hit")
+                return cached_response
+
+        self._misses += 1
+        metrics.get_metrics().increment("cache_lookups_total", result="miss")
+        response = await self._client.lookup(identifier)
+
+        if self._mode != BYPASS_CACHE:
+            self._cache.put(self._namespace, identifier, response)
+
+        return response
+
+    def log_stats(self) -> None:
+        lookups = self._hits + self._misses
+
+        self._logger.info(
+            "Lookup cache stats",
+            namespace=self._namespace,
+            mode=self._mode,
+            hits=self._hits,
+            misses=self._misses,
+            hit_rate=round(self._hits / lookups, 4) if lookups else None,
+            entries=len(self._cache),
+        )
@@ -0,0 +1,125 @@
+import contextlib
+import pathlib
+import sqlite3
+
+from app import conftest
+from app.api import cache, client, models
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _CountingLookupClient(client.LookupClient):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        self.calls += 1
+
+        return _make_response(identifier)
+
+
+def _make_response(identifier: str) -> models.LookupResponse:
+    return conftest.make_response(identifier, malicious=1, harmless=10)
+
+
+def test_cache_expires_entries(tmp_path: pathlib.Path) -> None:
+    clock = _FakeClock()
+
+    with cache.LookupCache(
+        str(tmp_path / "cache.db"), ttl=10, max_entries=10, clock=clock
+    ) as lookup_cache:
+        lookup_cache.put("ip_address", "127.0.0.1", _make_response("127.0.0.1"))
+
+        assert lookup_cache.get("ip_address", "127.0.0.1") == _make_response(
+            "127.0.0.1"
+        )
+        assert lookup_cache.get("url", "127.0.0.1") is None
+
+        clock.now = 11
+
+        assert lookup_cache.get("ip_address", "127.0.0.1") is None
+        assert len(lookup_cache) == 0
+
+
+def test_cache_evicts_least_recently_used(tmp_path: pathlib.Path) -> None:
+    clock = _FakeClock()
+
+    with cache.LookupCache(
+        str(tmp_path / "cache.db"), ttl=100, max_entries=2, clock=clock
+    ) as lookup_cache:
+        for tick, identifier in enumerate(["127.0.0.1", "127.0.0.2"]):
+            clock.now = tick
+            lookup_cache.put("ip_address", identifier, _make_response(identifier))
+
+        clock.now = 2
+        lookup_cache.get("ip_address", "127.0.0.1")
+        clock.now = 3
+        lookup_cache.put("ip_address", "127.0.0.3", _make_response("127.0.0.3"))
+
+        assert lookup_cache.get("ip_address", "127.0.0.2") is None
+        assert lookup_cache.get("ip_address", "127.0.0.1") is not None
+        assert len(lookup_cache) == 2
+
+
+async def test_cached_client_skips_network_on_hit(tmp_path: pathlib.Path) -> None:
+    inner_client = _CountingLookupClient()
+
+    with cache.LookupCache(
+        str(tmp_path / "cache.db"), ttl=100, max_entries=10
+    ) as lookup_cache:
+        cached_client = cache.CachedLookupClient(
+            lookup_client=inner_client,
+            cache=lookup_cache,
+            namespace="ip_address",
+        )
+
+        await cached_client.lookup("127.0.0.1")
+        response = await cached_client.lookup("127.0.0.1")
+
+    assert inner_client.calls == 1
+    assert response.data.identifier == "127.0.0.1"
+
+
+def test_cache_commits_writes_in_batches(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / "cache.db")
+
+    def stored_entries() -> int:
+        with contextlib.closing(sqlite3.connect(path)) as connection:
+            return connection.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
+
+    with cache.LookupCache(path, ttl=100, max_entries=10) as lookup_cache:
+        lookup_cache.put("ip_address", "127.0.0.1", _make_response("127.0.0.1"))
+
+        assert stored_entries() == 0
+
+    assert stored_entries() == 1
+
+
+def test_full_payload_is_cached_apart(tmp_path: pathlib.Path) -> None:
+    payload = _make_response("127.0.0.1").model_dump(by_alias=True)
+    payload["data"]["attributes"]["whois"] = "NetRange: 127.0.0.0 - 127.255.255.255"
+    full_response = models.FullLookupResponse.model_validate(payload)
+    path = str(tmp_path / "cache.db")
+
+    with cache.LookupCache(path, ttl=100, max_entries=10) as lookup_cache:
+        lookup_cache.put("ip_address", "127.0.0.1", _make_response("127.0.0.1"))
+
+    with cache.LookupCache(
+        path, ttl=100, max_entries=10, keep_full_payload=True
+    ) as lookup_cache:
+        assert lookup_cache.get("ip_address", "127.0.0.1") is None
+
+        lookup_cache.put("ip_address", "127.0.0.1", full_response)
+        cached_response = lookup_cache.get("ip_address", "127.0.0.1")
+
+    assert cached_response == full_response
+    assert cached_response is not None
+    assert cached_response.data.attributes.model_extra == {
+        "whois": "NetRange: 127.0.0.0 - 127.255.255.255",
+    }
@@ -1,102 +1,658 @@
 import abc
 import asyncio
 import base64
-from collections.abc import Sequence
+import collections
+import dataclasses
+import itertools
+import time
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    Sequence,
+)
 from typing import cast
 
 import httpx
 import structlog
 
-from app import managers
-from app.api import models
+from app import managers, metrics
+from app.api import concurrency, key_pool, models, rate_limit
 
+DEFAULT_API_URL = "https://www.virustotal.com"
+SLIDING_WINDOW_SCHEDULER = "sliding-window"
+GROUPED_SCHEDULER = "grouped"
+ADAPTIVE_SCHEDULER = "adaptive"
+
+_STREAM_WINDOW_FACTOR = 4
+
+_LookupOutcome = models.LookupResult | Exception
+
+
+class NotFoundError(httpx.HTTPStatusError):
+    """VirusTotal has no object for the identifier, e.g. an unknown file.
+
+    ``source`` tells where the identifier was read from when it's known.
+    """
+
+    source: str | None = None
+
+
+class LookupClient(abc.ABC):
+    @abc.abstractmethod
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        pass
+
+
+class VirusTotalClient(LookupClient):
+    _endpoint_name: str
 
-class VirusTotalClient(abc.ABC):
     def __init__(
         self,
         http_client: httpx.AsyncClient,
-        api_key: str,
+        api_key: str | key_pool.ApiKeyPool,
+        retry_policy: rate_limit.RetryPolicy | None = None,
+        keep_full_payload: bool = False,
+        api_url: str = DEFAULT_API_URL,
     ) -> None:
         self._client = http_client
-        self._api_key = api_key
+        self._api_url = api_url.rstrip("/")
+        self._response_model = (
+            models.FullLookupResponse if keep_full_payload else models.LookupResponse
+        )
+
+        if isinstance(api_key, str):
+            api_key = key_pool.ApiKeyPool([api_key])
+
+        self._key_pool = api_key
+        self._retry_policy = retry_policy or rate_limit.RetryPolicy()
+        self._logger = structlog.get_logger(__name__)
 
         self._default_headers = {
             "accept": "application/json",
-            "x-apikey": self._api_key,
         }
 
-    @abc.abstractmethod
-    async def lookup(self, identifier: str) -> models.LookupResponse:
-        pass
+    async def _get(self, url: str) -> httpx.Response:
+        for attempt in itertools.count():
+            api_key = await self._key_pool.acquire()
+
+            started_at = time.perf_counter()
+            response = await self._client.get(
+                url=url,
+                headers={**self._default_headers, "x-apikey": api_key},
+            )
+            metrics.get_metrics().observe(
+                "request_duration_seconds",
+                time.perf_counter() - started_at,
+                endpoint=self._endpoint_name,
+                status=response.status_code,
+            )
+            self._key_pool.report(api_key, response.status_code)
+            concurrency.report_response(response)
+
+            if attempt >= self._retry_policy.max_retries:
+                break
+
+            if response.status_code == httpx.codes.UNAUTHORIZED:
+                # Another key may still be accepted.
+                if self._key_pool.has_active_keys():
+                    continue
+
+                break
+
+            if not self._retry_policy.is_retryable(response):
+                break
+
+            delay = self._retry_policy.delay(attempt, response)
+
+            if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+                self._key_pool.pause(api_key, delay)
+
+            metrics.get_metrics().increment(
+                "request_retries_total",
+                endpoint=self._endpoint_name,
+                status=response.status_code,
+            )
+            self._logger.warning(
+                "Retrying request",
+                url=url,
+                status_code=response.status_code,
+                attempt=attempt + 1,
+                delay_seconds=round(delay, 3),
+            )
+            await asyncio.sleep(delay)
+
+        if response.status_code == httpx.codes.NOT_FOUND:
+            raise NotFoundError(
+                "Not found: {0}".format(url),
+                request=response.request,
+                response=response,
+            )
+
+        response.raise_for_status()
+
+        return response
 
 
 class VirusTotalIpLookupClient(VirusTotalClient):
-    _ip_lookup_endpoint_template: str = (
-        "https://www.virustotal.com/api/v3/ip_addresses/{ip}"
-    )
+    _endpoint_name = "ip_addresses"
+    _ip_lookup_endpoint_template: str = "{api_url}/api/v3/ip_addresses/{ip}"
 
     async def lookup(self, identifier: str) -> models.LookupResponse:
-        response = await self._client.get(
-            url=self._ip_lookup_endpoint_template.format(ip=identifier),
-            headers=self._default_headers,
+        response = await self._get(
+            url=self._ip_lookup_endpoint_template.format(
+                api_url=self._api_url,
+                ip=identifier,
+            ),
         )
 
-        response.raise_for_status()
-
-        return models.LookupResponse(**response.json())
+        return self._response_model.model_validate_json(response.content)
 
 
 class VirusTotalUrlLookupClient(VirusTotalClient):
-    _url_lookup_endpoint_template: str = "https://www.virustotal.com/api/v3/urls/{url}"
+    _endpoint_name = "urls"
+    _url_lookup_endpoint_template: str = "{api_url}/api/v3/urls/{url}"
 
     async def lookup(self, identifier: str) -> models.LookupResponse:
-        response = await self._client.get(
+        response = await self._get(
             url=self._url_lookup_endpoint_template.format(
-                url=base64.b64encode(identifier.encode()).decode()
+                api_url=self._api_url,
+                url=base64.b64encode(identifier.encode()).decode(),
             ),
-            headers=self._default_headers,
         )
 
-        response.raise_for_status()
+        return self._response_model.model_validate_json(response.content)
+
 
-        return models.LookupResponse(**response.json())
+class VirusTotalFileLookupClient(VirusTotalClient):
+    _endpoint_name = "files"
+    _file_lookup_endpoint_template: str = "{api_url}/api/v3/files/{hash}"
 
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        response = await self._get(
+            url=self._file_lookup_endpoint_template.format(
+                api_url=self._api_url,
+                hash=identifier,
+            ),
+        )
 
-class VirusTotalClientOrchestrator(managers.MultipleResourceLookuper):
-    def __init__(self, client: VirusTotalClient, group_max_size: int) -> None:
+        return self._response_model.model_validate_json(response.content)
+
+
+class SourcedLookupClient(LookupClient):
+    """Names the source of identifiers VirusTotal has no object for.
+
+    ``sources`` maps identifiers to where they were read from, e.g. hashes
+    to the files they were computed of. The entry of an identifier is
+    dropped once it's looked up, so only pending ones are kept.
+    """
+
+    def __init__(
+        self,
+        lookup_client: LookupClient,
+        sources: MutableMapping[str, str],
+    ) -> None:
+        self._client = lookup_client
+        self._sources = sources
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        try:
+            return await self._client.lookup(identifier)
+        except NotFoundError as ex:
+            ex.source = self._sources.get(identifier)
+            raise
+        finally:
+            self._sources.pop(identifier, None)
+
+
+class RoutingLookupClient(LookupClient):
+    """Sends every identifier to the client of its kind.
+
+    The clients are meant to share one HTTP client and API key pool, so a
+    mixed feed is looked up over the same connections and quota.
+    """
+
+    def __init__(
+        self,
+        clients: Mapping[str, LookupClient],
+        classify: Callable[[str], str | None],
+    ) -> None:
+        self._clients = clients
+        self._classify = classify
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        kind = self._classify(identifier)
+
+        if kind is None:
+            raise ValueError("Unsupported identifier {0}".format(identifier))
+
+        return await self._clients[kind].lookup(identifier)
+
+
+class PartialResultsLookuper(managers.MultipleResourceLookuper):
+    """A lookuper that tells which of the identifiers failed."""
+
+    async def lookup(
+        self,
+        identifiers: Sequence[str],
+    ) -> list[models.LookupResult]:
+        return [
+            response
+            for response in await self.lookup_each(identifiers)
+            if response is not None
+        ]
+
+    @abc.abstractmethod
+    async def lookup_each(
+        self,
+        identifiers: Sequence[str],
+    ) -> list[models.LookupResult | None]:
+        """Looks up every identifier, ``None`` stands for a failed lookup."""
+
+    @abc.abstractmethod
+    def iter_lookup_each(
+        self,
+        identifiers: AsyncIterable[str],
+    ) -> AsyncIterator[tuple[str, models.LookupResult | None]]:
+        """Streams identifiers with their results in the input order.
+
+        ``None`` stands for a failed lookup.
+        """
+
+
+class VirusTotalClientOrchestrator(
+    PartialResultsLookuper,
+    managers.StreamingResourceLookuper,
+):
+    """Runs lookups concurrently, at most ``group_max_size`` at a time.
+
+    The default sliding-window scheduler starts the next lookup as soon as
+    any in-flight one finishes, the grouped scheduler waits for a whole
+    group to finish before starting the next one. Compact results are
+    returned in the order of the given identifiers with any scheduler. The
+    adaptive scheduler is a sliding window whose size starts at
+    ``group_max_size`` and adapts to the health of the API, up to
+    ``adaptive_max_size``.
+
+    When streaming, at most four times the most lookups that may run at a
+    time, ``group_max_size`` or ``adaptive_max_size`` for the adaptive
+    scheduler, are started ahead of the oldest unfinished one, which bounds
+    the reordering buffer. The grouped scheduler streams one group at a time.
+    """
+
+    def __init__(
+        self,
+        client: LookupClient,
+        group_max_size: int,
+        scheduler: str = SLIDING_WINDOW_SCHEDULER,
+        adaptive_max_size: int = 50,
+    ) -> None:
         self._client = client
         self._group_max_size = group_max_size
+        self._scheduler = scheduler
+        self._concurrency_limit = (
+            concurrency.AimdConcurrencyLimit(
+                initial=group_max_size,
+                maximum=max(adaptive_max_size, group_max_size),
+            )
+            if scheduler == ADAPTIVE_SCHEDULER
+            else None
+        )
+        self._in_flight = 0
         self._logger = structlog.get_logger(__name__)
 
-    async def lookup(
+    async def lookup_each(
         self,
         identifiers: Sequence[str],
-    ) -> list[models.LookupResponse]:
-        responses = []
+    ) -> list[models.LookupResult | None]:
+        started_at = time.perf_counter()
+
+        if self._scheduler == GROUPED_SCHEDULER:
+            outcomes = await self._lookup_grouped(identifiers)
+        else:
+            outcomes = await self._lookup_sliding_window(identifiers)
+
+        responses: list[models.LookupResult | None] = []
+
+        for identifier, outcome in zip(identifiers, outcomes):
+            if isinstance(outcome, Exception):
+                self._log_failure(identifier, outcome)
+                responses.append(None)
+                continue
+
+            responses.append(outcome)
+
+        self._log_throughput(
+            lookups=len(outcomes),
+            succeeded=sum(response is not None for response in responses),
+            elapsed=time.perf_counter() - started_at,
+        )
+
+        return responses
+
+    async def iter_lookup(
+        self,
+        identifiers: AsyncIterable[str],
+    ) -> AsyncIterator[models.LookupResult]:
+        async for _, response in self.iter_lookup_each(identifiers):
+            if response is not None:
+                yield response
+
+    async def iter_lookup_each(
+        self,
+        identifiers: AsyncIterable[str],
+    ) -> AsyncIterator[tuple[str, models.LookupResult | None]]:
+        """Streams identifiers with their responses in the input order.
+
+        ``None`` stands for a failed lookup.
+        """
+        started_at = time.perf_counter()
+        semaphore = asyncio.Semaphore(self._group_max_size)
+        is_grouped = self._scheduler == GROUPED_SCHEDULER
+        window = self._max_concurrency() * (1 if is_grouped else _STREAM_WINDOW_FACTOR)
+        pending: collections.deque[tuple[str, asyncio.Task]] = collections.deque()
+        lookups = succeeded = 0
+
+        async def limited_lookup(identifier: str) -> models.LookupResult:
+            if self._concurrency_limit is not None:
+                return await self._adaptive_lookup(identifier)
+
+            async with semaphore:
+                return await self._tracked_lookup(identifier)
+
+        async def pop_result() -> tuple[str, models.LookupResult | None]:
+            nonlocal lookups, succeeded
+            identifier, task = pending.popleft()
+            lookups += 1
+
+            try:
+                response = await task
+            except Exception as ex:
+                self._log_failure(identifier, ex)
+                return identifier, None
+
+            succeeded += 1
+
+            return identifier, response
+
+        try:
+            async for identifier in identifiers:
+                pending.append(
+                    (identifier, asyncio.create_task(limited_lookup(identifier))),
+                )
+
+                if len(pending) >= window:
+                    drain_to = 0 if is_grouped else window - 1
+
+                    while len(pending) > drain_to:
+                        yield await pop_result()
+
+                while not is_grouped and pending and pending[0][1].done():
+                    yield await pop_result()
+
+            while pending:
+                yield await pop_result()
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+            self._log_throughput(
+                lookups=lookups,
+                succeeded=succeeded,
+                elapsed=time.perf_counter() - started_at,
+            )
+
+    async def _lookup_grouped(
+        self,
+        identifiers: Sequence[str],
+    ) -> list[_LookupOutcome]:
+        outcomes: list[_LookupOutcome] = []
 
         for i in range(0, len(identifiers), self._group_max_size):
             tasks = [
-                self._client.lookup(url)
+                self._tracked_lookup(url)
                 for url in identifiers[i : i + self._group_max_size]
             ]
 
-            group_responses = await asyncio.gather(
+            group_outcomes = await asyncio.gather(
                 *tasks,
                 return_exceptions=True,
             )
 
-            for response in group_responses:
-                if isinstance(response, Exception):
-                    self._logger.exception(
-                        "Lookup failed",
-                        exc_info=(
-                            type(response),
-                            response,
-                            response.__traceback__,
-                        ),
-                    )
-                    continue
+            outcomes.extend(cast(list[_LookupOutcome], group_outcomes))
+
+        return outcomes
+
+    async def _lookup_sliding_window(
+        self,
+        identifiers: Sequence[str],
+    ) -> list[_LookupOutcome]:
+        outcomes: list[_LookupOutcome | None] = [None] * len(identifiers)
+        pending = iter(enumerate(identifiers))
+        lookup = (
+            self._tracked_lookup
+            if self._concurrency_limit is None
+            else self._adaptive_lookup
+        )
+
+        async def worker() -> None:
+            # Every worker pulls from the same iterator, so a new lookup
+            # starts as soon as any of the in-flight ones finishes.
+            for index, identifier in pending:
+                try:
+                    outcomes[index] = await lookup(identifier)
+                except Exception as ex:
+                    outcomes[index] = ex
+
+        await asyncio.gather(
+            *(worker() for _ in range(min(self._max_concurrency(), len(identifiers))))
+        )
+
+        return cast(list[_LookupOutcome], outcomes)
+
+    async def _adaptive_lookup(self, identifier: str) -> models.LookupResult:
+        concurrency_limit = cast(
+            concurrency.AimdConcurrencyLimit,
+            self._concurrency_limit,
+        )
+        epoch = await concurrency_limit.acquire()
+        started_at = time.perf_counter()
+        error: BaseException | None = None
+
+        try:
+            with concurrency_limit.reporting(epoch):
+                return await self._tracked_lookup(identifier)
+        except BaseException as ex:
+            error = ex
+            raise
+        finally:
+            concurrency_limit.release(epoch, time.perf_counter() - started_at, error)
+
+    def _max_concurrency(self) -> int:
+        if self._concurrency_limit is None:
+            return self._group_max_size
+
+        return self._concurrency_limit.maximum
+
+    async def _tracked_lookup(self, identifier: str) -> models.LookupResult:
+        run_metrics = metrics.get_metrics()
+        self._in_flight += 1
+        run_metrics.set_gauge("lookups_in_flight", self._in_flight)
+
+        try:
+            response = await self._client.lookup(identifier)
+        except NotFoundError:
+            run_metrics.increment("lookups_total", outcome="not_found")
+            raise
+        except Exception:
+            run_metrics.increment("lookups_total", outcome="failure")
+            raise
+        finally:
+            self._in_flight -= 1
+            run_metrics.set_gauge("lookups_in_flight", self._in_flight)
+
+        run_metrics.increment("lookups_total", outcome="success")
+
+        # Only the compact result outlives the lookup, not the response graph.
+        return models.LookupResult.from_response(response)
+
+    def _log_failure(self, identifier: str, error: Exception) -> None:
+        if isinstance(error, NotFoundError):
+            # An expected answer, e.g. for files never uploaded to VirusTotal.
+            self._logger.info(
+                "Not found",
+                identifier=identifier,
+                **({"source": error.source} if error.source else {}),
+            )
+            return
+
+        self._logger.exception(
+            "Lookup failed",
+            identifier=identifier,
+            exc_info=(type(error), error, error.__traceback__),
+        )
+
+    def _log_throughput(self, lookups: int, succeeded: int, elapsed: float) -> None:
+        self._logger.info(
+            "Lookup run finished",
+            scheduler=self._scheduler,
+            concurrency=(
+                self._group_max_size
+                if self._concurrency_limit is None
+                else self._concurrency_limit.limit
+            ),
+            lookups=lookups,
+            succeeded=succeeded,
+            failed=lookups - succeeded,
+            elapsed_seconds=round(elapsed, 3),
+            lookups_per_second=round(lookups / elapsed, 2) if elapsed else None,
+        )
+
+
+class DeduplicatingLookuper(
+    managers.MultipleResourceLookuper,
+    managers.StreamingResourceLookuper,
+):
+    """Looks up every canonical identifier once.
+
+    The response of a canonical identifier is repeated for each of its
+    original spellings, labelled with that spelling, so the results still
+    cover every input identifier. When streaming, a result is only kept
+    while spellings read before it was passed on still wait for it, and
+    every result is passed on as soon as the ones of the identifiers before
+    it are. The results of the last ``window`` canonical identifiers are
+    remembered for their duplicates, duplicates further apart than that are
+    looked up again.
+    """
+
+    def __init__(
+        self,
+        orchestrator: PartialResultsLookuper,
+        canonicalize: Callable[[str], str],
+        window: int = 100_000,
+    ) -> None:
+        self._orchestrator = orchestrator
+        self._canonicalize = canonicalize
+        self._window = window
+        self._logger = structlog.get_logger(__name__)
+
+    async def lookup(
+        self,
+        identifiers: Sequence[str],
+    ) -> list[models.LookupResult]:
+        canonical_ids = [self._canonicalize(idf) for idf in identifiers]
+        unique_ids = list(dict.fromkeys(canonical_ids))
+        self._log_duplicates(len(canonical_ids) - len(unique_ids))
+
+        responses = dict(
+            zip(unique_ids, await self._orchestrator.lookup_each(unique_ids))
+        )
+        results: list[models.LookupResult] = []
+
+        for identifier, canonical_id in zip(identifiers, canonical_ids):
+            response = responses[canonical_id]
+
+            if response is not None:
+                results.append(_labelled(response, identifier))
+
+        return results
+
+    async def iter_lookup(
+        self,
+        identifiers: AsyncIterable[str],
+    ) -> AsyncIterator[models.LookupResult]:
+        # Identifiers of the input not passed on yet, with their canonical
+        # ones, in order.
+        waiting: collections.deque[tuple[str, str]] = collections.deque()
+        # How many of the waiting identifiers each canonical one stands for.
+        waiting_counts: collections.Counter[str] = collections.Counter()
+        # Results the waiting identifiers still need.
+        results: dict[str, models.LookupResult | None] = {}
+        # Results of the latest canonical identifiers, for later duplicates.
+        recent: collections.OrderedDict[str, models.LookupResult | None] = (
+            collections.OrderedDict()
+        )
+        read = looked_up = 0
+
+        async def unique_ids() -> AsyncIterator[str]:
+            nonlocal read, looked_up
+
+            async for identifier in identifiers:
+                read += 1
+                canonical_id = self._canonicalize(identifier)
+                is_started = canonical_id in waiting_counts
+
+                if not is_started and canonical_id in recent:
+                    recent.move_to_end(canonical_id)
+                    results[canonical_id] = recent[canonical_id]
+                    is_started = True
+
+                waiting.append((identifier, canonical_id))
+                waiting_counts[canonical_id] += 1
+
+                if not is_started:
+                    looked_up += 1
+                    yield canonical_id
+
+        def pop_ready() -> Iterator[models.LookupResult]:
+            while waiting and waiting[0][1] in results:
+                identifier, canonical_id = waiting.popleft()
+                result = results[canonical_id]
+                waiting_counts[canonical_id] -= 1
+
+                if not waiting_counts[canonical_id]:
+                    del waiting_counts[canonical_id]
+                    del results[canonical_id]
+
+                if result is not None:
+                    yield _labelled(result, identifier)
+
+        lookups = self._orchestrator.iter_lookup_each(unique_ids())
+
+        async for canonical_id, result in lookups:
+            results[canonical_id] = recent[canonical_id] = result
+
+            if len(recent) > self._window:
+                recent.popitem(last=False)
+
+            for ready_result in pop_ready():
+                yield ready_result
+
+        for ready_result in pop_ready():
+            yield ready_result
+
+        self._log_duplicates(read - looked_up)
+
+    def _log_duplicates(self, duplicates: int) -> None:
+        if duplicates:
+            self._logger.info("Skipping duplicate identifiers", duplicates=duplicates)
+
 
-                responses.append(response)
+def _labelled(result: models.LookupResult, identifier: str) -> models.LookupResult:
+    if result.identifier == identifier:
+        return result
 
-        return cast(list[models.LookupResponse], responses)
+    return dataclasses.replace(result, identifier=identifier)
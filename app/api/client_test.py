@@ -1,11 +1,15 @@
+import asyncio
+import collections
+import gc
 import logging
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Mapping
 
 import httpx
 import pytest
 import pytest_httpx
 
-from app import conftest, logger
-from app.api import client, models
+from app import conftest, logger, managers
+from app.api import client, models, rate_limit
 
 logger.configure_logger(False)
 
@@ -60,3 +64,295 @@ async def test_orchestrator_logs_on_failure(
         )
 
     assert "Lookup failed" in caplog.text
+
+
+async def test_unknown_file_is_logged_with_its_path(
+    httpx_mock: pytest_httpx.HTTPXMock,
+    caplog: pytest.LogCaptureFixture,
+    http_client: httpx.AsyncClient,
+) -> None:
+    sha256 = "a" * 64
+    httpx_mock.add_response(
+        url="https://www.virustotal.com/api/v3/files/{0}".format(sha256),
+        status_code=404,
+    )
+    sources = {sha256: "/data/unknown.bin"}
+    orchestrator = client.VirusTotalClientOrchestrator(
+        client=client.SourcedLookupClient(
+            lookup_client=client.VirusTotalFileLookupClient(
+                http_client=http_client,
+                api_key="",
+            ),
+            sources=sources,
+        ),
+        group_max_size=2,
+    )
+
+    with caplog.at_level(logging.INFO):
+        assert await orchestrator.lookup([sha256]) == []
+
+    assert "Not found" in caplog.text
+    assert "/data/unknown.bin" in caplog.text
+    assert "Traceback" not in caplog.text
+    assert not sources
+
+
+class _DelayedLookupClient(client.VirusTotalClient):
+    def __init__(
+        self,
+        delays: Mapping[str, float],
+        gates: dict[str, asyncio.Event] | None = None,
+    ) -> None:
+        self._delays = delays
+        self._gates = gates or {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lookups = 0
+        self.finished: list[str] = []
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        self.lookups += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self._delays[identifier])
+
+        if identifier in self._gates:
+            await self._gates[identifier].wait()
+
+        self.in_flight -= 1
+        self.finished.append(identifier)
+
+        return conftest.make_response(identifier)
+
+
+async def test_sliding_window_keeps_order_and_concurrency() -> None:
+    delays = {"slow": 0.0, "a": 0.0, "b": 0.0, "c": 0.0, "d": 0.0}
+    release_slow = asyncio.Event()
+    lookup_client = _DelayedLookupClient(delays, gates={"slow": release_slow})
+    orchestrator = client.VirusTotalClientOrchestrator(
+        client=lookup_client,
+        group_max_size=2,
+    )
+
+    lookup = asyncio.create_task(orchestrator.lookup(list(delays)))
+
+    async def fast_lookups_finished() -> None:
+        while len(lookup_client.finished) < 4:
+            await asyncio.sleep(0)
+
+    # The fast lookups run next to the slow one instead of waiting for it.
+    await asyncio.wait_for(fast_lookups_finished(), timeout=5)
+    release_slow.set()
+    responses = await lookup
+
+    assert [resp.identifier for resp in responses] == list(delays)
+    assert lookup_client.finished == ["a", "b", "c", "d", "slow"]
+    assert lookup_client.max_in_flight == 2
+
+
+async def test_rate_limited_lookup_is_retried() -> None:
+    fixture = await conftest.load_json_fixture("app/api/fixtures/good_url_lookup.json")
+    statuses = iter([429, 503, 200])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status_code = next(statuses)
+
+        if status_code != 200:
+            return httpx.Response(status_code, headers={"Retry-After": "0"})
+
+        return httpx.Response(status_code, json=fixture)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        lookup_client = client.VirusTotalUrlLookupClient(
+            http_client=http,
+            api_key="",
+            retry_policy=rate_limit.RetryPolicy(max_retries=2),
+        )
+
+        response = await lookup_client.lookup("fb.com")
+
+    assert response.data.attributes.last_analysis_stats.harmless == 70
+
+
+async def test_duplicates_are_looked_up_once() -> None:
+    lookup_client = _DelayedLookupClient({"a": 0, "b": 0})
+    lookuper = client.DeduplicatingLookuper(
+        orchestrator=client.VirusTotalClientOrchestrator(
+            client=lookup_client,
+            group_max_size=2,
+        ),
+        canonicalize=str.lower,
+    )
+
+    responses = await lookuper.lookup(["a", "B", "A", "b"])
+
+    assert [resp.identifier for resp in responses] == ["a", "B", "A", "b"]
+    assert lookup_client.lookups == 2
+
+
+class _BlockingReader(managers.StreamingIdentifierReader):
+    """Reads ``head``, and ``tail`` only once ``unblock`` is set."""
+
+    def __init__(self, head: list[str], tail: list[str]) -> None:
+        self._head = head
+        self._tail = tail
+        self.unblock = asyncio.Event()
+
+    async def iter_identifiers(self) -> AsyncIterator[str]:
+        for identifier in self._head:
+            yield identifier
+
+        await self.unblock.wait()
+
+        for identifier in self._tail:
+            yield identifier
+
+
+class _RecordingPresenter(managers.StreamingResultsPresenter):
+    def __init__(self, on_result: Callable[[], None]) -> None:
+        self.identifiers: list[str] = []
+        self._on_result = on_result
+
+    async def present_stream(
+        self,
+        results: AsyncIterable[models.LookupResult],
+    ) -> None:
+        async for result in results:
+            self.identifiers.append(result.identifier)
+            self._on_result()
+
+
+async def test_deduplicated_stream_presents_before_the_input_ends() -> None:
+    head = ["a", "A", "b", "c", "d", "e", "f", "g", "h", "i", "j"]
+    tail = ["B", "k"]
+    lookup_client = _DelayedLookupClient(
+        {identifier: 0.0 for identifier in [*head, *tail]},
+    )
+    # The head holds more unique identifiers than the orchestrator starts
+    # ahead, so the tail is only read once results are presented.
+    reader = _BlockingReader(head=head, tail=tail)
+    presenter = _RecordingPresenter(on_result=reader.unblock.set)
+
+    await asyncio.wait_for(
+        managers.StreamingLookupManager(
+            reader=reader,
+            presenter=presenter,
+            lookuper=client.DeduplicatingLookuper(
+                orchestrator=client.VirusTotalClientOrchestrator(
+                    client=lookup_client,
+                    group_max_size=2,
+                ),
+                canonicalize=str.lower,
+            ),
+            queue_size=1000,
+        ).present_lookup_results(),
+        timeout=5,
+    )
+
+    assert presenter.identifiers == [*head, *tail]
+    assert lookup_client.lookups == 11
+
+
+async def test_deduplicated_stream_keeps_few_results() -> None:
+    lookup_client = _DelayedLookupClient(collections.defaultdict(float))
+    lookuper = client.DeduplicatingLookuper(
+        orchestrator=client.VirusTotalClientOrchestrator(
+            client=lookup_client,
+            group_max_size=2,
+        ),
+        canonicalize=str.lower,
+        window=10,
+    )
+
+    async def identifiers() -> AsyncIterator[str]:
+        for index in range(2000):
+            yield "a{0}".format(index)
+            yield "A{0}".format(index)
+
+    presented = 0
+    live_results = []
+
+    async for _ in lookuper.iter_lookup(identifiers()):
+        presented += 1
+
+        if not presented % 500:
+            live_results.append(
+                sum(isinstance(obj, models.LookupResult) for obj in gc.get_objects())
+            )
+
+    assert presented == 4000
+    assert lookup_client.lookups == 2000
+    assert max(live_results) < 50
+
+
+async def test_streamed_lookups_keep_order() -> None:
+    delays = {"slow": 0.1, "a": 0, "b": 0, "c": 0}
+    lookup_client = _DelayedLookupClient(delays)
+    orchestrator = client.VirusTotalClientOrchestrator(
+        client=lookup_client,
+        group_max_size=2,
+    )
+
+    async def identifiers() -> AsyncIterator[str]:
+        for identifier in delays:
+            yield identifier
+
+    results = [
+        identifier
+        async for identifier, _ in orchestrator.iter_lookup_each(identifiers())
+    ]
+
+    assert results == list(delays)
+    assert lookup_client.max_in_flight == 2
+
+
+@pytest.mark.parametrize("keep_full_payload", [False, True])
+async def test_full_payload_is_opt_in(
+    httpx_mock: pytest_httpx.HTTPXMock,
+    http_client: httpx.AsyncClient,
+    keep_full_payload: bool,
+) -> None:
+    httpx_mock.add_response(
+        url="https://www.virustotal.com/api/v3/urls/ZmIuY29t",
+        status_code=200,
+        json=await conftest.load_json_fixture("app/api/fixtures/good_url_lookup.json"),
+    )
+    lookup_client = client.VirusTotalUrlLookupClient(
+        http_client=http_client,
+        api_key="",
+        keep_full_payload=keep_full_payload,
+    )
+
+    response = await lookup_client.lookup("fb.com")
+
+    assert response.data.attributes.last_analysis_stats.harmless == 70
+    extra_attributes = response.data.attributes.model_extra or {}
+
+    assert ("trackers" in extra_attributes) is keep_full_payload
+
+
+async def test_routing_client_shares_one_http_client() -> None:
+    fixture = await conftest.load_json_fixture("app/api/fixtures/good_url_lookup.json")
+    paths = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+
+        return httpx.Response(200, json=fixture)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        routing_client = client.RoutingLookupClient(
+            clients={
+                "ip_address": client.VirusTotalIpLookupClient(http, api_key=""),
+                "url": client.VirusTotalUrlLookupClient(http, api_key=""),
+            },
+            classify=lambda idf: "url" if "://" in idf else "ip_address",
+        )
+
+        await routing_client.lookup("127.0.0.1")
+        await routing_client.lookup("https://fb.com")
+
+    assert paths == [
+        "/api/v3/ip_addresses/127.0.0.1",
+        "/api/v3/urls/aHR0cHM6Ly9mYi5jb20=",
+    ]
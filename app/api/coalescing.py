@@ -0,0 +1,120 @@
+import asyncio
+import collections
+import time
+from collections.abc import Callable
+
+import structlog
+
+from app import metrics
+from app.api import client, models
+
+
+class CoalescingLookupClient(client.LookupClient):
+    """Shares one upstream lookup between concurrent callers.
+
+    A lookup of an identifier that is already in flight waits for the
+    running one instead of sending another request, and the last
+    ``max_entries`` responses are kept in memory for ``ttl`` seconds.
+    Failures are shared with the waiting callers but never remembered. At
+    most ``max_in_flight`` distinct identifiers are looked up at a time.
+    """
+
+    def __init__(
+        self,
+        lookup_client: client.LookupClient,
+        namespace: str,
+        max_entries: int,
+        ttl: float,
+        max_in_flight: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._client = lookup_client
+        self._namespace = namespace
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._clock = clock
+        self._in_flight: dict[str, asyncio.Future[models.LookupResponse]] = {}
+        self._recent: collections.OrderedDict[
+            str,
+            tuple[float, models.LookupResponse],
+        ] = collections.OrderedDict()
+        self._hits = 0
+        self._coalesced = 0
+        self._misses = 0
+        self._logger = structlog.get_logger(__name__)
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        response = self._get_recent(identifier)
+
+        if response is not None:
+            self._hits += 1
+            metrics.get_metrics().increment("memory_cache_lookups_total", result="hit")
+            return response
+
+        in_flight = self._in_flight.get(identifier)
+
+        if in_flight is not None:
+            self._coalesced += 1
+            metrics.get_metrics().increment(
+                "memory_cache_lookups_total",
+                result="coalesced",
+            )
+            # Shielded, so a cancelled caller doesn't cancel the others.
+            return await asyncio.shield(in_flight)
+
+        self._misses += 1
+        metrics.get_metrics().increment("memory_cache_lookups_total", result="miss")
+        task = asyncio.ensure_future(self._limited_lookup(identifier))
+        self._in_flight[identifier] = task
+        # The lookup outlives its first caller if that one is cancelled.
+        task.add_done_callback(lambda _: self._finish(identifier, task))
+
+        return await asyncio.shield(task)
+
+    def log_stats(self) -> None:
+        self._logger.info(
+            "Memory cache stats",
+            namespace=self._namespace,
+            hits=self._hits,
+            coalesced=self._coalesced,
+            misses=self._misses,
+            entries=len(self._recent),
+        )
+
+    async def _limited_lookup(self, identifier: str) -> models.LookupResponse:
+        async with self._semaphore:
+            return await self._client.lookup(identifier)
+
+    def _get_recent(self, identifier: str) -> models.LookupResponse | None:
+        entry = self._recent.get(identifier)
+
+        if entry is None:
+            return None
+
+        stored_at, response = entry
+
+        if self._clock() - stored_at > self._ttl:
+            del self._recent[identifier]
+            return None
+
+        self._recent.move_to_end(identifier)
+
+        return response
+
+    def _finish(
+        self,
+        identifier: str,
+        task: asyncio.Future[models.LookupResponse],
+    ) -> None:
+        self._in_flight.pop(identifier, None)
+
+        if not task.cancelled() and task.exception() is None:
+            self._remember(identifier, task.result())
+
+    def _remember(self, identifier: str, response: models.LookupResponse) -> None:
+        self._recent[identifier] = (self._clock(), response)
+        self._recent.move_to_end(identifier)
+
+        while len(self._recent) > self._max_entries:
+            self._recent.popitem(last=False)
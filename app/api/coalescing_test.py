@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app import conftest
+from app.api import coalescing
+
+
+async def test_concurrent_lookups_are_coalesced(
+    upstream_client: conftest.RecordingLookupClient,
+) -> None:
+    lookup_client = coalescing.CoalescingLookupClient(
+        upstream_client,
+        namespace="ip_address",
+        max_entries=10,
+        ttl=60,
+        max_in_flight=4,
+    )
+
+    responses = await asyncio.gather(
+        *(lookup_client.lookup(idf) for idf in ["a", "a", "b", "a"]),
+    )
+    await lookup_client.lookup("a")
+
+    assert [resp.data.identifier for resp in responses] == ["a", "a", "b", "a"]
+    assert upstream_client.lookups == ["a", "b"]
+
+
+async def test_recent_responses_expire_and_are_evicted(
+    upstream_client: conftest.RecordingLookupClient,
+) -> None:
+    now = 0.0
+    lookup_client = coalescing.CoalescingLookupClient(
+        upstream_client,
+        namespace="ip_address",
+        max_entries=1,
+        ttl=10,
+        max_in_flight=1,
+        clock=lambda: now,
+    )
+
+    await lookup_client.lookup("a")
+    now = 11
+    await lookup_client.lookup("a")
+    await lookup_client.lookup("b")
+    await lookup_client.lookup("a")
+
+    assert upstream_client.lookups == ["a", "a", "b", "a"]
+
+
+async def test_failures_are_shared_but_not_remembered(
+    failing_upstream_client: conftest.RecordingLookupClient,
+) -> None:
+    lookup_client = coalescing.CoalescingLookupClient(
+        failing_upstream_client,
+        namespace="ip_address",
+        max_entries=10,
+        ttl=60,
+        max_in_flight=1,
+    )
+
+    outcomes = await asyncio.gather(
+        lookup_client.lookup("a"),
+        lookup_client.lookup("a"),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+    with pytest.raises(RuntimeError):
+        await lookup_client.lookup("a")
+
+    assert failing_upstream_client.lookups == ["a", "a"]
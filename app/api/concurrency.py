@@ -0,0 +1,219 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+from collections.abc import Iterator
+
+import httpx
+import structlog
+
+from app import metrics
+
+# Weight of the latest window in the long-term average latency.
+_BASELINE_WEIGHT = 0.1
+
+# The limit and the epoch of the adaptive lookup the current task runs.
+_current_lookup: contextvars.ContextVar[tuple["AimdConcurrencyLimit", int] | None] = (
+    contextvars.ContextVar("current_lookup", default=None)
+)
+
+
+class AimdConcurrencyLimit:
+    """Adapts how many lookups may be in flight (AIMD).
+
+    Lookups are judged in windows of ``limit`` completed lookups. The limit
+    grows by one after a healthy window that used it fully, and is multiplied
+    by ``backoff`` as soon as a lookup fails with a 429, a 5xx or a timeout,
+    or when the average latency of a window exceeds ``latency_tolerance``
+    times the long-term average. Lookups started before a decrease don't
+    reflect it yet, so they are left out of the windows. A lookup run in
+    ``reporting`` also backs the limit off on every congested response it
+    gets, not only once its retries run out.
+
+    Congestion pauses the API key, which costs much more than a window, so
+    up to one above the limit it was last seen at, the limit only grows by
+    one every ``limit`` windows.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        maximum: int,
+        minimum: int = 1,
+        backoff: float = 0.9,
+        latency_tolerance: float = 2.0,
+    ) -> None:
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._minimum = minimum
+        self._maximum = maximum
+        self._backoff = backoff
+        self._latency_tolerance = latency_tolerance
+        self._in_flight = 0
+        self._waiters: collections.deque[asyncio.Future[None]] = collections.deque()
+        # Bumped by every decrease, lookups remember the one they started in.
+        self._epoch = 0
+        self._baseline_latency: float | None = None
+        self._congested_at: float | None = None
+        self._window_lookups = 0
+        self._window_latencies: list[float] = []
+        self._window_max_in_flight = 0
+        self._logger = structlog.get_logger(__name__)
+        metrics.get_metrics().set_gauge("concurrency_limit", self.limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def maximum(self) -> int:
+        return self._maximum
+
+    async def acquire(self) -> int:
+        """Waits for a free slot and returns the epoch the lookup starts in."""
+        while self._in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        self._in_flight += 1
+        self._window_max_in_flight = max(self._window_max_in_flight, self._in_flight)
+
+        return self._epoch
+
+    @contextlib.contextmanager
+    def reporting(self, epoch: int) -> Iterator[None]:
+        """Lets ``report_response`` reach the limit while a lookup runs."""
+        token = _current_lookup.set((self, epoch))
+
+        try:
+            yield
+        finally:
+            _current_lookup.reset(token)
+
+    def congested(self, epoch: int, reason: str) -> None:
+        """Backs off for a lookup that started in ``epoch`` and hit congestion."""
+        if epoch == self._epoch:
+            self._decrease(reason)
+
+    def release(
+        self,
+        epoch: int,
+        latency: float,
+        error: BaseException | None = None,
+    ) -> None:
+        """Frees the slot of a finished lookup and adapts the limit to it."""
+        self._in_flight -= 1
+
+        # Older lookups ran under a limit that was already decreased.
+        if epoch == self._epoch:
+            reason = congestion_reason(error) if error is not None else None
+
+            if reason is not None:
+                self._decrease(reason)
+            else:
+                self._record(latency if error is None else None)
+
+        for _ in range(self.limit - self._in_flight):
+            if not self._waiters:
+                break
+
+            waiter = self._waiters.popleft()
+
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _record(self, latency: float | None) -> None:
+        if latency is not None:
+            self._window_latencies.append(latency)
+
+        self._window_lookups += 1
+
+        if self._window_lookups < self.limit:
+            return
+
+        latencies = self._window_latencies
+        was_used = self._window_max_in_flight >= self.limit
+        self._start_window()
+
+        if not latencies:
+            return
+
+        average = sum(latencies) / len(latencies)
+        baseline = self._baseline_latency
+
+        if baseline is None:
+            self._baseline_latency = average
+            return
+
+        self._baseline_latency = baseline + _BASELINE_WEIGHT * (average - baseline)
+
+        if average > baseline * self._latency_tolerance:
+            self._decrease(reason="latency")
+        elif was_used and self._limit < self._maximum:
+            self._increase()
+
+    def _increase(self) -> None:
+        if self._congested_at is not None and self._limit < self._congested_at + 1:
+            self._set_limit(self._limit + 1 / self._limit)
+        else:
+            self._set_limit(self._limit + 1)
+
+        self._logger.debug("Concurrency limit increased", limit=self.limit)
+
+    def _decrease(self, reason: str) -> None:
+        self._epoch += 1
+        self._congested_at = self._limit
+        self._set_limit(self._limit * self._backoff)
+        self._start_window()
+        self._logger.info(
+            "Concurrency limit decreased", limit=self.limit, reason=reason
+        )
+
+    def _set_limit(self, limit: float) -> None:
+        self._limit = min(max(limit, self._minimum), self._maximum)
+        metrics.get_metrics().set_gauge("concurrency_limit", self.limit)
+
+    def _start_window(self) -> None:
+        self._window_lookups = 0
+        self._window_latencies = []
+        self._window_max_in_flight = self._in_flight
+
+
+def report_response(response: httpx.Response) -> None:
+    """Tells the limit of the running lookup about a congested response.
+
+    Retried responses don't fail the lookup, so without this the limit only
+    learns about them once the retries run out.
+    """
+    current_lookup = _current_lookup.get()
+    reason = _status_congestion_reason(response.status_code)
+
+    if current_lookup is not None and reason is not None:
+        concurrency_limit, epoch = current_lookup
+        concurrency_limit.congested(epoch, reason)
+
+
+def congestion_reason(error: BaseException) -> str | None:
+    """Tells why a lookup failed if it's because the API is overloaded."""
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+
+    if isinstance(error, httpx.HTTPStatusError):
+        return _status_congestion_reason(error.response.status_code)
+
+    return None
+
+
+def _status_congestion_reason(status_code: int) -> str | None:
+    if (
+        status_code == httpx.codes.TOO_MANY_REQUESTS
+        or status_code >= httpx.codes.INTERNAL_SERVER_ERROR
+    ):
+        return str(status_code)
+
+    return None
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+
+import httpx
+import pytest
+
+from app import conftest, logger
+from app.api import client, concurrency, rate_limit
+
+logger.configure_logger(False)
+
+
+def _too_many_requests() -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://www.virustotal.com/")
+
+    return httpx.HTTPStatusError(
+        "429",
+        request=request,
+        response=httpx.Response(429, request=request),
+    )
+
+
+async def _complete_window(limit: concurrency.AimdConcurrencyLimit) -> None:
+    epochs = [await limit.acquire() for _ in range(limit.limit)]
+
+    for epoch in epochs:
+        limit.release(epoch, latency=0.1)
+
+
+async def test_limit_grows_while_healthy_and_backs_off_on_429() -> None:
+    limit = concurrency.AimdConcurrencyLimit(initial=4, maximum=6, backoff=0.5)
+
+    for _ in range(4):
+        await _complete_window(limit)
+
+    assert limit.limit == 6
+
+    first_epoch = await limit.acquire()
+    second_epoch = await limit.acquire()
+    limit.release(first_epoch, latency=0.1, error=_too_many_requests())
+    # Started before the decrease, so it doesn't decrease the limit again.
+    limit.release(second_epoch, latency=0.1, error=_too_many_requests())
+
+    assert limit.limit == 3
+
+
+async def test_limit_backs_off_on_a_retried_429() -> None:
+    limit = concurrency.AimdConcurrencyLimit(initial=10, maximum=20)
+    epoch = await limit.acquire()
+
+    with limit.reporting(epoch):
+        for _ in range(2):
+            concurrency.report_response(_too_many_requests().response)
+
+    limit.release(epoch, latency=0.1)
+
+    assert limit.limit == 9
+
+
+async def test_limit_backs_off_on_latency_spikes() -> None:
+    limit = concurrency.AimdConcurrencyLimit(initial=4, maximum=10, backoff=0.5)
+
+    await _complete_window(limit)
+    epochs = [await limit.acquire() for _ in range(limit.limit)]
+
+    for epoch in epochs:
+        limit.release(epoch, latency=1.0)
+
+    assert limit.limit == 2
+
+
+async def test_acquire_waits_for_a_free_slot() -> None:
+    limit = concurrency.AimdConcurrencyLimit(initial=1, maximum=1)
+    epoch = await limit.acquire()
+    waiter = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+
+    assert not waiter.done()
+
+    limit.release(epoch, latency=0.1)
+
+    assert await waiter == epoch
+
+
+async def test_adaptive_orchestrator_keeps_the_order(
+    upstream_client: conftest.RecordingLookupClient,
+) -> None:
+    identifiers = ["8.8.8.{0}".format(i) for i in range(20)]
+    orchestrator = client.VirusTotalClientOrchestrator(
+        client=upstream_client,
+        group_max_size=2,
+        scheduler=client.ADAPTIVE_SCHEDULER,
+        adaptive_max_size=8,
+    )
+
+    responses = await orchestrator.lookup(identifiers)
+
+    assert [response.identifier for response in responses] == identifiers
+
+
+async def test_adaptive_orchestrator_backs_off_on_the_first_429(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    statuses = iter([429, 200])
+    payload = conftest.make_response("8.8.8.8").model_dump(by_alias=True, mode="json")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(next(statuses), json=payload)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        orchestrator = client.VirusTotalClientOrchestrator(
+            client=client.VirusTotalIpLookupClient(
+                http_client=http,
+                api_key="",
+                retry_policy=rate_limit.RetryPolicy(max_retries=1, base_delay=0),
+            ),
+            group_max_size=4,
+            scheduler=client.ADAPTIVE_SCHEDULER,
+        )
+
+        with caplog.at_level(logging.INFO):
+            responses = await orchestrator.lookup(["8.8.8.8"])
+
+    assert [response.identifier for response in responses] == ["8.8.8.8"]
+    assert "Concurrency limit decreased" in caplog.text
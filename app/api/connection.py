@@ -0,0 +1,133 @@
+import asyncio
+import collections
+import dataclasses
+
+import httpx
+import structlog
+
+from app import metrics
+
+# Marks the requests of ``warm_up``, which ``ConnectionStats`` leaves out.
+_WARM_UP_EXTENSION = "warm_up"
+
+
+@dataclasses.dataclass(frozen=True)
+class ConnectionSettings:
+    """Connection pool, keep-alive and timeout settings of the API client."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 50
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 30.0
+    http2: bool = True
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.read_timeout,
+            pool=None,
+        )
+
+
+class ConnectionStats:
+    """Counts how many requests were served by each pooled connection.
+
+    The warm-up requests aren't counted, the connections they open are once
+    lookups use them.
+    """
+
+    def __init__(self) -> None:
+        self._requests_per_connection: collections.Counter[int] = collections.Counter()
+        # Keeps the streams referenced, so their ids stay unique.
+        self._streams: list[object] = []
+        self._http_versions: collections.Counter[str] = collections.Counter()
+        self._logger = structlog.get_logger(__name__)
+
+    async def on_response(self, response: httpx.Response) -> None:
+        if response.request.extensions.get(_WARM_UP_EXTENSION):
+            return
+
+        stream = response.extensions.get("network_stream")
+
+        if stream is not None:
+            if id(stream) not in self._requests_per_connection:
+                self._streams.append(stream)
+                metrics.get_metrics().increment("connections_opened_total")
+
+            self._requests_per_connection[id(stream)] += 1
+
+        self._http_versions[response.http_version] += 1
+        metrics.get_metrics().increment(
+            "http_responses_total",
+            http_version=response.http_version,
+        )
+
+    def log_stats(self) -> None:
+        requests = sum(self._http_versions.values())
+        connections = len(self._requests_per_connection)
+
+        self._logger.info(
+            "Connection reuse stats",
+            requests=requests,
+            connections=connections,
+            requests_per_connection=(
+                round(requests / connections, 2) if connections else None
+            ),
+            http_versions=dict(self._http_versions),
+        )
+
+
+def create_http_client(
+    settings: ConnectionSettings,
+    stats: ConnectionStats | None = None,
+) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=settings.http2,
+        limits=settings.limits(),
+        timeout=settings.timeout(),
+        event_hooks={"response": [stats.on_response]} if stats else None,
+    )
+
+
+async def warm_up(
+    http_client: httpx.AsyncClient,
+    url: str,
+    connections: int,
+) -> None:
+    """Opens connections to ``url`` ahead of the first lookups.
+
+    DNS resolution and the TCP and TLS handshakes are paid here instead of
+    by the first batch. A single HTTP/2 connection multiplexes every request,
+    with HTTP/1.1 ``connections`` are opened concurrently.
+    """
+    logger = structlog.get_logger(__name__)
+
+    try:
+        response = await http_client.head(url, extensions={_WARM_UP_EXTENSION: True})
+    except httpx.HTTPError as ex:
+        logger.warning("Connection warm-up failed", url=url, error=str(ex))
+        return
+
+    if response.http_version == "HTTP/2" or connections <= 1:
+        return
+
+    outcomes = await asyncio.gather(
+        *(
+            http_client.head(url, extensions={_WARM_UP_EXTENSION: True})
+            for _ in range(connections)
+        ),
+        return_exceptions=True,
+    )
+    failed = sum(isinstance(outcome, Exception) for outcome in outcomes)
+
+    if failed:
+        logger.warning("Connection warm-up failed", url=url, failed=failed)
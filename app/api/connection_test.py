@@ -0,0 +1,79 @@
+import httpx
+import pytest_httpx
+
+from app import metrics
+from app.api import connection
+
+
+async def test_warm_up_opens_http1_connections(
+    httpx_mock: pytest_httpx.HTTPXMock,
+) -> None:
+    httpx_mock.add_response(method="HEAD", url="https://api.test")
+
+    async with httpx.AsyncClient() as http_client:
+        await connection.warm_up(http_client, url="https://api.test", connections=3)
+
+    assert len(httpx_mock.get_requests()) == 4
+
+
+async def test_warm_up_once_for_http2(httpx_mock: pytest_httpx.HTTPXMock) -> None:
+    httpx_mock.add_response(
+        method="HEAD",
+        url="https://api.test",
+        http_version="HTTP/2",
+    )
+
+    async with httpx.AsyncClient() as http_client:
+        await connection.warm_up(http_client, url="https://api.test", connections=3)
+
+    assert len(httpx_mock.get_requests()) == 1
+
+
+async def test_warm_up_failure_is_ignored(httpx_mock: pytest_httpx.HTTPXMock) -> None:
+    httpx_mock.add_exception(httpx.ConnectError("refused"))
+
+    async with httpx.AsyncClient() as http_client:
+        await connection.warm_up(http_client, url="https://api.test", connections=3)
+
+
+async def test_stats_count_requests_per_connection() -> None:
+    run_metrics = metrics.reset()
+    stats = connection.ConnectionStats()
+    streams = [object(), object()]
+    request = httpx.Request("GET", "https://api.test")
+
+    for stream in (streams[0], streams[0], streams[1]):
+        await stats.on_response(
+            httpx.Response(
+                200,
+                request=request,
+                extensions={"network_stream": stream, "http_version": b"HTTP/1.1"},
+            ),
+        )
+
+    counters = run_metrics.summary()["counters"]
+
+    assert counters["connections_opened_total"] == [{"labels": {}, "value": 2}]
+    assert counters["http_responses_total"] == [
+        {"labels": {"http_version": "HTTP/1.1"}, "value": 3},
+    ]
+
+
+async def test_stats_leave_out_warm_up_requests(
+    httpx_mock: pytest_httpx.HTTPXMock,
+) -> None:
+    httpx_mock.add_response(method="HEAD", url="https://api.test")
+    httpx_mock.add_response(method="GET", url="https://api.test/lookup")
+    run_metrics = metrics.reset()
+    stats = connection.ConnectionStats()
+
+    async with connection.create_http_client(
+        connection.ConnectionSettings(http2=False),
+        stats,
+    ) as http_client:
+        await connection.warm_up(http_client, url="https://api.test", connections=3)
+        await http_client.get("https://api.test/lookup")
+
+    assert run_metrics.summary()["counters"]["http_responses_total"] == [
+        {"labels": {"http_version": "HTTP/1.1"}, "value": 1},
+    ]
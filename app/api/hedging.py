@@ -0,0 +1,131 @@
+import asyncio
+import collections
+import statistics
+import time
+
+import structlog
+
+from app import metrics
+from app.api import client, models
+
+# Latencies the threshold is computed from, and how often it's recomputed.
+_WINDOW_SIZE = 1000
+_RECOMPUTE_EVERY = 50
+
+
+class HedgingLookupClient(client.LookupClient):
+    """Sends a second request for lookups that are slower than usual.
+
+    When a lookup hasn't finished after the ``percentile`` of the recent
+    lookup latencies, the same lookup is started again, whichever finishes
+    first answers and the other one is cancelled. No lookup is hedged before
+    ``min_samples`` latencies are known, and at most ``max_ratio`` of the
+    lookups are hedged, so hedges can't eat much quota.
+    """
+
+    def __init__(
+        self,
+        lookup_client: client.LookupClient,
+        namespace: str,
+        percentile: float = 95,
+        max_ratio: float = 0.05,
+        min_samples: int = 20,
+    ) -> None:
+        self._client = lookup_client
+        self._namespace = namespace
+        self._percentile = percentile
+        self._max_ratio = max_ratio
+        self._min_samples = min_samples
+        self._latencies: collections.deque[float] = collections.deque(
+            maxlen=_WINDOW_SIZE,
+        )
+        self._threshold: float | None = None
+        self._samples_since_threshold = 0
+        self._lookups = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._logger = structlog.get_logger(__name__)
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        self._lookups += 1
+        started_at = time.perf_counter()
+        primary = asyncio.ensure_future(self._client.lookup(identifier))
+
+        try:
+            if self._threshold is None or not self._may_hedge():
+                return await primary
+
+            await asyncio.wait({primary}, timeout=self._threshold)
+
+            if primary.done() or not self._may_hedge():
+                return await primary
+
+            return await self._hedge(identifier, primary)
+        finally:
+            primary.cancel()
+            # A primary beaten by its hedge took at least this long.
+            self._record(time.perf_counter() - started_at)
+
+    def log_stats(self) -> None:
+        self._logger.info(
+            "Hedging stats",
+            namespace=self._namespace,
+            lookups=self._lookups,
+            hedges=self._hedges,
+            hedge_wins=self._hedge_wins,
+            threshold_seconds=(
+                round(self._threshold, 3) if self._threshold is not None else None
+            ),
+        )
+
+    async def _hedge(
+        self,
+        identifier: str,
+        primary: asyncio.Future[models.LookupResponse],
+    ) -> models.LookupResponse:
+        self._hedges += 1
+        hedge = asyncio.ensure_future(self._client.lookup(identifier))
+        pending = {primary, hedge}
+        winner = None
+
+        try:
+            # A failed request only fails the lookup if the other one fails too.
+            while winner is None and pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                winner = next(
+                    (future for future in done if future.exception() is None),
+                    None,
+                )
+        finally:
+            hedge.cancel()
+
+        if winner is None:
+            return await primary
+
+        if winner is hedge:
+            self._hedge_wins += 1
+
+        metrics.get_metrics().increment(
+            "hedged_lookups_total",
+            winner="hedge" if winner is hedge else "primary",
+        )
+
+        return winner.result()
+
+    def _may_hedge(self) -> bool:
+        return self._hedges < self._lookups * self._max_ratio
+
+    def _record(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._samples_since_threshold += 1
+
+        if len(self._latencies) >= self._min_samples and (
+            self._threshold is None or self._samples_since_threshold >= _RECOMPUTE_EVERY
+        ):
+            self._threshold = statistics.quantiles(self._latencies, n=1000)[
+                round(self._percentile * 10) - 1
+            ]
+            self._samples_since_threshold = 0
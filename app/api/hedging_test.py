@@ -0,0 +1,73 @@
+import asyncio
+
+from app import conftest
+from app.api import client, hedging, models
+
+
+class _DelayedLookupClient(client.LookupClient):
+    """Answers after the next of ``delays``, or a short default one."""
+
+    def __init__(self, delays: list[float] | None = None) -> None:
+        self.lookups: list[str] = []
+        self.cancelled = 0
+        self._delays = delays or []
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        self.lookups.append(identifier)
+        delay = self._delays.pop(0) if self._delays else 0.001
+
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+        return conftest.make_response(identifier)
+
+
+async def test_slow_lookup_is_hedged_and_the_loser_cancelled() -> None:
+    upstream = _DelayedLookupClient(delays=[0.001] * 20 + [10])
+    lookup_client = hedging.HedgingLookupClient(
+        upstream,
+        namespace="ip_address",
+        max_ratio=0.5,
+    )
+
+    for index in range(20):
+        await lookup_client.lookup(str(index))
+
+    response = await asyncio.wait_for(lookup_client.lookup("slow"), timeout=1)
+
+    assert response.data.identifier == "slow"
+    assert upstream.lookups[-2:] == ["slow", "slow"]
+    assert upstream.cancelled == 1
+
+
+async def test_no_lookup_is_hedged_before_enough_samples() -> None:
+    upstream = _DelayedLookupClient(delays=[0.05])
+    lookup_client = hedging.HedgingLookupClient(
+        upstream,
+        namespace="ip_address",
+        max_ratio=1,
+    )
+
+    await lookup_client.lookup("a")
+
+    assert upstream.lookups == ["a"]
+
+
+async def test_hedges_are_capped_by_max_ratio() -> None:
+    upstream = _DelayedLookupClient(delays=[0.001] * 20 + [0.05] * 20)
+    lookup_client = hedging.HedgingLookupClient(
+        upstream,
+        namespace="ip_address",
+        max_ratio=0.1,
+    )
+
+    for index in range(20):
+        await lookup_client.lookup(str(index))
+
+    await asyncio.gather(*(lookup_client.lookup("slow") for _ in range(20)))
+
+    # 40 lookups allow 4 hedges, each one sending one more request.
+    assert len(upstream.lookups) <= 44
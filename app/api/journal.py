@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+import json
+import pathlib
+import types
+from typing import TextIO
+
+import pydantic
+import structlog
+
+from app.api import client, models
+
+_logger = structlog.get_logger(__name__)
+
+
+class LookupJournal:
+    """Append-only NDJSON log of completed lookups.
+
+    Entries are buffered and written by a background task every
+    ``flush_interval`` seconds, or as soon as ``flush_size`` entries are
+    pending, so appending never waits for the disk. Leaving the context
+    stops the background task once its write is done, writes what is left
+    and only then closes the file.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        resume: bool = False,
+        flush_interval: float = 1.0,
+        flush_size: int = 1000,
+    ) -> None:
+        self._path = path
+        self._resume = resume
+        self._flush_interval = flush_interval
+        self._flush_size = flush_size
+        self._buffer: list[str] = []
+        self._flush_requested = asyncio.Event()
+        self._closing = False
+        self._file: TextIO | None = None
+        self._flusher: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "LookupJournal":
+        self._file = self._path.open("a" if self._resume else "w")
+
+        if self._file.tell() and not _ends_with_newline(self._path):
+            # Don't glue the first new entry to a partially written line.
+            self._file.write("\n")
+
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: types.TracebackType | None,
+    ) -> None:
+        try:
+            if self._flusher is not None:
+                self._closing = True
+                self._flush_requested.set()
+                await self._flusher
+
+            await self._flush()
+        finally:
+            if self._file is not None:
+                self._file.close()
+
+    def load(self) -> dict[str, models.LookupResponse]:
+        """Returns the journaled responses when resuming, nothing otherwise."""
+        responses: dict[str, models.LookupResponse] = {}
+
+        if not self._resume or not self._path.exists():
+            return responses
+
+        with self._path.open() as file:
+            for line_number, line in enumerate(file, start=1):
+                try:
+                    entry = json.loads(line)
+                    responses[entry["identifier"]] = (
+                        models.LookupResponse.model_validate(entry["response"])
+                    )
+                except (json.JSONDecodeError, KeyError, pydantic.ValidationError):
+                    # An interrupted run may leave a partially written line.
+                    _logger.warning(
+                        "Skipping unreadable journal line {0}".format(line_number)
+                    )
+
+        _logger.info("Resuming from journal", journaled=len(responses))
+
+        return responses
+
+    def append(self, identifier: str, response: models.LookupResponse) -> None:
+        self._buffer.append(
+            '{{"identifier":{0},"response":{1}}}\n'.format(
+                json.dumps(identifier),
+                response.model_dump_json(by_alias=True),
+            ),
+        )
+
+        if len(self._buffer) >= self._flush_size:
+            self._flush_requested.set()
+
+    async def _flush_periodically(self) -> None:
+        while not self._closing:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(
+                    self._flush_requested.wait(),
+                    timeout=self._flush_interval,
+                )
+
+            self._flush_requested.clear()
+            await self._flush()
+
+    async def _flush(self) -> None:
+        lines, self._buffer = self._buffer, []
+
+        if lines:
+            await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines: list[str]) -> None:
+        if self._file is None:
+            raise RuntimeError("The journal isn't open")
+
+        self._file.write("".join(lines))
+        self._file.flush()
+
+
+class JournalingLookupClient(client.LookupClient):
+    """Records every completed lookup and skips those journaled before."""
+
+    def __init__(
+        self,
+        lookup_client: client.LookupClient,
+        journal: LookupJournal,
+    ) -> None:
+        self._client = lookup_client
+        self._journal = journal
+        self._journaled = journal.load()
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        journaled_response = self._journaled.get(identifier)
+
+        if journaled_response is not None:
+            return journaled_response
+
+        response = await self._client.lookup(identifier)
+        self._journal.append(identifier, response)
+
+        return response
+
+
+def _ends_with_newline(path: pathlib.Path) -> bool:
+    with path.open("rb") as file:
+        file.seek(-1, 2)
+
+        return file.read(1) == b"\n"
@@ -0,0 +1,71 @@
+import asyncio
+import pathlib
+import time
+
+from app import conftest
+from app.api import client, journal, models
+
+
+class _CountingLookupClient(client.LookupClient):
+    def __init__(self) -> None:
+        self.looked_up: list[str] = []
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        self.looked_up.append(identifier)
+
+        return conftest.make_response(identifier, harmless=10)
+
+
+async def test_resume_skips_journaled_lookups(tmp_path: pathlib.Path) -> None:
+    journal_path = tmp_path / "journal.ndjson"
+
+    async with journal.LookupJournal(journal_path) as lookup_journal:
+        first_run_client = journal.JournalingLookupClient(
+            lookup_client=_CountingLookupClient(),
+            journal=lookup_journal,
+        )
+        await first_run_client.lookup("127.0.0.1")
+
+    # Simulate a run killed in the middle of writing an entry.
+    with journal_path.open("a") as file:
+        file.write('{"identifier": "127.0.0.2", "resp')
+
+    inner_client = _CountingLookupClient()
+
+    async with journal.LookupJournal(journal_path, resume=True) as lookup_journal:
+        resumed_client = journal.JournalingLookupClient(
+            lookup_client=inner_client,
+            journal=lookup_journal,
+        )
+        first = await resumed_client.lookup("127.0.0.1")
+        await resumed_client.lookup("127.0.0.2")
+
+    assert first.data.identifier == "127.0.0.1"
+    assert inner_client.looked_up == ["127.0.0.2"]
+    assert set(
+        journal.LookupJournal(journal_path, resume=True).load(),
+    ) == {"127.0.0.1", "127.0.0.2"}
+
+
+class _SlowJournal(journal.LookupJournal):
+    def _write(self, lines: list[str]) -> None:
+        time.sleep(0.05)
+        super()._write(lines)
+
+
+async def test_closing_waits_for_the_write_in_flight(
+    tmp_path: pathlib.Path,
+) -> None:
+    journal_path = tmp_path / "journal.ndjson"
+
+    async with _SlowJournal(journal_path, flush_size=1) as lookup_journal:
+        lookup_journal.append("127.0.0.1", conftest.make_response("127.0.0.1"))
+        # Let the background task start writing the first entry.
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        lookup_journal.append("127.0.0.2", conftest.make_response("127.0.0.2"))
+
+    assert list(journal.LookupJournal(journal_path, resume=True).load()) == [
+        "127.0.0.1",
+        "127.0.0.2",
+    ]
@@ -0,0 +1,115 @@
+import asyncio
+import collections
+import dataclasses
+import time
+from collections.abc import Callable, Mapping, Sequence
+
+import httpx
+import structlog
+
+from app.api import rate_limit
+
+_UNAUTHORIZED_RETIREMENT_SECONDS = 15 * 60
+_VISIBLE_KEY_CHARS = 4
+
+
+@dataclasses.dataclass
+class _PooledKey:
+    key: str
+    limiter: rate_limit.QuotaRateLimiter
+    retired_until: float = 0
+    requests: int = 0
+    retirements: int = 0
+    statuses: collections.Counter[int] = dataclasses.field(
+        default_factory=collections.Counter,
+    )
+
+
+class ApiKeyPool:
+    """Spreads requests over several API keys, each with its own quota.
+
+    Every request goes to the key with the most remaining capacity. A key
+    rejected with 401 is retired for a while, and a key answered with 429
+    is paused by its limiter. Retired keys are only used again early when
+    no other key is left. The quota of a key is its entry of ``quotas``
+    when there is one, e.g. one shared by processes.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        requests_per_minute: int | None = None,
+        requests_per_day: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        quotas: Mapping[str, rate_limit.Quota] | None = None,
+    ) -> None:
+        self._clock = clock
+        self._keys = {
+            key: _PooledKey(
+                key=key,
+                limiter=rate_limit.QuotaRateLimiter(
+                    requests_per_minute=requests_per_minute,
+                    requests_per_day=requests_per_day,
+                    clock=clock,
+                    quota=quotas.get(key) if quotas else None,
+                ),
+            )
+            for key in keys
+        }
+        self._logger = structlog.get_logger(__name__)
+
+    async def acquire(self) -> str:
+        """Waits until any key has capacity and returns it."""
+        while True:
+            keys = self._active_keys() or list(self._keys.values())
+            ready_keys = [pooled for pooled in keys if not pooled.limiter.delay()]
+
+            if ready_keys:
+                pooled = max(
+                    ready_keys,
+                    key=lambda ready: (ready.limiter.remaining, -ready.requests),
+                )
+
+                # A quota shared by processes may run out in the meantime.
+                if pooled.limiter.try_acquire():
+                    pooled.requests += 1
+
+                    return pooled.key
+
+                continue
+
+            await asyncio.sleep(min(pooled.limiter.delay() for pooled in keys))
+
+    def report(self, key: str, status_code: int) -> None:
+        pooled = self._keys[key]
+        pooled.statuses[status_code] += 1
+
+        if status_code == httpx.codes.UNAUTHORIZED:
+            pooled.retired_until = self._clock() + _UNAUTHORIZED_RETIREMENT_SECONDS
+            pooled.retirements += 1
+            self._logger.warning("Retiring API key", key=_mask(key))
+
+    def pause(self, key: str, seconds: float) -> None:
+        self._keys[key].limiter.pause(seconds)
+
+    def has_active_keys(self) -> bool:
+        return bool(self._active_keys())
+
+    def log_stats(self) -> None:
+        for pooled in self._keys.values():
+            self._logger.info(
+                "API key usage",
+                key=_mask(pooled.key),
+                requests=pooled.requests,
+                statuses=dict(pooled.statuses),
+                retirements=pooled.retirements,
+            )
+
+    def _active_keys(self) -> list[_PooledKey]:
+        now = self._clock()
+
+        return [pooled for pooled in self._keys.values() if pooled.retired_until <= now]
+
+
+def _mask(key: str) -> str:
+    return "...{0}".format(key[-_VISIBLE_KEY_CHARS:])
@@ -0,0 +1,65 @@
+import httpx
+
+from app import conftest
+from app.api import client, key_pool
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def test_key_with_most_capacity_is_used() -> None:
+    pool = key_pool.ApiKeyPool(["first", "second"], requests_per_minute=2)
+
+    assert [await pool.acquire() for _ in range(4)] == [
+        "first",
+        "second",
+        "first",
+        "second",
+    ]
+
+
+async def test_unauthorized_key_is_retired() -> None:
+    clock = _FakeClock()
+    pool = key_pool.ApiKeyPool(["first", "second"], clock=clock)
+
+    pool.report("first", 401)
+
+    assert [await pool.acquire() for _ in range(2)] == ["second", "second"]
+
+    pool.report("second", 401)
+
+    # Retired keys are still used when none is left.
+    assert await pool.acquire() in {"first", "second"}
+
+    clock.now = 60 * 60
+
+    assert pool.has_active_keys()
+
+
+async def test_lookup_switches_to_another_key_on_unauthorized() -> None:
+    fixture = await conftest.load_json_fixture("app/api/fixtures/good_url_lookup.json")
+    used_keys = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        used_keys.append(request.headers["x-apikey"])
+
+        if request.headers["x-apikey"] == "revoked":
+            return httpx.Response(401)
+
+        return httpx.Response(200, json=fixture)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        lookup_client = client.VirusTotalUrlLookupClient(
+            http_client=http,
+            api_key=key_pool.ApiKeyPool(["revoked", "valid"]),
+        )
+
+        await lookup_client.lookup("fb.com")
+        await lookup_client.lookup("fb.com")
+
+    assert used_keys == ["revoked", "valid", "valid"]
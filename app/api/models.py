@@ -1,12 +1,20 @@
+import dataclasses
 import datetime
+import sys
 from typing import Literal
 
 import pydantic
 
 
 class _BaseModel(pydantic.BaseModel):
+    """Keeps only the declared fields of a response.
+
+    VirusTotal objects carry tens of KB of attributes the presenters never
+    use, so they are dropped while decoding. The ``Full*`` models keep them.
+    """
+
     model_config = pydantic.ConfigDict(
-        extra="allow",
+        extra="ignore",
     )
 
 
@@ -32,9 +40,91 @@ class LookupAttributes(_BaseModel):
 
 class LookupData(_BaseModel):
     identifier: str = pydantic.Field(..., alias="id")
-    type: Literal["url", "ip_address"]
+    type: Literal["url", "ip_address", "file"]
     attributes: LookupAttributes
 
 
 class LookupResponse(_BaseModel):
     data: LookupData
+
+
+_FULL_PAYLOAD_CONFIG = pydantic.ConfigDict(extra="allow")
+
+
+class FullLastAnalysisStats(LastAnalysisStats):
+    model_config = _FULL_PAYLOAD_CONFIG
+
+
+class FullLookupAttributes(LookupAttributes):
+    model_config = _FULL_PAYLOAD_CONFIG
+
+    last_analysis_stats: FullLastAnalysisStats
+
+
+class FullLookupData(LookupData):
+    model_config = _FULL_PAYLOAD_CONFIG
+
+    attributes: FullLookupAttributes
+
+
+class FullLookupResponse(LookupResponse):
+    """A ``LookupResponse`` keeping every attribute sent by the API."""
+
+    model_config = _FULL_PAYLOAD_CONFIG
+
+    data: FullLookupData
+
+
+class CarriedOverLookupResponse(LookupResponse):
+    """A result of an earlier run standing in for a lookup.
+
+    Only the verdict of the earlier run is known, the analysis stats are
+    made up to give it again.
+    """
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class LookupResult:
+    """What the presenters need of a lookup response, in a few slots.
+
+    The response graph of pydantic models costs a couple of KB per lookup,
+    so the orchestrator keeps only this: the analysis time as a Unix
+    timestamp, the type interned, and the five analysis stats counters.
+    ``is_carried_over`` marks results of an earlier run, whose counters
+    only reproduce its verdict.
+    """
+
+    identifier: str
+    type: str
+    last_analysis_timestamp: int
+    harmless: int
+    malicious: int
+    suspicious: int
+    timeout: int
+    undetected: int
+    is_carried_over: bool = False
+
+    @classmethod
+    def from_response(cls, response: LookupResponse) -> "LookupResult":
+        attributes = response.data.attributes
+        stats = attributes.last_analysis_stats
+
+        return cls(
+            identifier=response.data.identifier,
+            type=sys.intern(response.data.type),
+            last_analysis_timestamp=int(attributes.last_analysis_date.timestamp()),
+            harmless=stats.harmless,
+            malicious=stats.malicious,
+            suspicious=stats.suspicious,
+            timeout=stats.timeout,
+            undetected=stats.undetected,
+            is_carried_over=isinstance(response, CarriedOverLookupResponse),
+        )
+
+    @property
+    def last_analysis_date(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.last_analysis_timestamp)
+
+    @property
+    def is_malicious(self) -> bool:
+        return self.malicious + self.suspicious > self.harmless
@@ -0,0 +1,161 @@
+import datetime
+import hashlib
+import json
+import pathlib
+import time
+from collections.abc import Callable, Iterator, Mapping
+from typing import Any, Literal, cast
+
+import pydantic
+import structlog
+from pydantic import alias_generators
+
+from app import metrics
+from app.api import client, models
+
+_logger = structlog.get_logger(__name__)
+
+
+class _PreviousResult(pydantic.BaseModel):
+    """A result written by the JSON presenters."""
+
+    identifier: str
+    type: Literal["URL", "IP_ADDRESS", "FILE"]
+    last_analysis_time: datetime.datetime
+    is_malicious: bool
+
+    model_config = pydantic.ConfigDict(
+        alias_generator=pydantic.AliasGenerator(
+            validation_alias=alias_generators.to_pascal,
+        )
+    )
+
+
+def load(
+    path: pathlib.Path,
+    canonicalize: Callable[[str], str] | None = None,
+) -> dict[str, models.CarriedOverLookupResponse]:
+    """Indexes the results of an earlier run by identifier.
+
+    Reads the documents of the ``json-file`` and ``compact-json-file``
+    presenters as well as the lines of ``ndjson-file``. The results become
+    responses that present the same verdicts again. Results are labelled
+    with the identifiers as they were read, so given ``canonicalize`` they
+    are indexed by the canonical identifiers lookups are made for.
+    """
+    responses: dict[str, models.CarriedOverLookupResponse] = {}
+
+    for index, record in enumerate(_iter_records(path.read_text())):
+        try:
+            result = _PreviousResult.model_validate(record)
+        except pydantic.ValidationError:
+            _logger.warning("Skipping unreadable previous result {0}".format(index))
+            continue
+
+        identifier = (
+            result.identifier
+            if canonicalize is None
+            else canonicalize(result.identifier)
+        )
+        responses[identifier] = _result_to_response(result)
+
+    _logger.info("Loaded previous results", path=str(path), results=len(responses))
+
+    return responses
+
+
+def _iter_records(text: str) -> Iterator[Any]:
+    try:
+        document = json.loads(text)
+    except json.JSONDecodeError:
+        for line in text.splitlines():
+            if line.strip():
+                yield _loads_or_none(line)
+
+        return
+
+    if isinstance(document, dict) and "results" in document:
+        yield from document["results"]
+    else:
+        yield document
+
+
+def _loads_or_none(line: str) -> Any:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        # An interrupted streamed run may leave a partially written line.
+        return None
+
+
+def _result_to_response(
+    result: _PreviousResult,
+) -> models.CarriedOverLookupResponse:
+    return models.CarriedOverLookupResponse(
+        data=models.LookupData(
+            id=result.identifier,
+            type=cast(Literal["url", "ip_address", "file"], result.type.lower()),
+            attributes=models.LookupAttributes(
+                last_analysis_date=result.last_analysis_time,
+                last_analysis_stats=models.LastAnalysisStats(
+                    harmless=0,
+                    malicious=int(result.is_malicious),
+                    suspicious=0,
+                    timeout=0,
+                    undetected=0,
+                ),
+            ),
+        ),
+    )
+
+
+class PreviousResultsLookupClient(client.LookupClient):
+    """Carries over results of an earlier run that are still fresh.
+
+    An identifier whose previous result was analyzed less than ``max_age``
+    seconds ago isn't looked up again, its previous result is returned
+    instead. VirusTotal identifies URLs by the SHA-256 of the URL, so the
+    previous results of URLs are found by that hash.
+    """
+
+    def __init__(
+        self,
+        lookup_client: client.LookupClient,
+        previous: Mapping[str, models.LookupResponse],
+        max_age: float,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._client = lookup_client
+        self._previous = previous
+        self._max_age = max_age
+        self._clock = clock
+        self._carried_over = 0
+        self._stale = 0
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        previous_response = self._previous.get(identifier) or self._previous.get(
+            hashlib.sha256(identifier.encode()).hexdigest(),
+        )
+
+        if previous_response is not None and self._is_fresh(previous_response):
+            self._carried_over += 1
+            metrics.get_metrics().increment("carried_over_lookups_total")
+
+            return previous_response
+
+        if previous_response is not None:
+            self._stale += 1
+
+        return await self._client.lookup(identifier)
+
+    def log_stats(self) -> None:
+        _logger.info(
+            "Previous results stats",
+            carried_over=self._carried_over,
+            stale=self._stale,
+        )
+
+    def _is_fresh(self, response: models.LookupResponse) -> bool:
+        analyzed_at = response.data.attributes.last_analysis_date.timestamp()
+
+        return self._clock() - analyzed_at < self._max_age
@@ -0,0 +1,118 @@
+import datetime
+import hashlib
+import pathlib
+from typing import Literal
+
+from app import conftest
+from app.api import client, models, previous_results
+from app.presenters import json_presenter
+from app.readers import canonicalizer
+
+_NOW = datetime.datetime(2024, 8, 22, 12)
+
+
+def _response(
+    identifier: str,
+    type_: Literal["url", "ip_address", "file"],
+    malicious: int,
+) -> models.LookupResponse:
+    return conftest.make_response(
+        identifier,
+        malicious=malicious,
+        type_=type_,
+        last_analysis_date=_NOW - datetime.timedelta(hours=1),
+        harmless=1,
+    )
+
+
+class _RecordingLookupClient(client.LookupClient):
+    def __init__(self) -> None:
+        self.lookups: list[str] = []
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        self.lookups.append(identifier)
+
+        return _response(identifier, "ip_address", malicious=0)
+
+
+async def test_presented_results_are_loaded_with_their_verdicts(
+    tmp_path: pathlib.Path,
+) -> None:
+    output = tmp_path / "results.json"
+    await json_presenter.JsonFilePresenter(output).present(
+        [
+            models.LookupResult.from_response(_response(idf, "ip_address", malicious))
+            for idf, malicious in (("1.1.1.1", 0), ("2.2.2.2", 5))
+        ],
+    )
+
+    responses = previous_results.load(output)
+
+    assert sorted(responses) == ["1.1.1.1", "2.2.2.2"]
+    assert responses["2.2.2.2"].data.type == "ip_address"
+    assert [
+        models.LookupResult.from_response(responses[idf]).is_malicious
+        for idf in ("1.1.1.1", "2.2.2.2")
+    ] == [False, True]
+    assert models.LookupResult.from_response(responses["1.1.1.1"]).is_carried_over
+
+
+async def test_ndjson_results_with_a_partial_line_are_loaded(
+    tmp_path: pathlib.Path,
+) -> None:
+    output = tmp_path / "results.ndjson"
+    await json_presenter.NdjsonFilePresenter(output).present(
+        [models.LookupResult.from_response(_response("1.1.1.1", "ip_address", 0))],
+    )
+    output.write_text(output.read_text() + '{"Identifier": "2.2')
+
+    assert list(previous_results.load(output)) == ["1.1.1.1"]
+
+
+async def test_results_are_indexed_by_canonical_identifier(
+    tmp_path: pathlib.Path,
+) -> None:
+    output = tmp_path / "results.ndjson"
+    await json_presenter.NdjsonFilePresenter(output).present(
+        [models.LookupResult.from_response(_response("HTTPS://Example.com", "url", 0))],
+    )
+
+    responses = previous_results.load(
+        output,
+        canonicalize=canonicalizer.UrlCanonicalizer().canonicalize,
+    )
+
+    assert list(responses) == ["https://example.com/"]
+
+
+async def test_only_stale_and_unknown_identifiers_are_looked_up() -> None:
+    url = "https://example.com/"
+    url_id = hashlib.sha256(url.encode()).hexdigest()
+    upstream = _RecordingLookupClient()
+    lookup_client = previous_results.PreviousResultsLookupClient(
+        upstream,
+        previous={
+            "1.1.1.1": _response("1.1.1.1", "ip_address", 0),
+            url_id: _response(url_id, "url", 0),
+        },
+        max_age=2 * 60 * 60,
+        clock=_NOW.timestamp,
+    )
+
+    fresh_ip = await lookup_client.lookup("1.1.1.1")
+    fresh_url = await lookup_client.lookup(url)
+    await lookup_client.lookup("2.2.2.2")
+
+    assert fresh_ip.data.identifier == "1.1.1.1"
+    assert fresh_url.data.identifier == url_id
+    assert upstream.lookups == ["2.2.2.2"]
+
+    stale_client = previous_results.PreviousResultsLookupClient(
+        upstream,
+        previous={"1.1.1.1": _response("1.1.1.1", "ip_address", 0)},
+        max_age=60,
+        clock=_NOW.timestamp,
+    )
+    await stale_client.lookup("1.1.1.1")
+
+    assert upstream.lookups == ["2.2.2.2", "1.1.1.1"]
@@ -0,0 +1,307 @@
+import asyncio
+import dataclasses
+import datetime
+import email.utils
+import multiprocessing
+import random
+import time
+from collections.abc import Callable, Sequence
+
+import httpx
+
+_SECONDS_IN_MINUTE = 60
+_SECONDS_IN_DAY = 24 * 60 * 60
+
+
+class TokenBucket:
+    """Allows ``capacity`` acquisitions per ``period`` seconds.
+
+    The bucket starts full and refills continuously, so bursts up to the
+    capacity are allowed while the long-run rate never exceeds the budget.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        period: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._capacity = capacity
+        self._fill_rate = capacity / period
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated_at = clock()
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def remaining(self) -> float:
+        self._refill()
+
+        return self._tokens
+
+    def time_until_available(self) -> float:
+        self._refill()
+
+        if self._tokens >= 1:
+            return 0
+
+        return (1 - self._tokens) / self._fill_rate
+
+    def try_acquire(self) -> bool:
+        self._refill()
+
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+
+        return True
+
+    def refund(self) -> None:
+        """Returns a token taken for a request that wasn't made."""
+        self._tokens = min(self._capacity, self._tokens + 1)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self._capacity,
+            self._tokens + (now - self._updated_at) * self._fill_rate,
+        )
+        self._updated_at = now
+
+
+class SharedTokenBucket(TokenBucket):
+    """A token bucket drawn from by several processes.
+
+    The tokens live in shared memory, so the bucket has to be created before
+    the processes and handed to them as they start, e.g. as an argument of a
+    process pool initializer. ``time.monotonic`` is the same in every process
+    of a machine, so they all refill the bucket alike.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        period: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        # The tokens and the time they were last refilled at.
+        self._state = multiprocessing.Array("d", 2)
+        super().__init__(capacity, period, clock)
+
+    @property
+    def _tokens(self) -> float:
+        return self._state[0]
+
+    @_tokens.setter
+    def _tokens(self, tokens: float) -> None:
+        self._state[0] = tokens
+
+    @property
+    def _updated_at(self) -> float:
+        return self._state[1]
+
+    @_updated_at.setter
+    def _updated_at(self, updated_at: float) -> None:
+        self._state[1] = updated_at
+
+    @property
+    def remaining(self) -> float:
+        with self._state.get_lock():
+            return super().remaining
+
+    def time_until_available(self) -> float:
+        with self._state.get_lock():
+            return super().time_until_available()
+
+    def try_acquire(self) -> bool:
+        with self._state.get_lock():
+            return super().try_acquire()
+
+    def refund(self) -> None:
+        with self._state.get_lock():
+            super().refund()
+
+
+class PauseDeadline:
+    """The time requests are held back until, e.g. after a ``Retry-After``."""
+
+    def __init__(self) -> None:
+        self._resume_at = 0.0
+
+    @property
+    def resume_at(self) -> float:
+        return self._resume_at
+
+    def extend(self, resume_at: float) -> None:
+        """Holds requests back until ``resume_at`` unless they already are."""
+        self._resume_at = max(self._resume_at, resume_at)
+
+
+class SharedPauseDeadline(PauseDeadline):
+    """A pause deadline honored by several processes.
+
+    Like a ``SharedTokenBucket``, it lives in shared memory and has to be
+    handed to the processes as they start.
+    """
+
+    def __init__(self) -> None:
+        self._state = multiprocessing.Value("d", 0.0)
+        super().__init__()
+
+    @property
+    def _resume_at(self) -> float:
+        return self._state.value
+
+    @_resume_at.setter
+    def _resume_at(self, resume_at: float) -> None:
+        self._state.value = resume_at
+
+    def extend(self, resume_at: float) -> None:
+        with self._state.get_lock():
+            super().extend(resume_at)
+
+
+@dataclasses.dataclass(frozen=True)
+class Quota:
+    """The budgets of an API key and the deadline of its pause."""
+
+    buckets: Sequence[TokenBucket]
+    pause_deadline: PauseDeadline = dataclasses.field(default_factory=PauseDeadline)
+
+
+def create_quota_buckets(
+    requests_per_minute: int | None = None,
+    requests_per_day: int | None = None,
+    clock: Callable[[], float] = time.monotonic,
+    bucket_type: type[TokenBucket] = TokenBucket,
+) -> list[TokenBucket]:
+    """Creates the buckets of a per-minute and a per-day budget."""
+    buckets = []
+
+    if requests_per_minute:
+        buckets.append(bucket_type(requests_per_minute, _SECONDS_IN_MINUTE, clock))
+
+    if requests_per_day:
+        buckets.append(bucket_type(requests_per_day, _SECONDS_IN_DAY, clock))
+
+    return buckets
+
+
+class QuotaRateLimiter:
+    """Keeps requests within a per-minute and a per-day budget.
+
+    Waiters of ``acquire`` are served in FIFO order, ``try_acquire`` takes a
+    request without waiting or queueing. A request is only taken when every
+    budget has room for it. The limiter can also be paused, e.g. when the
+    API answers with ``Retry-After``, which holds back every request sharing
+    the quota instead of only the one that was rejected. Given a ``quota``,
+    e.g. one shared by processes, the budgets and the pause are its own.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int | None = None,
+        requests_per_day: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        quota: Quota | None = None,
+    ) -> None:
+        self._clock = clock
+        self._quota = quota or Quota(
+            buckets=create_quota_buckets(requests_per_minute, requests_per_day, clock),
+        )
+        self._buckets = list(self._quota.buckets)
+        self._lock = asyncio.Lock()
+
+    @property
+    def remaining(self) -> float:
+        """The number of requests that can be made right now."""
+        return min(
+            (bucket.remaining for bucket in self._buckets),
+            default=float("inf"),
+        )
+
+    def pause(self, seconds: float) -> None:
+        self._quota.pause_deadline.extend(self._clock() + seconds)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while not self.try_acquire():
+                await asyncio.sleep(self.delay())
+
+    def try_acquire(self) -> bool:
+        if self.delay():
+            return False
+
+        for index, bucket in enumerate(self._buckets):
+            if not bucket.try_acquire():
+                # Another process took the last token in the meantime.
+                for taken_bucket in self._buckets[:index]:
+                    taken_bucket.refund()
+
+                return False
+
+        return True
+
+    def delay(self) -> float:
+        """Seconds until a request can be made."""
+        return max(
+            self._quota.pause_deadline.resume_at - self._clock(),
+            *(bucket.time_until_available() for bucket in self._buckets),
+            0,
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class RetryPolicy:
+    """Jittered exponential backoff for rate-limited and failed requests."""
+
+    max_retries: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def is_retryable(self, response: httpx.Response) -> bool:
+        return (
+            response.status_code == httpx.codes.TOO_MANY_REQUESTS
+            or response.status_code >= httpx.codes.INTERNAL_SERVER_ERROR
+        )
+
+    def delay(self, attempt: int, response: httpx.Response) -> float:
+        retry_after = parse_retry_after(response)
+
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        return random.uniform(
+            0,
+            min(self.max_delay, self.base_delay * 2**attempt),
+        )
+
+
+def parse_retry_after(response: httpx.Response) -> float | None:
+    """Returns the ``Retry-After`` header in seconds if there is a valid one."""
+    header = response.headers.get("retry-after")
+
+    if header is None:
+        return None
+
+    try:
+        return max(float(header), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+
+    return max(
+        (retry_at - datetime.datetime.now(tz=datetime.timezone.utc)).total_seconds(),
+        0,
+    )
@@ -0,0 +1,131 @@
+import concurrent.futures
+
+import httpx
+
+from app.api import rate_limit
+
+_shared_bucket: rate_limit.TokenBucket | None = None
+_shared_quota: rate_limit.Quota | None = None
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_refills_over_time() -> None:
+    clock = _FakeClock()
+    bucket = rate_limit.TokenBucket(capacity=2, period=60, clock=clock)
+
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.time_until_available() == 30
+
+    clock.now = 30
+
+    assert bucket.try_acquire()
+
+
+def _init_process(bucket: rate_limit.TokenBucket) -> None:
+    global _shared_bucket
+    _shared_bucket = bucket
+
+
+def _drain_shared_bucket() -> int:
+    acquired = 0
+
+    while _shared_bucket is not None and _shared_bucket.try_acquire():
+        acquired += 1
+
+    return acquired
+
+
+def test_shared_token_bucket_is_drawn_from_by_every_process() -> None:
+    bucket = rate_limit.SharedTokenBucket(capacity=50, period=24 * 60 * 60)
+
+    with concurrent.futures.ProcessPoolExecutor(
+        2,
+        initializer=_init_process,
+        initargs=(bucket,),
+    ) as executor:
+        acquired = [executor.submit(_drain_shared_bucket) for _ in range(4)]
+
+        assert sum(future.result() for future in acquired) == 50
+
+    assert not bucket.try_acquire()
+
+
+def test_limiter_waits_for_the_strictest_budget() -> None:
+    clock = _FakeClock()
+    limiter = rate_limit.QuotaRateLimiter(
+        requests_per_minute=10,
+        requests_per_day=1,
+        clock=clock,
+    )
+
+    assert limiter.remaining == 1
+
+    limiter.pause(5)
+
+    assert limiter.delay() == 5
+
+
+class _DrainedElsewhereBucket(rate_limit.TokenBucket):
+    """Looks available, but another process takes the token first."""
+
+    def try_acquire(self) -> bool:
+        return False
+
+
+def test_limiter_refunds_when_a_budget_refuses() -> None:
+    clock = _FakeClock()
+    minute_bucket = rate_limit.TokenBucket(capacity=10, period=60, clock=clock)
+    limiter = rate_limit.QuotaRateLimiter(
+        quota=rate_limit.Quota(
+            buckets=[
+                minute_bucket,
+                _DrainedElsewhereBucket(capacity=1, period=24 * 60 * 60, clock=clock),
+            ],
+        ),
+    )
+
+    assert not limiter.try_acquire()
+    assert minute_bucket.remaining == 10
+
+
+def _init_quota_process(quota: rate_limit.Quota) -> None:
+    global _shared_quota
+    _shared_quota = quota
+
+
+def _pause_shared_quota(seconds: float) -> None:
+    rate_limit.QuotaRateLimiter(quota=_shared_quota).pause(seconds)
+
+
+def test_pause_is_shared_by_every_process() -> None:
+    quota = rate_limit.Quota(
+        buckets=[],
+        pause_deadline=rate_limit.SharedPauseDeadline(),
+    )
+
+    with concurrent.futures.ProcessPoolExecutor(
+        1,
+        initializer=_init_quota_process,
+        initargs=(quota,),
+    ) as executor:
+        executor.submit(_pause_shared_quota, 60).result()
+
+    assert rate_limit.QuotaRateLimiter(quota=quota).delay() > 50
+
+
+def test_retry_after_is_honored() -> None:
+    policy = rate_limit.RetryPolicy(max_delay=10)
+
+    assert policy.delay(0, httpx.Response(429, headers={"Retry-After": "7"})) == 7
+    assert policy.delay(0, httpx.Response(429, headers={"Retry-After": "70"})) == 10
+    assert rate_limit.parse_retry_after(httpx.Response(429)) is None
+    assert 0 <= policy.delay(3, httpx.Response(503)) <= 8
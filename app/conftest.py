@@ -1,12 +1,14 @@
+import asyncio
+import datetime
 import json
 from collections.abc import AsyncIterator
-from typing import Any
+from typing import Any, Literal
 
 import aiofiles
 import httpx
 import pytest
 
-from app.api import client
+from app.api import client, models
 
 
 async def load_json_fixture(
@@ -16,6 +18,59 @@ async def load_json_fixture(
         return json.loads(await file_handle.read())
 
 
+def make_response(
+    identifier: str,
+    malicious: int = 0,
+    type_: Literal["url", "ip_address", "file"] = "ip_address",
+    last_analysis_date: datetime.datetime = datetime.datetime(2024, 8, 22),
+    harmless: int = 0,
+    suspicious: int = 0,
+) -> models.LookupResponse:
+    return models.LookupResponse(
+        data=models.LookupData(
+            id=identifier,
+            type=type_,
+            attributes=models.LookupAttributes(
+                last_analysis_date=last_analysis_date,
+                last_analysis_stats=models.LastAnalysisStats(
+                    harmless=harmless,
+                    malicious=malicious,
+                    suspicious=suspicious,
+                    timeout=0,
+                    undetected=0,
+                ),
+            ),
+        ),
+    )
+
+
+class RecordingLookupClient(client.LookupClient):
+    """Records the identifiers it looks up, each taking a moment."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.lookups: list[str] = []
+        self._fail = fail
+
+    async def lookup(self, identifier: str) -> models.LookupResponse:
+        self.lookups.append(identifier)
+        await asyncio.sleep(0.01)
+
+        if self._fail:
+            raise RuntimeError("upstream failed")
+
+        return make_response(identifier)
+
+
+@pytest.fixture()
+def upstream_client() -> RecordingLookupClient:
+    return RecordingLookupClient()
+
+
+@pytest.fixture()
+def failing_upstream_client() -> RecordingLookupClient:
+    return RecordingLookupClient(fail=True)
+
+
 @pytest.fixture()
 async def http_client() -> AsyncIterator[httpx.AsyncClient]:
     async with httpx.AsyncClient() as http_client:
@@ -1,29 +1,48 @@
 import asyncio
+import concurrent.futures
 import contextlib
+import functools
+import importlib
+import os
 import pathlib
 import types
-from collections.abc import Coroutine
+from collections.abc import Callable, Coroutine, Mapping, Sequence
+from typing import Any, cast
 
-import httpx
 import structlog
 
-from app import managers
-from app.api import client
-from app.presenters import cli_presenter, json_presenter
-from app.readers import cli_reader, filters, json_reader, validator
+from app import managers, metrics, sharding
+from app.api import client, connection, key_pool, models, rate_limit
+from app.readers import canonicalizer, filters, validator
 
 _logger = structlog.get_logger(__name__)
 
+_IP_ADDRESS = "ip_address"
+_URL = "url"
+_FILE = "file"
+_DIRECTORY = "directory"
+
+# Module and class names, so only the reader and presenter a run uses are
+# imported.
 _READER_MAP = types.MappingProxyType(
     {
-        "json-file": json_reader.JsonFileReader,
-        "cli": cli_reader.CliReader,
+        "json-file": ("app.readers.json_reader", "JsonFileReader"),
+        "ndjson-file": ("app.readers.ndjson_reader", "NdjsonFileReader"),
+        "text-file": ("app.readers.text_reader", "TextFileReader"),
+        "csv-file": ("app.readers.csv_reader", "CsvFileReader"),
+        "cli": ("app.readers.cli_reader", "CliReader"),
     },
 )
 _PRESENTER_MAP = types.MappingProxyType(
     {
-        "json-file": json_presenter.JsonFilePresenter,
-        "cli": cli_presenter.CliPresenter,
+        "json-file": ("app.presenters.json_presenter", "JsonFilePresenter"),
+        "ndjson-file": ("app.presenters.json_presenter", "NdjsonFilePresenter"),
+        "compact-json-file": (
+            "app.presenters.json_presenter",
+            "CompactJsonFilePresenter",
+        ),
+        "sqlite": ("app.presenters.sqlite_presenter", "SqlitePresenter"),
+        "cli": ("app.presenters.cli_presenter", "CliPresenter"),
     },
 )
 
@@ -31,7 +50,20 @@ _PRESENTER_MAP = types.MappingProxyType(
 def _reader_factory(reader_type: str, **kwargs) -> managers.IdentifierReader:
     kwargs = {key_: val for key_, val in kwargs.items() if val is not None}
 
-    return _READER_MAP[reader_type](**kwargs)
+    return _import_class(*_READER_MAP[reader_type])(**kwargs)
+
+
+def _presenter_factory(
+    presenter_type: str,
+    **kwargs,
+) -> managers.ResultsPresenter:
+    kwargs = {key_: val for key_, val in kwargs.items() if val is not None}
+
+    return _import_class(*_PRESENTER_MAP[presenter_type])(**kwargs)
+
+
+def _import_class(module_name: str, class_name: str) -> Any:
+    return getattr(importlib.import_module(module_name), class_name)
 
 
 def run_loop_handle_exceptions(main: Coroutine[None, None, None], debug: bool) -> None:
@@ -47,63 +79,493 @@ def run_loop_handle_exceptions(main: Coroutine[None, None, None], debug: bool) -
         raise SystemExit(1) from ex
 
 
-async def ip_lookup_handler(
-    api_key: str,
-    group_max_size: int,
-    reader: str,
-    presenter: str,
-    source: pathlib.Path | None,
+async def ip_lookup_handler(**kwargs: Any) -> None:
+    await _lookup_handler(
+        client_types={_IP_ADDRESS: client.VirusTotalIpLookupClient},
+        validator_=validator.IpValidator(),
+        canonicalizer_=canonicalizer.IpCanonicalizer(),
+        **kwargs,
+    )
+
+
+async def url_lookup_handler(**kwargs: Any) -> None:
+    await _lookup_handler(
+        client_types={_URL: client.VirusTotalUrlLookupClient},
+        validator_=validator.UrlValidator(),
+        canonicalizer_=canonicalizer.UrlCanonicalizer(),
+        **kwargs,
+    )
+
+
+async def files_lookup_handler(**kwargs: Any) -> None:
+    await _lookup_handler(
+        client_types={_FILE: client.VirusTotalFileLookupClient},
+        validator_=validator.HashValidator(),
+        canonicalizer_=canonicalizer.HashCanonicalizer(),
+        reader=_DIRECTORY,
+        column=None,
+        validation_workers=0,
+        **kwargs,
+    )
+
+
+async def mixed_lookup_handler(**kwargs: Any) -> None:
+    # IPs go first, the URL validator accepts none of them anyway.
+    mixed_validator = validator.MixedValidator(
+        {
+            _IP_ADDRESS: validator.IpValidator(),
+            _URL: validator.UrlValidator(),
+        },
+    )
+
+    await _lookup_handler(
+        client_types={
+            _IP_ADDRESS: client.VirusTotalIpLookupClient,
+            _URL: client.VirusTotalUrlLookupClient,
+        },
+        validator_=mixed_validator,
+        canonicalizer_=canonicalizer.MixedCanonicalizer(
+            classify=mixed_validator.classify,
+            canonicalizers={
+                _IP_ADDRESS: canonicalizer.IpCanonicalizer(),
+                _URL: canonicalizer.UrlCanonicalizer(),
+            },
+        ),
+        classify=mixed_validator.classify,
+        **kwargs,
+    )
+
+
+async def serve_handler(
+    host: str,
+    port: int,
+    unix_socket: pathlib.Path | None,
+    memory_cache_size: int,
+    memory_cache_ttl: float,
+    max_in_flight: int,
+    **client_options: Any,
 ) -> None:
+    from app import server
+    from app.api import coalescing
+
     async with contextlib.AsyncExitStack() as stack:
-        await managers.LookupManager(
-            reader=_reader_factory(
-                reader_type=reader,
-                source=source,
-                filter_=filters.IdentifiersFilter(
+        lookup_clients = await _enter_lookup_clients(
+            stack,
+            client_types={
+                _IP_ADDRESS: client.VirusTotalIpLookupClient,
+                _URL: client.VirusTotalUrlLookupClient,
+                _FILE: client.VirusTotalFileLookupClient,
+            },
+            warm_up_connections=1,
+            **client_options,
+        )
+        coalescing_clients = {}
+
+        for kind, lookup_client in lookup_clients.items():
+            coalescing_clients[kind] = coalescing.CoalescingLookupClient(
+                lookup_client=lookup_client,
+                namespace=kind,
+                max_entries=memory_cache_size,
+                ttl=memory_cache_ttl,
+                max_in_flight=max_in_flight,
+            )
+            stack.callback(coalescing_clients[kind].log_stats)
+
+        await server.LookupServer(
+            routes={
+                "ip_addresses": server.Route(
+                    client=coalescing_clients[_IP_ADDRESS],
                     validator=validator.IpValidator(),
+                    canonicalizer=canonicalizer.IpCanonicalizer(),
                 ),
-            ),
-            presenter=_PRESENTER_MAP[presenter](),
-            lookuper=client.VirusTotalClientOrchestrator(
-                client=client.VirusTotalIpLookupClient(
-                    http_client=await stack.enter_async_context(
-                        httpx.AsyncClient(
-                            http2=True,
-                        ),
-                    ),
-                    api_key=api_key,
+                "urls": server.Route(
+                    client=coalescing_clients[_URL],
+                    validator=validator.UrlValidator(),
+                    canonicalizer=canonicalizer.UrlCanonicalizer(),
                 ),
-                group_max_size=group_max_size,
-            ),
-        ).present_lookup_results()
+                "files": server.Route(
+                    client=coalescing_clients[_FILE],
+                    validator=validator.HashValidator(),
+                    canonicalizer=canonicalizer.HashCanonicalizer(),
+                ),
+            },
+        ).serve(
+            host=host,
+            port=port,
+            unix_socket=str(unix_socket) if unix_socket is not None else None,
+        )
 
 
-async def url_lookup_handler(
-    api_key: str,
+async def _lookup_handler(
+    client_types: Mapping[str, type[client.VirusTotalClient]],
+    validator_: validator.Validator,
+    canonicalizer_: canonicalizer.Canonicalizer,
     group_max_size: int,
+    scheduler: str,
+    adaptive_max_size: int,
+    canonicalize: bool,
+    dedup_window: int,
+    journal_path: pathlib.Path | None,
+    resume: bool,
+    since_results: pathlib.Path | None,
+    since_max_age: float,
+    stream: bool,
+    queue_size: int,
     reader: str,
     presenter: str,
     source: pathlib.Path | None,
+    column: str | None,
+    validation_workers: int,
+    output: pathlib.Path | None,
+    stats: bool,
+    prometheus_file: pathlib.Path | None,
+    classify: Callable[[str], str | None] | None = None,
+    hash_cache_path: pathlib.Path | None = None,
+    hashing_workers: int | None = None,
+    workers: int = 1,
+    **client_options: Any,
 ) -> None:
+    """Looks up identifiers of the kinds in ``client_types``.
+
+    The kind of an identifier is also its cache namespace. With several
+    kinds, ``classify`` tells which client an identifier is routed to, and
+    every client shares the same connections, API keys and concurrency.
+    With several ``workers``, the lookups are sharded over as many processes
+    that share the request budget of the API keys.
+    """
+    run_metrics = metrics.reset()
+    previous_results = None
+    # The files hashes were read from, to name the ones VirusTotal doesn't
+    # know. Worker processes can't see them.
+    file_sources: dict[str, str] | None = (
+        {} if reader == _DIRECTORY and workers == 1 else None
+    )
+
+    if since_results is not None:
+        from app.api import previous_results as previous_results_
+
+        previous_results = previous_results_.load(
+            since_results,
+            canonicalize=canonicalizer_.canonicalize if canonicalize else None,
+        )
+
     async with contextlib.AsyncExitStack() as stack:
-        await managers.LookupManager(
-            reader=_reader_factory(
+        # Registered first, so it runs last and sees the stats of every layer.
+        stack.callback(_report_metrics, run_metrics, stats, prometheus_file)
+        partial_lookuper: client.PartialResultsLookuper
+
+        if workers > 1:
+            quotas = sharding.create_quotas(
+                keys=client_options["api_key"],
+                requests_per_minute=client_options["requests_per_minute"],
+                requests_per_day=client_options["requests_per_day"],
+            )
+            partial_lookuper = sharding.ShardedLookuper(
+                executor=stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(
+                        workers,
+                        initializer=sharding.init_worker,
+                        initargs=(
+                            quotas,
+                            functools.partial(
+                                _enter_shard_lookuper,
+                                client_types=client_types,
+                                classify=classify,
+                                group_max_size=group_max_size,
+                                scheduler=scheduler,
+                                adaptive_max_size=adaptive_max_size,
+                                previous_results=previous_results,
+                                since_max_age=since_max_age,
+                                client_options=client_options,
+                            ),
+                        ),
+                    ),
+                ),
+                workers=workers,
+                batch_size=queue_size,
+                lookup_shard=sharding.lookup_shard,
+            )
+        else:
+            lookup_client = await _enter_lookup_client(
+                stack,
+                client_types=client_types,
+                classify=classify,
+                warm_up_connections=group_max_size,
+                previous_results=previous_results,
+                since_max_age=since_max_age,
+                **client_options,
+            )
+
+            if journal_path is not None:
+                from app.api import journal
+
+                lookup_client = journal.JournalingLookupClient(
+                    lookup_client=lookup_client,
+                    journal=await stack.enter_async_context(
+                        journal.LookupJournal(path=journal_path, resume=resume),
+                    ),
+                )
+
+            if file_sources is not None:
+                lookup_client = client.SourcedLookupClient(
+                    lookup_client=lookup_client,
+                    sources=file_sources,
+                )
+
+            partial_lookuper = client.VirusTotalClientOrchestrator(
+                client=lookup_client,
+                group_max_size=group_max_size,
+                scheduler=scheduler,
+                adaptive_max_size=adaptive_max_size,
+            )
+
+        lookuper: managers.MultipleResourceLookuper = partial_lookuper
+
+        if canonicalize:
+            lookuper = client.DeduplicatingLookuper(
+                orchestrator=partial_lookuper,
+                canonicalize=canonicalizer_.canonicalize,
+                window=dedup_window,
+            )
+
+        reader_: managers.IdentifierReader
+
+        if reader == _DIRECTORY:
+            from app.readers import directory_reader, hash_cache
+
+            hashing_workers = hashing_workers or os.cpu_count() or 1
+            reader_ = directory_reader.DirectoryReader(
+                source=cast(pathlib.Path, source),
+                executor=stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(hashing_workers),
+                ),
+                max_workers=hashing_workers,
+                hash_cache_=(
+                    stack.enter_context(hash_cache.HashCache(str(hash_cache_path)))
+                    if hash_cache_path is not None
+                    else None
+                ),
+                sources=file_sources,
+            )
+        else:
+            reader_ = _reader_factory(
                 reader_type=reader,
                 source=source,
+                column=column,
                 filter_=filters.IdentifiersFilter(
-                    validator=validator.UrlValidator(),
-                ),
-            ),
-            presenter=_PRESENTER_MAP[presenter](),
-            lookuper=client.VirusTotalClientOrchestrator(
-                client=client.VirusTotalUrlLookupClient(
-                    http_client=await stack.enter_async_context(
-                        httpx.AsyncClient(
-                            http2=True,
-                        ),
+                    validator=validator_,
+                    executor=(
+                        stack.enter_context(
+                            concurrent.futures.ProcessPoolExecutor(validation_workers),
+                        )
+                        if validation_workers
+                        else None
                     ),
-                    api_key=api_key,
                 ),
-                group_max_size=group_max_size,
+            )
+        presenter_ = _presenter_factory(presenter_type=presenter, output=output)
+
+        if stream:
+            await managers.StreamingLookupManager(
+                reader=reader_,
+                presenter=presenter_,
+                lookuper=lookuper,
+                queue_size=queue_size,
+            ).present_lookup_results()
+        else:
+            await managers.LookupManager(
+                reader=reader_,
+                presenter=presenter_,
+                lookuper=lookuper,
+            ).present_lookup_results()
+
+
+async def _enter_shard_lookuper(
+    stack: contextlib.AsyncExitStack,
+    client_types: Mapping[str, type[client.VirusTotalClient]],
+    classify: Callable[[str], str | None] | None,
+    group_max_size: int,
+    scheduler: str,
+    adaptive_max_size: int,
+    previous_results: Mapping[str, models.LookupResponse] | None,
+    since_max_age: float,
+    client_options: Mapping[str, Any],
+) -> client.PartialResultsLookuper:
+    """Creates the lookuper a worker process looks up its shards with."""
+    lookup_client = await _enter_lookup_client(
+        stack,
+        client_types=client_types,
+        classify=classify,
+        warm_up_connections=group_max_size,
+        quotas=sharding.get_quotas(),
+        previous_results=previous_results,
+        since_max_age=since_max_age,
+        **client_options,
+    )
+
+    return client.VirusTotalClientOrchestrator(
+        client=lookup_client,
+        group_max_size=group_max_size,
+        scheduler=scheduler,
+        adaptive_max_size=adaptive_max_size,
+    )
+
+
+async def _enter_lookup_client(
+    stack: contextlib.AsyncExitStack,
+    client_types: Mapping[str, type[client.VirusTotalClient]],
+    classify: Callable[[str], str | None] | None,
+    previous_results: Mapping[str, models.LookupResponse] | None = None,
+    since_max_age: float = 0,
+    **client_options: Any,
+) -> client.LookupClient:
+    """Creates the client of one kind, or one routing between several kinds.
+
+    Given ``previous_results``, those still fresh are returned instead of
+    being looked up again.
+    """
+    lookup_clients = await _enter_lookup_clients(
+        stack,
+        client_types=client_types,
+        **client_options,
+    )
+    lookup_client: client.LookupClient
+
+    if classify is None:
+        (lookup_client,) = lookup_clients.values()
+    else:
+        lookup_client = client.RoutingLookupClient(
+            clients=lookup_clients,
+            classify=classify,
+        )
+
+    if previous_results is None:
+        return lookup_client
+
+    from app.api import previous_results as previous_results_
+
+    carrying_client = previous_results_.PreviousResultsLookupClient(
+        lookup_client=lookup_client,
+        previous=previous_results,
+        max_age=since_max_age,
+    )
+    stack.callback(carrying_client.log_stats)
+
+    return carrying_client
+
+
+async def _enter_lookup_clients(
+    stack: contextlib.AsyncExitStack,
+    client_types: Mapping[str, type[client.VirusTotalClient]],
+    warm_up_connections: int,
+    api_key: Sequence[str],
+    api_url: str | None,
+    requests_per_minute: int | None,
+    requests_per_day: int | None,
+    max_retries: int,
+    keep_full_payload: bool,
+    cache_path: pathlib.Path | None,
+    cache_ttl: int,
+    cache_max_entries: int,
+    cache_mode: str,
+    max_connections: int,
+    max_keepalive_connections: int,
+    keepalive_expiry: float,
+    connect_timeout: float,
+    read_timeout: float,
+    http2: bool,
+    warm_up: bool,
+    hedge: bool,
+    hedge_percentile: float,
+    hedge_max_ratio: float,
+    quotas: sharding.Quotas | None = None,
+) -> dict[str, client.LookupClient]:
+    """Creates a client per kind, all sharing connections and API keys."""
+    api_url = api_url or client.DEFAULT_API_URL
+    api_keys = key_pool.ApiKeyPool(
+        keys=api_key,
+        requests_per_minute=requests_per_minute,
+        requests_per_day=requests_per_day,
+        quotas=quotas,
+    )
+    stack.callback(api_keys.log_stats)
+    connection_stats = connection.ConnectionStats()
+    stack.callback(connection_stats.log_stats)
+    connection_settings = connection.ConnectionSettings(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        http2=http2,
+    )
+    http_client = await stack.enter_async_context(
+        connection.create_http_client(connection_settings, connection_stats),
+    )
+
+    if warm_up:
+        await connection.warm_up(
+            http_client,
+            url=api_url,
+            connections=min(warm_up_connections, max_keepalive_connections),
+        )
+
+    lookup_clients: dict[str, client.LookupClient] = {
+        kind: client_type(
+            http_client=http_client,
+            api_key=api_keys,
+            retry_policy=rate_limit.RetryPolicy(max_retries=max_retries),
+            keep_full_payload=keep_full_payload,
+            api_url=api_url,
+        )
+        for kind, client_type in client_types.items()
+    }
+
+    if hedge:
+        from app.api import hedging
+
+        for kind in client_types:
+            hedging_client = hedging.HedgingLookupClient(
+                lookup_client=lookup_clients[kind],
+                namespace=kind,
+                percentile=hedge_percentile,
+                max_ratio=hedge_max_ratio,
+            )
+            stack.callback(hedging_client.log_stats)
+            lookup_clients[kind] = hedging_client
+
+    if cache_path is not None:
+        from app.api import cache
+
+        lookup_cache = stack.enter_context(
+            cache.LookupCache(
+                path=str(cache_path),
+                ttl=cache_ttl,
+                max_entries=cache_max_entries,
+                keep_full_payload=keep_full_payload,
             ),
-        ).present_lookup_results()
+        )
+
+        for kind in client_types:
+            cached_client = cache.CachedLookupClient(
+                lookup_client=lookup_clients[kind],
+                cache=lookup_cache,
+                namespace=kind,
+                mode=cache_mode,
+            )
+            stack.callback(cached_client.log_stats)
+            lookup_clients[kind] = cached_client
+
+    return lookup_clients
+
+
+def _report_metrics(
+    run_metrics: metrics.RunMetrics,
+    stats: bool,
+    prometheus_file: pathlib.Path | None,
+) -> None:
+    if stats:
+        _logger.info("Run stats", **run_metrics.summary())
+
+    if prometheus_file is not None:
+        run_metrics.write_prometheus_textfile(prometheus_file)
@@ -0,0 +1,9 @@
+from app import handlers
+
+
+def test_every_reader_and_presenter_can_be_imported() -> None:
+    for module_name, class_name in (
+        *handlers._READER_MAP.values(),
+        *handlers._PRESENTER_MAP.values(),
+    ):
+        assert isinstance(handlers._import_class(module_name, class_name), type)
@@ -6,19 +6,30 @@ from typing import Any
 import click
 import structlog
 
-from app import handlers, logger
+from app import logger
 
 _logger = structlog.get_logger(__name__)
 
 _JSON_FILE = "json-file"
+_NDJSON_FILE = "ndjson-file"
+_TEXT_FILE = "text-file"
+_CSV_FILE = "csv-file"
+_FILE_READERS = (_JSON_FILE, _NDJSON_FILE, _TEXT_FILE, _CSV_FILE)
+_COLUMN_READERS = (_NDJSON_FILE, _CSV_FILE)
+_FILE_PRESENTERS = (_JSON_FILE, _NDJSON_FILE, "compact-json-file", "sqlite")
+_SLIDING_WINDOW = "sliding-window"
+_GROUPED = "grouped"
+_ADAPTIVE = "adaptive"
 
 
 def _source_validator(
     ctx: click.Context, param: click.Parameter, value: pathlib.Path | None
 ) -> pathlib.Path | None:
-    if ctx.params["reader"] == _JSON_FILE and not value:
+    if ctx.params["reader"] in _FILE_READERS and not value:
         raise click.BadParameter(
-            "{0} is required when reader is {1}".format(param.name, _JSON_FILE),
+            "{0} is required when reader is {1}".format(
+                param.name, ctx.params["reader"]
+            ),
             ctx=ctx,
             param=param,
         )
@@ -26,6 +37,203 @@ def _source_validator(
     return value
 
 
+def _output_validator(
+    ctx: click.Context, param: click.Parameter, value: pathlib.Path | None
+) -> pathlib.Path | None:
+    if value is not None and ctx.params["presenter"] not in _FILE_PRESENTERS:
+        raise click.BadParameter(
+            "{0} is only supported by the {1} presenters".format(
+                param.name, ", ".join(_FILE_PRESENTERS)
+            ),
+            ctx=ctx,
+            param=param,
+        )
+
+    return value
+
+
+def _resume_validator(ctx: click.Context, param: click.Parameter, value: bool) -> bool:
+    if value and ctx.params.get("journal_path") is None:
+        raise click.BadParameter(
+            "{0} requires --journal".format(param.name),
+            ctx=ctx,
+            param=param,
+        )
+
+    return value
+
+
+def _workers_validator(ctx: click.Context, param: click.Parameter, value: int) -> int:
+    if value > 1 and ctx.params.get("journal_path") is not None:
+        raise click.BadParameter(
+            "{0} can't be combined with --journal".format(param.name),
+            ctx=ctx,
+            param=param,
+        )
+
+    return value
+
+
+def _column_validator(
+    ctx: click.Context, param: click.Parameter, value: str | None
+) -> str | None:
+    if value is not None and ctx.params["reader"] not in _COLUMN_READERS:
+        raise click.BadParameter(
+            "{0} is only supported by the {1} readers".format(
+                param.name, ", ".join(_COLUMN_READERS)
+            ),
+            ctx=ctx,
+            param=param,
+        )
+
+    return value
+
+
+def _client_options(func: Callable[..., Any]) -> Callable[..., Any]:
+    decorated_func = click.option(
+        "--requests-per-minute",
+        type=click.IntRange(min=1),
+        required=False,
+        help="Request budget per minute of every API key, unlimited by default",
+    )(func)
+    decorated_func = click.option(
+        "--requests-per-day",
+        type=click.IntRange(min=1),
+        required=False,
+        help="Request budget per day of every API key, unlimited by default",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--max-retries",
+        type=click.IntRange(min=0, max=10),
+        default=3,
+        show_default=True,
+        required=False,
+        help="Retries of a lookup that got a 429 or 5xx response",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--keep-full-payload/--no-keep-full-payload",
+        default=False,
+        show_default=True,
+        help="Keep every attribute of the API responses instead of only"
+        " the analysis stats",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--cache-path",
+        type=click.Path(dir_okay=False, path_type=pathlib.Path),
+        required=False,
+        help="SQLite file caching lookup responses between runs",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--cache-ttl",
+        type=click.IntRange(min=0),
+        default=24 * 60 * 60,
+        show_default=True,
+        required=False,
+        help="Seconds a cached lookup response stays fresh",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--cache-max-entries",
+        type=click.IntRange(min=1),
+        default=1_000_000,
+        show_default=True,
+        required=False,
+        help="Least recently used responses are evicted above this size",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--cache-mode",
+        type=click.Choice(["use", "refresh", "bypass"]),
+        default="use",
+        show_default=True,
+        required=False,
+        help="refresh ignores cached responses but stores new ones,"
+        " bypass doesn't touch the cache at all",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--api-url",
+        required=False,
+        help="Base URL of the VirusTotal API, e.g. of a proxy, instead of the"
+        " public one",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--max-connections",
+        type=click.IntRange(min=1),
+        default=100,
+        show_default=True,
+        help="Maximum number of open connections to the API",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--max-keepalive-connections",
+        type=click.IntRange(min=0),
+        default=50,
+        show_default=True,
+        help="Idle connections kept open for reuse, keep it at least"
+        " --group-max-size with HTTP/1.1",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--keepalive-expiry",
+        type=click.FloatRange(min=0),
+        default=30.0,
+        show_default=True,
+        help="Seconds an idle connection is kept open",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--connect-timeout",
+        type=click.FloatRange(min=0, min_open=True),
+        default=10.0,
+        show_default=True,
+        help="Seconds to wait for a connection to be established",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--read-timeout",
+        type=click.FloatRange(min=0, min_open=True),
+        default=30.0,
+        show_default=True,
+        help="Seconds to wait for a response",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--http2/--http1",
+        default=True,
+        show_default=True,
+        help="Multiplex the lookups over HTTP/2 when the API supports it",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--warm-up/--no-warm-up",
+        default=True,
+        show_default=True,
+        help="Open the connections to the API before the first lookups",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--hedge/--no-hedge",
+        default=False,
+        show_default=True,
+        help="Send a second request for lookups slower than --hedge-percentile"
+        " and take whichever answers first",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--hedge-percentile",
+        type=click.FloatRange(min=50, max=99.9),
+        default=95.0,
+        show_default=True,
+        help="Percentile of the recent lookup latencies after which a lookup"
+        " is hedged",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--hedge-max-ratio",
+        type=click.FloatRange(min=0, max=1),
+        default=0.05,
+        show_default=True,
+        help="Largest share of the lookups that may be hedged",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--api-key",
+        required=True,
+        multiple=True,
+        help="Can be given several times to spread the lookups over many keys",
+    )(decorated_func)
+
+    return decorated_func
+
+
 def _common_options(func: Callable[..., Any]) -> Callable[..., Any]:
     decorated_func = click.option(
         "--group-max-size",
@@ -33,31 +241,121 @@ def _common_options(func: Callable[..., Any]) -> Callable[..., Any]:
         default=4,
         show_default=True,
         type=click.IntRange(min=1, max=50),
-    )(func)
-    decorated_func = click.option("--api-key", required=True)(decorated_func)
+    )(_client_options(func))
     decorated_func = click.option(
-        "--source",
-        "-s",
-        type=click.Path(path_type=pathlib.Path),
+        "--scheduler",
+        type=click.Choice([_SLIDING_WINDOW, _GROUPED, _ADAPTIVE]),
+        default=_SLIDING_WINDOW,
+        show_default=True,
         required=False,
-        callback=_source_validator,
+        help="How lookups are scheduled within --group-max-size concurrency,"
+        " adaptive starts there and adapts it to the health of the API",
     )(decorated_func)
     decorated_func = click.option(
-        "--reader",
-        "-r",
-        type=click.Choice([_JSON_FILE, "cli"]),
-        default="json-file",
+        "--adaptive-max-size",
+        type=click.IntRange(min=1, max=500),
+        default=50,
         show_default=True,
         required=False,
+        help="Most lookups the adaptive scheduler runs at a time",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--canonicalize/--no-canonicalize",
+        default=True,
+        show_default=True,
+        help="Look up differently spelled identifiers only once",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--dedup-window",
+        type=click.IntRange(min=1),
+        default=100_000,
+        show_default=True,
+        help="Latest distinct identifiers whose results are reused for their"
+        " duplicates, duplicates further apart are looked up again",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--journal",
+        "journal_path",
+        type=click.Path(dir_okay=False, path_type=pathlib.Path),
+        required=False,
         is_eager=True,
+        help="File every completed lookup is recorded in",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--resume/--no-resume",
+        default=False,
+        show_default=True,
+        callback=_resume_validator,
+        help="Skip the lookups recorded in --journal by an interrupted run",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--since-results",
+        type=click.Path(exists=True, dir_okay=False, path_type=pathlib.Path),
+        required=False,
+        help="Results file of an earlier run whose fresh results are carried"
+        " over instead of looked up again",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--since-max-age",
+        type=click.FloatRange(min=0),
+        default=24 * 60 * 60,
+        show_default=True,
+        help="Seconds since its analysis a result of --since-results stays fresh",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--stats/--no-stats",
+        default=False,
+        show_default=True,
+        help="Log request latencies, retries, stage timings and counts at exit",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--prometheus-file",
+        type=click.Path(dir_okay=False, path_type=pathlib.Path),
+        required=False,
+        help="File the run metrics are written to for the node exporter"
+        " textfile collector",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--stream/--no-stream",
+        default=False,
+        show_default=True,
+        help="Present results while the lookups are still running",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--queue-size",
+        type=click.IntRange(min=1),
+        default=1000,
+        show_default=True,
+        required=False,
+        help="Items buffered between the stages of a streamed run",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--workers",
+        type=click.IntRange(min=1),
+        default=1,
+        show_default=True,
+        callback=_workers_validator,
+        help="Processes the lookups are sharded over, each with its own"
+        " connections and --group-max-size lookups at a time, sharing the"
+        " request budget of the API keys",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--output",
+        "-o",
+        type=click.Path(dir_okay=False, path_type=pathlib.Path),
+        required=False,
+        callback=_output_validator,
+        help="File the results are written to, named after the current time"
+        " by default, results.sqlite for the sqlite presenter",
     )(decorated_func)
     decorated_func = click.option(
         "--presenter",
         "-p",
-        type=click.Choice([_JSON_FILE, "cli"]),
+        type=click.Choice([*_FILE_PRESENTERS, "cli"]),
         default="json-file",
         show_default=True,
         required=False,
+        is_eager=True,
     )(decorated_func)
 
     @functools.wraps(func)
@@ -67,59 +365,199 @@ def _common_options(func: Callable[..., Any]) -> Callable[..., Any]:
     return wrapper
 
 
+def _reader_options(func: Callable[..., Any]) -> Callable[..., Any]:
+    decorated_func = click.option(
+        "--source",
+        "-s",
+        type=click.Path(path_type=pathlib.Path),
+        required=False,
+        callback=_source_validator,
+    )(func)
+    decorated_func = click.option(
+        "--validation-workers",
+        type=click.IntRange(min=0),
+        default=0,
+        show_default=True,
+        required=False,
+        help="Processes validating identifiers in parallel, 0 validates them"
+        " in the main process",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--column",
+        "-c",
+        required=False,
+        callback=_column_validator,
+        help="CSV column name or zero-based index, or NDJSON object key"
+        " holding the identifiers",
+    )(decorated_func)
+    decorated_func = click.option(
+        "--reader",
+        "-r",
+        type=click.Choice([*_FILE_READERS, "cli"]),
+        default="json-file",
+        show_default=True,
+        required=False,
+        is_eager=True,
+    )(decorated_func)
+
+    return decorated_func
+
+
+def _run(ctx: click.Context, handler: str, **options: Any) -> None:
+    # The handlers are imported here only, once a command runs, so --help and
+    # argument errors don't pay for httpx, pydantic and the readers and
+    # presenters.
+    from app import handlers
+
+    main = getattr(handlers, handler)(**options)
+    profiler = ctx.obj["profiler"]
+
+    if profiler is None:
+        handlers.run_loop_handle_exceptions(main=main, debug=ctx.obj["debug"])
+        return
+
+    with profiler.profile():
+        handlers.run_loop_handle_exceptions(
+            main=profiler.watch(main),
+            debug=ctx.obj["debug"],
+        )
+
+
 @click.option("--debug/--no-debug", default=False)
+@click.option(
+    "--profile",
+    "profile_dir",
+    type=click.Path(file_okay=False, path_type=pathlib.Path),
+    required=False,
+    help="Directory the CPU profile (pstats and collapsed stacks) of the run"
+    " is written to, the hottest functions are printed and the event loop"
+    " lag is logged",
+)
+@click.option(
+    "--profile-top",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+    help="How many of the hottest functions --profile prints",
+)
+@click.option(
+    "--profile-memory/--no-profile-memory",
+    default=False,
+    show_default=True,
+    help="With --profile, also trace the allocations of every pipeline stage",
+)
 @click.group()
 @click.pass_context
-def cli(ctx: click.Context, debug: bool) -> None:
+def cli(
+    ctx: click.Context,
+    debug: bool,
+    profile_dir: pathlib.Path | None,
+    profile_top: int,
+    profile_memory: bool,
+) -> None:
     logger.configure_logger(debug)
     ctx.ensure_object(dict)
     ctx.obj["debug"] = debug
+    ctx.obj["profiler"] = None
+
+    if profile_dir is not None:
+        from app import profiling
+
+        ctx.obj["profiler"] = profiling.Profiler(
+            output_dir=profile_dir,
+            top=profile_top,
+            trace_memory=profile_memory,
+        )
 
 
 @_common_options
+@_reader_options
 @cli.command()
 @click.pass_context
-def lookup_ips(
-    ctx: click.Context,
-    api_key: str,
-    group_max_size: int,
-    reader: str,
-    presenter: str,
-    source: pathlib.Path | None = None,
-) -> None:
-    handlers.run_loop_handle_exceptions(
-        main=handlers.ip_lookup_handler(
-            source=source,
-            api_key=api_key,
-            group_max_size=group_max_size,
-            reader=reader,
-            presenter=presenter,
-        ),
-        debug=ctx.obj["debug"],
-    )
+def lookup_ips(ctx: click.Context, **options: Any) -> None:
+    _run(ctx, "ip_lookup_handler", **options)
 
 
 @_common_options
+@_reader_options
 @cli.command()
 @click.pass_context
-def lookup_urls(
-    ctx: click.Context,
-    api_key: str,
-    group_max_size: int,
-    reader: str,
-    presenter: str,
-    source: pathlib.Path | None = None,
-) -> None:
-    handlers.run_loop_handle_exceptions(
-        main=handlers.url_lookup_handler(
-            source=source,
-            api_key=api_key,
-            group_max_size=group_max_size,
-            reader=reader,
-            presenter=presenter,
-        ),
-        debug=ctx.obj["debug"],
-    )
+def lookup_urls(ctx: click.Context, **options: Any) -> None:
+    _run(ctx, "url_lookup_handler", **options)
+
+
+@_common_options
+@_reader_options
+@cli.command()
+@click.pass_context
+def lookup_mixed(ctx: click.Context, **options: Any) -> None:
+    _run(ctx, "mixed_lookup_handler", **options)
+
+
+@_common_options
+@click.option(
+    "--source",
+    "-s",
+    type=click.Path(exists=True, file_okay=False, path_type=pathlib.Path),
+    required=True,
+    help="Directory whose files are hashed and looked up, recursively",
+)
+@click.option(
+    "--hash-cache",
+    "hash_cache_path",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+    required=False,
+    help="SQLite file remembering the hashes of files by path, size and"
+    " modification time, so unchanged files aren't hashed again",
+)
+@click.option(
+    "--hashing-workers",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Processes hashing files in parallel, one per CPU by default",
+)
+@cli.command()
+@click.pass_context
+def lookup_files(ctx: click.Context, **options: Any) -> None:
+    _run(ctx, "files_lookup_handler", **options)
+
+
+@_client_options
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option(
+    "--port", type=click.IntRange(min=0, max=65535), default=8080, show_default=True
+)
+@click.option(
+    "--unix-socket",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+    required=False,
+    help="Listen on this Unix socket instead of --host and --port",
+)
+@click.option(
+    "--memory-cache-size",
+    type=click.IntRange(min=0),
+    default=100_000,
+    show_default=True,
+    help="Recent responses kept in memory",
+)
+@click.option(
+    "--memory-cache-ttl",
+    type=click.FloatRange(min=0),
+    default=15 * 60,
+    show_default=True,
+    help="Seconds a response is served from memory",
+)
+@click.option(
+    "--max-in-flight",
+    type=click.IntRange(min=1),
+    default=16,
+    show_default=True,
+    help="Upstream lookups running at the same time",
+)
+@cli.command()
+@click.pass_context
+def serve(ctx: click.Context, **options: Any) -> None:
+    _run(ctx, "serve_handler", **options)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,24 @@
+import subprocess
+import sys
+
+
+def test_help_does_not_import_the_handlers() -> None:
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys\n"
+            "from app import main\n"
+            "try:\n"
+            "    main.cli(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print(sorted({'app.handlers', 'httpx', 'pydantic', 'validators'}"
+            " & set(sys.modules)))",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    assert completed.stdout.splitlines()[-1] == "[]"
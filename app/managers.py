@@ -1,15 +1,28 @@
 import abc
-from collections.abc import Sequence
+import asyncio
+import contextlib
+import sys
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Iterator,
+    Sequence,
+)
+from typing import ContextManager, Generic, TypeVar
 
+from app import metrics
 from app.api import models as api_models
 
+_T = TypeVar("_T")
+
 
 class MultipleResourceLookuper(abc.ABC):
     @abc.abstractmethod
     async def lookup(
         self,
         identifiers: Sequence[str],
-    ) -> list[api_models.LookupResponse]:
+    ) -> list[api_models.LookupResult]:
         pass
 
 
@@ -21,7 +34,31 @@ class IdentifierReader(abc.ABC):
 
 class ResultsPresenter(abc.ABC):
     @abc.abstractmethod
-    async def present(self, results: list[api_models.LookupResponse]) -> None:
+    async def present(self, results: list[api_models.LookupResult]) -> None:
+        pass
+
+
+class StreamingResourceLookuper(abc.ABC):
+    @abc.abstractmethod
+    def iter_lookup(
+        self,
+        identifiers: AsyncIterable[str],
+    ) -> AsyncIterator[api_models.LookupResult]:
+        pass
+
+
+class StreamingIdentifierReader(abc.ABC):
+    @abc.abstractmethod
+    def iter_identifiers(self) -> AsyncIterator[str]:
+        pass
+
+
+class StreamingResultsPresenter(abc.ABC):
+    @abc.abstractmethod
+    async def present_stream(
+        self,
+        results: AsyncIterable[api_models.LookupResult],
+    ) -> None:
         pass
 
 
@@ -37,6 +74,184 @@ class LookupManager:
         self._lookuper = lookuper
 
     async def present_lookup_results(self) -> None:
-        identifiers = await self._reader.read()
-        lookup_results = await self._lookuper.lookup(identifiers)
-        await self._presenter.present(lookup_results)
+        with _stage("read"):
+            identifiers = await self._reader.read()
+
+        with _stage("lookup"):
+            lookup_results = await self._lookuper.lookup(identifiers)
+
+        with _stage("present"):
+            await self._presenter.present(lookup_results)
+
+        metrics.get_metrics().increment("results_presented_total", len(lookup_results))
+
+
+class StreamingLookupManager:
+    """Runs reading, lookups and presentation concurrently.
+
+    The stages exchange identifiers and results through queues holding at
+    most ``queue_size`` items, so memory doesn't grow with the input and
+    results are presented while lookups are still running. List-based
+    components are adapted and keep working, but they only stream as much
+    as their interface allows.
+    """
+
+    def __init__(
+        self,
+        reader: IdentifierReader | StreamingIdentifierReader,
+        presenter: ResultsPresenter | StreamingResultsPresenter,
+        lookuper: MultipleResourceLookuper | StreamingResourceLookuper,
+        queue_size: int,
+    ) -> None:
+        self._reader = as_streaming_reader(reader)
+        self._presenter = as_streaming_presenter(presenter)
+        self._lookuper = as_streaming_lookuper(lookuper, batch_size=queue_size)
+        self._queue_size = queue_size
+
+    async def present_lookup_results(self) -> None:
+        identifiers: _ClosableQueue[str] = _ClosableQueue(self._queue_size)
+        results: _ClosableQueue[api_models.LookupResult] = _ClosableQueue(
+            self._queue_size
+        )
+
+        async with asyncio.TaskGroup() as task_group:
+            task_group.create_task(
+                _timed("read", identifiers.fill(self._reader.iter_identifiers())),
+            )
+            task_group.create_task(
+                _timed("lookup", results.fill(self._lookuper.iter_lookup(identifiers))),
+            )
+            task_group.create_task(
+                _timed("present", self._presenter.present_stream(_counted(results))),
+            )
+
+
+@contextlib.contextmanager
+def _stage(stage: str) -> Iterator[None]:
+    with metrics.get_metrics().time_stage(stage), _trace_stage(stage):
+        yield
+
+
+def _trace_stage(stage: str) -> ContextManager[None]:
+    # Only a profiled run imports the profiler, with cProfile and tracemalloc.
+    profiling = sys.modules.get("app.profiling")
+
+    if profiling is None:
+        return contextlib.nullcontext()
+
+    return profiling.trace_stage(stage)
+
+
+async def _timed(stage: str, awaitable: Awaitable[None]) -> None:
+    # The stages overlap, so each one is timed from its start to its end.
+    with _stage(stage):
+        await awaitable
+
+
+async def _counted(
+    results: AsyncIterable[api_models.LookupResult],
+) -> AsyncIterator[api_models.LookupResult]:
+    run_metrics = metrics.get_metrics()
+
+    async for result in results:
+        run_metrics.increment("results_presented_total")
+        yield result
+
+
+class _ClosableQueue(Generic[_T]):
+    """A bounded queue that is consumed as an async iterator."""
+
+    def __init__(self, maxsize: int) -> None:
+        self._queue: asyncio.Queue[tuple[bool, _T | None]] = asyncio.Queue(maxsize)
+
+    async def fill(self, items: AsyncIterable[_T]) -> None:
+        async for item in items:
+            await self._queue.put((False, item))
+
+        await self._queue.put((True, None))
+
+    def __aiter__(self) -> "_ClosableQueue[_T]":
+        return self
+
+    async def __anext__(self) -> _T:
+        is_closed, item = await self._queue.get()
+
+        if is_closed:
+            # Keep the end marker for other consumers of the same queue.
+            self._queue.put_nowait((True, None))
+            raise StopAsyncIteration
+
+        return item  # type: ignore[return-value]
+
+
+class _StreamingReaderAdapter(StreamingIdentifierReader):
+    def __init__(self, reader: IdentifierReader) -> None:
+        self._reader = reader
+
+    async def iter_identifiers(self) -> AsyncIterator[str]:
+        for identifier in await self._reader.read():
+            yield identifier
+
+
+class _StreamingLookuperAdapter(StreamingResourceLookuper):
+    def __init__(self, lookuper: MultipleResourceLookuper, batch_size: int) -> None:
+        self._lookuper = lookuper
+        self._batch_size = batch_size
+
+    async def iter_lookup(
+        self,
+        identifiers: AsyncIterable[str],
+    ) -> AsyncIterator[api_models.LookupResult]:
+        batch: list[str] = []
+
+        async for identifier in identifiers:
+            batch.append(identifier)
+
+            if len(batch) >= self._batch_size:
+                for response in await self._lookuper.lookup(batch):
+                    yield response
+
+                batch = []
+
+        if batch:
+            for response in await self._lookuper.lookup(batch):
+                yield response
+
+
+class _StreamingPresenterAdapter(StreamingResultsPresenter):
+    def __init__(self, presenter: ResultsPresenter) -> None:
+        self._presenter = presenter
+
+    async def present_stream(
+        self,
+        results: AsyncIterable[api_models.LookupResult],
+    ) -> None:
+        await self._presenter.present([result async for result in results])
+
+
+def as_streaming_reader(
+    reader: IdentifierReader | StreamingIdentifierReader,
+) -> StreamingIdentifierReader:
+    if isinstance(reader, StreamingIdentifierReader):
+        return reader
+
+    return _StreamingReaderAdapter(reader)
+
+
+def as_streaming_lookuper(
+    lookuper: MultipleResourceLookuper | StreamingResourceLookuper,
+    batch_size: int,
+) -> StreamingResourceLookuper:
+    if isinstance(lookuper, StreamingResourceLookuper):
+        return lookuper
+
+    return _StreamingLookuperAdapter(lookuper, batch_size)
+
+
+def as_streaming_presenter(
+    presenter: ResultsPresenter | StreamingResultsPresenter,
+) -> StreamingResultsPresenter:
+    if isinstance(presenter, StreamingResultsPresenter):
+        return presenter
+
+    return _StreamingPresenterAdapter(presenter)
@@ -0,0 +1,49 @@
+from collections.abc import Sequence
+
+import pytest
+
+from app import conftest, managers
+from app.api import models
+from app.presenters import cli_presenter
+
+
+class _ListReader(managers.IdentifierReader):
+    def __init__(self, identifiers: list[str]) -> None:
+        self._identifiers = identifiers
+
+    async def read(self) -> list[str]:
+        return self._identifiers
+
+
+class _UpperCaseLookuper(managers.MultipleResourceLookuper):
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+
+    async def lookup(
+        self,
+        identifiers: Sequence[str],
+    ) -> list[models.LookupResult]:
+        self.batches.append(list(identifiers))
+
+        return [
+            models.LookupResult.from_response(
+                conftest.make_response(idf.upper(), type_="url", harmless=1),
+            )
+            for idf in identifiers
+        ]
+
+
+async def test_streaming_manager_adapts_list_components(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    lookuper = _UpperCaseLookuper()
+
+    await managers.StreamingLookupManager(
+        reader=_ListReader(["a", "b", "c"]),
+        presenter=cli_presenter.CliPresenter(),
+        lookuper=lookuper,
+        queue_size=2,
+    ).present_lookup_results()
+
+    assert lookuper.batches == [["a", "b"], ["c"]]
+    assert capsys.readouterr().out == "A is safe\nB is safe\nC is safe\n"
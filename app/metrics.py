@@ -0,0 +1,254 @@
+import bisect
+import contextlib
+import dataclasses
+import os
+import pathlib
+import tempfile
+import time
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+_PREFIX = "virustotalcli"
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_GAUGE_SAMPLE_INTERVAL = 1.0
+
+_Labels = tuple[tuple[str, str], ...]
+
+
+@dataclasses.dataclass
+class _Histogram:
+    bucket_counts: list[int] = dataclasses.field(
+        default_factory=lambda: [0] * (len(_LATENCY_BUCKETS) + 1),
+    )
+    count: int = 0
+    total: float = 0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(_LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+@dataclasses.dataclass
+class _Gauge:
+    value: float = 0
+    max_value: float = 0
+    samples: list[tuple[float, float]] = dataclasses.field(default_factory=list)
+    sampled_at: float = float("-inf")
+
+
+class RunMetrics:
+    """Counters, latency histograms, stage timings and gauges of one run."""
+
+    def __init__(self) -> None:
+        self._started_at = time.monotonic()
+        self._started_at_wall = time.time()
+        self._counters: dict[str, dict[_Labels, float]] = {}
+        self._histograms: dict[str, dict[_Labels, _Histogram]] = {}
+        self._stages: dict[str, float] = {}
+        self._gauges: dict[str, _Gauge] = {}
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        series = self._counters.setdefault(name, {})
+        key = _labels_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        series = self._histograms.setdefault(name, {})
+        series.setdefault(_labels_key(labels), _Histogram()).observe(value)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Sets a gauge, which is sampled at most once a second for the summary."""
+        gauge = self._gauges.setdefault(name, _Gauge())
+        gauge.value = value
+        gauge.max_value = max(gauge.max_value, value)
+        now = time.monotonic() - self._started_at
+
+        if now - gauge.sampled_at >= _GAUGE_SAMPLE_INTERVAL:
+            gauge.samples.append((round(now, 3), value))
+            gauge.sampled_at = now
+
+    @contextlib.contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        started_at = time.monotonic()
+
+        try:
+            yield
+        finally:
+            self._stages[stage] = self._stages.get(stage, 0) + (
+                time.monotonic() - started_at
+            )
+
+    def merge(self, other: "RunMetrics") -> None:
+        """Adds the counters and histograms of another run, e.g. of a worker.
+
+        Stage timings aren't merged, gauges keep the highest maximum.
+        """
+        for name, series in other._counters.items():
+            for labels, value in series.items():
+                self.increment(name, value, **dict(labels))
+
+        for name, histograms in other._histograms.items():
+            own_histograms = self._histograms.setdefault(name, {})
+
+            for labels, histogram in histograms.items():
+                own = own_histograms.setdefault(labels, _Histogram())
+                own.bucket_counts = [
+                    own_count + count
+                    for own_count, count in zip(
+                        own.bucket_counts,
+                        histogram.bucket_counts,
+                    )
+                ]
+                own.count += histogram.count
+                own.total += histogram.total
+
+        for name, gauge in other._gauges.items():
+            own_gauge = self._gauges.setdefault(name, _Gauge())
+            own_gauge.max_value = max(own_gauge.max_value, gauge.max_value)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "duration_seconds": round(time.monotonic() - self._started_at, 3),
+            "counters": {
+                name: [
+                    {"labels": dict(labels), "value": value}
+                    for labels, value in series.items()
+                ]
+                for name, series in self._counters.items()
+            },
+            "histograms": {
+                name: [
+                    {
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": round(histogram.total, 6),
+                        "buckets": dict(
+                            zip(
+                                [*map(str, _LATENCY_BUCKETS), "+Inf"],
+                                histogram.bucket_counts,
+                            ),
+                        ),
+                    }
+                    for labels, histogram in series.items()
+                ]
+                for name, series in self._histograms.items()
+            },
+            "stages_seconds": {
+                stage: round(seconds, 3) for stage, seconds in self._stages.items()
+            },
+            "gauges": {
+                name: {"max": gauge.max_value, "samples": gauge.samples}
+                for name, gauge in self._gauges.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        for name, series in self._counters.items():
+            lines.append("# TYPE {0}_{1} counter".format(_PREFIX, name))
+            lines.extend(
+                "{0}_{1}{2} {3}".format(_PREFIX, name, _render_labels(labels), value)
+                for labels, value in series.items()
+            )
+
+        for name, histograms in self._histograms.items():
+            lines.append("# TYPE {0}_{1} histogram".format(_PREFIX, name))
+
+            for labels, histogram in histograms.items():
+                cumulative = 0
+
+                for bound, count in zip(
+                    [*map(str, _LATENCY_BUCKETS), "+Inf"],
+                    histogram.bucket_counts,
+                ):
+                    cumulative += count
+                    lines.append(
+                        "{0}_{1}_bucket{2} {3}".format(
+                            _PREFIX,
+                            name,
+                            _render_labels((*labels, ("le", bound))),
+                            cumulative,
+                        ),
+                    )
+
+                lines.append(
+                    "{0}_{1}_sum{2} {3}".format(
+                        _PREFIX, name, _render_labels(labels), histogram.total
+                    ),
+                )
+                lines.append(
+                    "{0}_{1}_count{2} {3}".format(
+                        _PREFIX, name, _render_labels(labels), histogram.count
+                    ),
+                )
+
+        lines.append("# TYPE {0}_stage_duration_seconds gauge".format(_PREFIX))
+        lines.extend(
+            "{0}_stage_duration_seconds{1} {2}".format(
+                _PREFIX, _render_labels((("stage", stage),)), seconds
+            )
+            for stage, seconds in self._stages.items()
+        )
+
+        for name, gauge in self._gauges.items():
+            lines.append("# TYPE {0}_{1}_max gauge".format(_PREFIX, name))
+            lines.append("{0}_{1}_max {2}".format(_PREFIX, name, gauge.max_value))
+
+        lines.append("# TYPE {0}_run_duration_seconds gauge".format(_PREFIX))
+        lines.append(
+            "{0}_run_duration_seconds {1}".format(
+                _PREFIX, time.monotonic() - self._started_at
+            ),
+        )
+        lines.append("# TYPE {0}_run_timestamp_seconds gauge".format(_PREFIX))
+        lines.append(
+            "{0}_run_timestamp_seconds {1}".format(_PREFIX, self._started_at_wall),
+        )
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_textfile(self, path: pathlib.Path) -> None:
+        """Writes the metrics atomically, as the textfile collector expects."""
+        with tempfile.NamedTemporaryFile(
+            "w",
+            dir=path.parent,
+            prefix=".{0}.".format(path.name),
+            delete=False,
+        ) as file:
+            file.write(self.to_prometheus())
+
+        os.replace(file.name, path)
+
+
+_current = RunMetrics()
+
+
+def get_metrics() -> RunMetrics:
+    return _current
+
+
+def reset() -> RunMetrics:
+    """Starts collecting the metrics of a new run."""
+    global _current
+    _current = RunMetrics()
+
+    return _current
+
+
+def _labels_key(labels: Mapping[str, Any]) -> _Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _render_labels(labels: _Labels) -> str:
+    if not labels:
+        return ""
+
+    return "{{{0}}}".format(
+        ",".join(
+            '{0}="{1}"'.format(key, value.replace("\\", "\\\\").replace('"', '\\"'))
+            for key, value in labels
+        ),
+    )
@@ -0,0 +1,97 @@
+import pathlib
+
+from app import metrics
+
+
+def test_summary_groups_series_by_labels() -> None:
+    run_metrics = metrics.RunMetrics()
+
+    run_metrics.increment("lookups_total", outcome="success")
+    run_metrics.increment("lookups_total", outcome="success")
+    run_metrics.increment("lookups_total", 3, outcome="failure")
+    run_metrics.observe("request_duration_seconds", 0.2, status=200)
+    run_metrics.observe("request_duration_seconds", 7, status=200)
+
+    with run_metrics.time_stage("read"):
+        pass
+
+    summary = run_metrics.summary()
+
+    assert summary["counters"]["lookups_total"] == [
+        {"labels": {"outcome": "success"}, "value": 2},
+        {"labels": {"outcome": "failure"}, "value": 3},
+    ]
+
+    (histogram,) = summary["histograms"]["request_duration_seconds"]
+    assert histogram["labels"] == {"status": "200"}
+    assert histogram["count"] == 2
+    assert histogram["buckets"]["0.25"] == 1
+    assert histogram["buckets"]["10.0"] == 1
+    assert "read" in summary["stages_seconds"]
+
+
+def test_gauge_tracks_its_maximum() -> None:
+    run_metrics = metrics.RunMetrics()
+
+    for value in (1, 5, 2):
+        run_metrics.set_gauge("lookups_in_flight", value)
+
+    gauge = run_metrics.summary()["gauges"]["lookups_in_flight"]
+
+    assert gauge["max"] == 5
+    assert gauge["samples"][0][1] == 1
+
+
+def test_merge_adds_the_series_of_another_run() -> None:
+    run_metrics = metrics.RunMetrics()
+    worker_metrics = metrics.RunMetrics()
+
+    run_metrics.increment("lookups_total", outcome="success")
+    worker_metrics.increment("lookups_total", 2, outcome="success")
+    worker_metrics.observe("request_duration_seconds", 0.2, status=200)
+    worker_metrics.set_gauge("lookups_in_flight", 4)
+
+    run_metrics.merge(worker_metrics)
+    summary = run_metrics.summary()
+
+    assert summary["counters"]["lookups_total"] == [
+        {"labels": {"outcome": "success"}, "value": 3},
+    ]
+    assert summary["histograms"]["request_duration_seconds"][0]["count"] == 1
+    assert summary["gauges"]["lookups_in_flight"]["max"] == 4
+
+
+def test_prometheus_textfile(tmp_path: pathlib.Path) -> None:
+    run_metrics = metrics.RunMetrics()
+    run_metrics.increment("request_retries_total", endpoint="urls", status=429)
+    run_metrics.observe("request_duration_seconds", 0.3, endpoint="urls")
+    path = tmp_path / "virustotalcli.prom"
+
+    run_metrics.write_prometheus_textfile(path)
+
+    lines = path.read_text().splitlines()
+
+    assert "# TYPE virustotalcli_request_retries_total counter" in lines
+    assert (
+        'virustotalcli_request_retries_total{endpoint="urls",status="429"} 1' in lines
+    )
+    assert (
+        'virustotalcli_request_duration_seconds_bucket{endpoint="urls",le="0.25"} 0'
+        in lines
+    )
+    assert (
+        'virustotalcli_request_duration_seconds_bucket{endpoint="urls",le="0.5"} 1'
+        in lines
+    )
+    assert (
+        'virustotalcli_request_duration_seconds_bucket{endpoint="urls",le="+Inf"} 1'
+        in lines
+    )
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_reset_starts_a_new_run() -> None:
+    metrics.get_metrics().increment("lookups_total")
+
+    assert metrics.reset() is metrics.get_metrics()
+    assert metrics.get_metrics().summary()["counters"] == {}
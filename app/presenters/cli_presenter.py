@@ -1,19 +1,26 @@
+from collections.abc import AsyncIterable
+
 from app import managers
 from app.api import models
 
 
-def _is_malicious(stats: models.LastAnalysisStats) -> bool:
-    return stats.malicious + stats.suspicious > stats.harmless
+def _print_result(result: models.LookupResult) -> None:
+    print(
+        "{0} is {1}".format(
+            result.identifier,
+            "malicious" if result.is_malicious else "safe",
+        )
+    )
+
 
+class CliPresenter(managers.ResultsPresenter, managers.StreamingResultsPresenter):
+    async def present(self, results: list[models.LookupResult]) -> None:
+        for result in results:
+            _print_result(result)
 
-class CliPresenter(managers.ResultsPresenter):
-    async def present(self, results: list[models.LookupResponse]) -> None:
-        for resp in results:
-            print(
-                "{0} is {1}".format(
-                    resp.data.identifier,
-                    "malicious"
-                    if _is_malicious(resp.data.attributes.last_analysis_stats)
-                    else "safe",
-                )
-            )
+    async def present_stream(
+        self,
+        results: AsyncIterable[models.LookupResult],
+    ) -> None:
+        async for result in results:
+            _print_result(result)
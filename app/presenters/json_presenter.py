@@ -1,64 +1,178 @@
+import asyncio
+import contextlib
 import datetime
-from collections.abc import Sequence
+import json
+import pathlib
+import textwrap
+from collections.abc import AsyncIterable
+from typing import Any
 
 import aiofiles
-import pydantic
-from pydantic import alias_generators
 
 from app import managers
 from app.api import models
 
+_WRITE_BUFFER_SIZE = 64 * 1024
 
-class _AnalysisResult(pydantic.BaseModel):
-    identifier: str
-    type: str
-    last_analysis_time: datetime.datetime
-    is_malicious: bool
 
-    model_config = pydantic.ConfigDict(
-        alias_generator=pydantic.AliasGenerator(
-            serialization_alias=alias_generators.to_pascal,
-        )
+def _result_to_dict(result: models.LookupResult) -> dict[str, Any]:
+    return {
+        "Identifier": result.identifier,
+        "Type": result.type.upper(),
+        "LastAnalysisTime": result.last_analysis_date.isoformat(),
+        "IsMalicious": result.is_malicious,
+    }
+
+
+def _default_output(extension: str) -> pathlib.Path:
+    return pathlib.Path(
+        "{0}.{1}".format(datetime.datetime.now().isoformat(), extension),
     )
 
 
-class _AnalysisResults(pydantic.BaseModel):
-    results: Sequence[_AnalysisResult]
+class _StreamingFilePresenter(
+    managers.ResultsPresenter,
+    managers.StreamingResultsPresenter,
+):
+    """Writes every result as soon as it arrives.
+
+    Serialized results are buffered and written in chunks, and a background
+    task writes and flushes what is buffered every ``flush_interval``
+    seconds, so the file can be tailed while the run continues even when
+    results arrive slowly.
+    """
 
+    _extension: str
+    _header: str = ""
+    _separator: str = ""
+    _terminator: str = ""
+    _footer: str = ""
+    _empty: str = ""
 
-def _is_malicious(stats: models.LastAnalysisStats) -> bool:
-    return stats.malicious + stats.suspicious > stats.harmless
+    def __init__(
+        self,
+        output: pathlib.Path | None = None,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self._output = output
+        self._flush_interval = flush_interval
 
+    async def present(self, results: list[models.LookupResult]) -> None:
+        await self.present_stream(_iter_list(results))
 
-def _lookups_to_results(
-    responses: Sequence[models.LookupResponse],
-) -> _AnalysisResults:
-    return _AnalysisResults(
-        results=[
-            _AnalysisResult(
-                identifier=response.data.identifier,
-                type=response.data.type.upper(),
-                last_analysis_time=response.data.attributes.last_analysis_date,
-                is_malicious=_is_malicious(
-                    response.data.attributes.last_analysis_stats
-                ),
+    async def present_stream(
+        self,
+        results: AsyncIterable[models.LookupResult],
+    ) -> None:
+        output = self._output or _default_output(self._extension)
+
+        async with aiofiles.open(output, "w") as file:
+            buffer = _WriteBuffer(file)
+            stopping = asyncio.Event()
+            flusher = asyncio.create_task(
+                buffer.flush_periodically(self._flush_interval, stopping),
             )
-            for response in responses
-        ],
-    )
+            separator = self._header
+            is_empty = True
 
+            try:
+                async for result in results:
+                    buffer.append(
+                        "{0}{1}{2}".format(
+                            separator,
+                            self._serialize(result),
+                            self._terminator,
+                        ),
+                    )
+                    separator = self._separator
+                    is_empty = False
 
-def _analysis_results_to_json(analysis_results: _AnalysisResults) -> str:
-    return analysis_results.model_dump_json(indent=4, by_alias=True)
+                    if buffer.size >= _WRITE_BUFFER_SIZE:
+                        await buffer.flush()
+            finally:
+                # A write in flight finishes before the file is closed.
+                stopping.set()
+                await flusher
 
+            buffer.append(self._empty if is_empty else self._footer)
+            await buffer.flush()
 
-class JsonFilePresenter(managers.ResultsPresenter):
-    async def present(self, results: list[models.LookupResponse]) -> None:
-        async with aiofiles.open(
-            "{0}.json".format(datetime.datetime.now().isoformat()), "w"
-        ) as file:
-            await file.write(
-                _analysis_results_to_json(
-                    _lookups_to_results(results),
-                ),
-            )
+    def _serialize(self, result: models.LookupResult) -> str:
+        return json.dumps(
+            _result_to_dict(result),
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+
+class _WriteBuffer:
+    """Text waiting to be written to ``file``, by one writer at a time."""
+
+    def __init__(self, file: Any) -> None:
+        self._file = file
+        self._chunks: list[str] = []
+        self.size = 0
+        self._lock = asyncio.Lock()
+
+    def append(self, text: str) -> None:
+        self._chunks.append(text)
+        self.size += len(text)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            chunks, self._chunks, self.size = self._chunks, [], 0
+
+            if chunks:
+                await self._file.write("".join(chunks))
+                await self._file.flush()
+
+    async def flush_periodically(
+        self,
+        interval: float,
+        stopping: asyncio.Event,
+    ) -> None:
+        while not stopping.is_set():
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(stopping.wait(), timeout=interval)
+
+            await self.flush()
+
+
+class JsonFilePresenter(_StreamingFilePresenter):
+    """Writes an indented JSON document of every result."""
+
+    _extension = "json"
+    _header = '{\n    "results": [\n'
+    _separator = ",\n"
+    _footer = "\n    ]\n}"
+    _empty = '{\n    "results": []\n}'
+
+    def _serialize(self, result: models.LookupResult) -> str:
+        serialized = json.dumps(_result_to_dict(result), ensure_ascii=False, indent=4)
+
+        # Results are nested two levels deep in the document.
+        return textwrap.indent(serialized, " " * 8)
+
+
+class NdjsonFilePresenter(_StreamingFilePresenter):
+    """Writes one JSON result per line."""
+
+    _extension = "ndjson"
+    _terminator = "\n"
+
+
+class CompactJsonFilePresenter(_StreamingFilePresenter):
+    """Writes the ``JsonFilePresenter`` document without indentation."""
+
+    _extension = "json"
+    _header = '{"results":['
+    _separator = ","
+    _footer = "]}"
+    _empty = '{"results":[]}'
+
+
+async def _iter_list(
+    results: list[models.LookupResult],
+) -> AsyncIterable[models.LookupResult]:
+    for result in results:
+        yield result
@@ -1,102 +1,122 @@
+import asyncio
 import datetime
 import json
+import pathlib
+from collections.abc import AsyncIterator
 
 from app import conftest
 from app.api import models
 from app.presenters import json_presenter
 
-_LOOKUP_RESULTS = [
-    models.LookupResponse(
-        data=models.LookupData(
-            id="127.0.0.1",
-            type="ip_address",
-            attributes=models.LookupAttributes(
-                last_analysis_stats=models.LastAnalysisStats(
-                    harmless=10,
-                    malicious=5,
-                    suspicious=2,
-                    timeout=0,
-                    undetected=0,
-                ),
-                last_analysis_date=datetime.datetime(
-                    year=2024,
-                    month=8,
-                    day=22,
-                    hour=13,
-                    minute=25,
-                    second=8,
-                ),
-            ),
-        ),
+_LOOKUP_RESPONSES = [
+    conftest.make_response(
+        "127.0.0.1",
+        malicious=5,
+        last_analysis_date=datetime.datetime(2024, 8, 22, 13, 25, 8),
+        harmless=10,
+        suspicious=2,
     ),
-    models.LookupResponse(
-        data=models.LookupData(
-            id="127.0.0.2",
-            type="ip_address",
-            attributes=models.LookupAttributes(
-                last_analysis_stats=models.LastAnalysisStats(
-                    harmless=10,
-                    malicious=5,
-                    suspicious=20,
-                    timeout=0,
-                    undetected=0,
-                ),
-                last_analysis_date=datetime.datetime(
-                    year=2024,
-                    month=8,
-                    day=22,
-                    hour=15,
-                    minute=38,
-                    second=44,
-                ),
-            ),
-        ),
+    conftest.make_response(
+        "127.0.0.2",
+        malicious=5,
+        last_analysis_date=datetime.datetime(2024, 8, 22, 15, 38, 44),
+        harmless=10,
+        suspicious=20,
     ),
 ]
-_EXPECTED_ANALYSIS_RESULTS = json_presenter._AnalysisResults(
-    results=[
-        json_presenter._AnalysisResult(
-            identifier="127.0.0.1",
-            type="IP_ADDRESS",
-            last_analysis_time=datetime.datetime(
-                year=2024,
-                month=8,
-                day=22,
-                hour=13,
-                minute=25,
-                second=8,
-            ),
-            is_malicious=False,
-        ),
-        json_presenter._AnalysisResult(
-            identifier="127.0.0.2",
-            type="IP_ADDRESS",
-            last_analysis_time=datetime.datetime(
-                year=2024,
-                month=8,
-                day=22,
-                hour=15,
-                minute=38,
-                second=44,
-            ),
-            is_malicious=True,
-        ),
-    ]
-)
-
-
-def test_lookup_results_to_analysis_results():
-    assert _EXPECTED_ANALYSIS_RESULTS == json_presenter._lookups_to_results(
-        _LOOKUP_RESULTS
+_LOOKUP_RESULTS = [
+    models.LookupResult.from_response(response) for response in _LOOKUP_RESPONSES
+]
+
+
+def test_lookup_responses_to_compact_results():
+    first, second = _LOOKUP_RESULTS
+
+    assert first.identifier == "127.0.0.1"
+    assert first.type == "ip_address"
+    assert first.last_analysis_date == datetime.datetime(
+        year=2024,
+        month=8,
+        day=22,
+        hour=13,
+        minute=25,
+        second=8,
     )
+    assert (first.harmless, first.malicious, first.suspicious) == (10, 5, 2)
+    assert not first.is_malicious
+    assert second.is_malicious
+
 
+async def test_output_json(tmp_path: pathlib.Path) -> None:
+    output = tmp_path / "results.json"
+
+    await json_presenter.JsonFilePresenter(output=output).present(_LOOKUP_RESULTS)
 
-async def test_output_json():
     expected_json = await conftest.load_json_fixture(
         "app/presenters/fixtures/localhost_lookup_results.json"
     )
-    converted_json = json_presenter._analysis_results_to_json(
-        json_presenter._lookups_to_results(_LOOKUP_RESULTS)
+
+    assert expected_json == json.loads(output.read_text())
+
+
+async def test_output_json_without_results(tmp_path: pathlib.Path) -> None:
+    output = tmp_path / "results.json"
+
+    await json_presenter.JsonFilePresenter(output=output).present([])
+
+    assert json.loads(output.read_text()) == {"results": []}
+
+
+async def test_output_ndjson(tmp_path: pathlib.Path) -> None:
+    output = tmp_path / "results.ndjson"
+
+    await json_presenter.NdjsonFilePresenter(output=output).present(_LOOKUP_RESULTS)
+
+    expected_json = await conftest.load_json_fixture(
+        "app/presenters/fixtures/localhost_lookup_results.json"
+    )
+    lines = output.read_text().splitlines()
+
+    assert [json.loads(line) for line in lines] == expected_json["results"]
+
+
+async def test_output_compact_json(tmp_path: pathlib.Path) -> None:
+    output = tmp_path / "results.json"
+
+    await json_presenter.CompactJsonFilePresenter(output=output).present(
+        _LOOKUP_RESULTS
+    )
+
+    expected_json = await conftest.load_json_fixture(
+        "app/presenters/fixtures/localhost_lookup_results.json"
+    )
+
+    assert json.loads(output.read_text()) == expected_json
+
+
+async def test_results_are_flushed_while_the_stream_stalls(
+    tmp_path: pathlib.Path,
+) -> None:
+    output = tmp_path / "results.ndjson"
+    resume = asyncio.Event()
+
+    async def stalling_results() -> AsyncIterator[models.LookupResult]:
+        yield _LOOKUP_RESULTS[0]
+        await resume.wait()
+        yield _LOOKUP_RESULTS[1]
+
+    async def first_result_written() -> None:
+        while not output.exists() or not output.read_text():
+            await asyncio.sleep(0.01)
+
+    presenting = asyncio.create_task(
+        json_presenter.NdjsonFilePresenter(
+            output=output,
+            flush_interval=0.01,
+        ).present_stream(stalling_results()),
     )
+    await asyncio.wait_for(first_result_written(), timeout=5)
+    resume.set()
+    await presenting
 
-    assert expected_json == json.loads(converted_json)
+    assert len(output.read_text().splitlines()) == 2
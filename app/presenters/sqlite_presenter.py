@@ -0,0 +1,173 @@
+import asyncio
+import datetime
+import pathlib
+import sqlite3
+import time
+from collections.abc import AsyncIterable
+from typing import cast
+
+from app import managers
+from app.api import models
+
+_DEFAULT_OUTPUT = pathlib.Path("results.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    results INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    identifier TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    last_analysis_time TEXT NOT NULL,
+    is_malicious INTEGER NOT NULL,
+    harmless INTEGER NOT NULL,
+    malicious INTEGER NOT NULL,
+    suspicious INTEGER NOT NULL,
+    timeout INTEGER NOT NULL,
+    undetected INTEGER NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs (id)
+);
+CREATE INDEX IF NOT EXISTS results_type_is_malicious
+    ON results (type, is_malicious);
+CREATE INDEX IF NOT EXISTS results_last_analysis_time
+    ON results (last_analysis_time);
+CREATE INDEX IF NOT EXISTS results_run_id ON results (run_id);
+"""
+
+_UPSERT = """
+INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (identifier) DO UPDATE SET
+    type = excluded.type,
+    last_analysis_time = excluded.last_analysis_time,
+    is_malicious = excluded.is_malicious,
+    harmless = excluded.harmless,
+    malicious = excluded.malicious,
+    suspicious = excluded.suspicious,
+    timeout = excluded.timeout,
+    undetected = excluded.undetected,
+    run_id = excluded.run_id
+"""
+
+# A carried-over result only reproduces the verdict of an earlier run, so it
+# never replaces the counters and run of a stored row.
+_INSERT_MISSING = """
+INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (identifier) DO NOTHING
+"""
+
+_Row = tuple[str, str, str, bool, int, int, int, int, int, int]
+
+
+def _result_to_row(result: models.LookupResult, run_id: int) -> _Row:
+    return (
+        result.identifier,
+        result.type.upper(),
+        result.last_analysis_date.isoformat(),
+        result.is_malicious,
+        result.harmless,
+        result.malicious,
+        result.suspicious,
+        result.timeout,
+        result.undetected,
+        run_id,
+    )
+
+
+class _ResultsStore:
+    """The database of one run, used from one thread at a time."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+        with self._connection:
+            self.run_id = cast(
+                int,
+                self._connection.execute(
+                    "INSERT INTO runs (started_at) VALUES (?)",
+                    (datetime.datetime.now().isoformat(),),
+                ).lastrowid,
+            )
+
+    def write(self, rows: list[_Row], carried_over_rows: list[_Row]) -> None:
+        with self._connection:
+            self._connection.executemany(_UPSERT, rows)
+            self._connection.executemany(_INSERT_MISSING, carried_over_rows)
+
+    def finish(self, results: int) -> None:
+        with self._connection:
+            self._connection.execute(
+                "UPDATE runs SET finished_at = ?, results = ? WHERE id = ?",
+                (datetime.datetime.now().isoformat(), results, self.run_id),
+            )
+
+        self._connection.close()
+
+
+class SqlitePresenter(managers.ResultsPresenter, managers.StreamingResultsPresenter):
+    """Upserts results into an SQLite database shared by many runs.
+
+    Every result is a row of ``results`` keyed by identifier, so the latest
+    verdict of an identifier replaces older ones, and ``run_id`` points at
+    the row of ``runs`` describing the run that found it. Results carried
+    over from an earlier run are only inserted when their identifier has no
+    row yet. Rows are written in transactions of ``batch_size``, or of what
+    arrived in the last ``flush_interval`` seconds, off the event loop.
+    """
+
+    def __init__(
+        self,
+        output: pathlib.Path | None = None,
+        batch_size: int = 10_000,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self._output = output or _DEFAULT_OUTPUT
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+
+    async def present(self, results: list[models.LookupResult]) -> None:
+        await self.present_stream(_iter_list(results))
+
+    async def present_stream(
+        self,
+        results: AsyncIterable[models.LookupResult],
+    ) -> None:
+        store = await asyncio.to_thread(_ResultsStore, self._output)
+        run_id = store.run_id
+        rows: list[_Row] = []
+        carried_over_rows: list[_Row] = []
+        written = 0
+        flushed_at = time.monotonic()
+
+        try:
+            async for result in results:
+                (carried_over_rows if result.is_carried_over else rows).append(
+                    _result_to_row(result, run_id),
+                )
+                pending = len(rows) + len(carried_over_rows)
+
+                if pending >= self._batch_size or (
+                    time.monotonic() - flushed_at >= self._flush_interval
+                ):
+                    await asyncio.to_thread(store.write, rows, carried_over_rows)
+                    written += pending
+                    rows = []
+                    carried_over_rows = []
+                    flushed_at = time.monotonic()
+
+            await asyncio.to_thread(store.write, rows, carried_over_rows)
+            written += len(rows) + len(carried_over_rows)
+        finally:
+            await asyncio.to_thread(store.finish, written)
+
+
+async def _iter_list(
+    results: list[models.LookupResult],
+) -> AsyncIterable[models.LookupResult]:
+    for result in results:
+        yield result
@@ -0,0 +1,62 @@
+import dataclasses
+import datetime
+import pathlib
+import sqlite3
+
+from app import conftest
+from app.api import models
+from app.presenters import sqlite_presenter
+
+
+def _result(identifier: str, malicious: int) -> models.LookupResult:
+    response = conftest.make_response(
+        identifier,
+        malicious=malicious,
+        last_analysis_date=datetime.datetime(2024, 8, 22, 13, 25, 8),
+        harmless=10,
+    )
+
+    return models.LookupResult.from_response(response)
+
+
+async def test_results_of_every_run_are_upserted(tmp_path: pathlib.Path) -> None:
+    output = tmp_path / "results.sqlite"
+    presenter = sqlite_presenter.SqlitePresenter(output, batch_size=1)
+
+    await presenter.present([_result("127.0.0.1", 0), _result("127.0.0.2", 0)])
+    await presenter.present([_result("127.0.0.2", 20)])
+
+    with sqlite3.connect(output) as connection:
+        results = connection.execute(
+            "SELECT identifier, type, last_analysis_time, is_malicious, malicious,"
+            " run_id FROM results ORDER BY identifier",
+        ).fetchall()
+        runs = connection.execute("SELECT id, results FROM runs").fetchall()
+
+    assert results == [
+        ("127.0.0.1", "IP_ADDRESS", "2024-08-22T13:25:08", 0, 0, 1),
+        ("127.0.0.2", "IP_ADDRESS", "2024-08-22T13:25:08", 1, 20, 2),
+    ]
+    assert runs == [(1, 2), (2, 1)]
+
+
+async def test_carried_over_results_keep_the_stored_counts(
+    tmp_path: pathlib.Path,
+) -> None:
+    output = tmp_path / "results.sqlite"
+    presenter = sqlite_presenter.SqlitePresenter(output)
+    carried_over = [
+        dataclasses.replace(_result(identifier, 1), is_carried_over=True)
+        for identifier in ("127.0.0.1", "127.0.0.2")
+    ]
+
+    await presenter.present([_result("127.0.0.1", 20)])
+    await presenter.present(carried_over)
+
+    with sqlite3.connect(output) as connection:
+        results = connection.execute(
+            "SELECT identifier, harmless, malicious, run_id FROM results"
+            " ORDER BY identifier",
+        ).fetchall()
+
+    assert results == [("127.0.0.1", 10, 20, 1), ("127.0.0.2", 10, 1, 2)]
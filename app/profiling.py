@@ -0,0 +1,216 @@
+import asyncio
+import collections
+import contextlib
+import cProfile
+import io
+import pathlib
+import pstats
+import sys
+import threading
+import tracemalloc
+import types
+from collections.abc import Coroutine, Iterator
+
+import click
+import structlog
+
+_TRACEMALLOC_FRAMES = 10
+_MEMORY_TOP = 10
+
+_active: "Profiler | None" = None
+
+
+class Profiler:
+    """Profiles a whole command run.
+
+    Besides the deterministic CPU profile, the stack of the main thread is
+    sampled every ``sample_interval`` seconds into collapsed stacks, which
+    flame graph tools render as is, and the event loop lag is measured
+    every ``lag_interval`` seconds. With ``trace_memory`` the allocations of
+    every pipeline stage are traced as well.
+    """
+
+    def __init__(
+        self,
+        output_dir: pathlib.Path,
+        top: int = 20,
+        trace_memory: bool = False,
+        sample_interval: float = 0.005,
+        lag_interval: float = 0.05,
+    ) -> None:
+        self._output_dir = output_dir
+        self._top = top
+        self._trace_memory = trace_memory
+        self._sample_interval = sample_interval
+        self._lag_interval = lag_interval
+        self._stacks: collections.Counter[str] = collections.Counter()
+        self._loop_lags: list[float] = []
+        self._stage_memory: dict[str, list[tracemalloc.StatisticDiff]] = {}
+        self._cpu_profile = cProfile.Profile()
+        self._logger = structlog.get_logger(__name__)
+
+    @contextlib.contextmanager
+    def profile(self) -> Iterator[None]:
+        global _active
+        self._output_dir.mkdir(parents=True, exist_ok=True)
+
+        if self._trace_memory:
+            tracemalloc.start(_TRACEMALLOC_FRAMES)
+
+        stop_sampling = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample_stacks,
+            args=(threading.get_ident(), stop_sampling),
+            daemon=True,
+        )
+        sampler.start()
+        _active = self
+        self._cpu_profile.enable()
+
+        try:
+            yield
+        finally:
+            self._cpu_profile.disable()
+            _active = None
+            stop_sampling.set()
+            sampler.join()
+            self._write_reports()
+
+            if self._trace_memory:
+                tracemalloc.stop()
+
+    async def watch(self, main: Coroutine[None, None, None]) -> None:
+        """Runs ``main`` while measuring how late the event loop wakes up."""
+        lag_sampler = asyncio.create_task(self._sample_loop_lag())
+
+        try:
+            await main
+        finally:
+            lag_sampler.cancel()
+
+    @contextlib.contextmanager
+    def trace_stage(self, stage: str) -> Iterator[None]:
+        if not self._trace_memory:
+            yield
+            return
+
+        with self._unprofiled():
+            started_with = _take_snapshot()
+
+        try:
+            yield
+        finally:
+            # Stages may overlap when streaming, so the difference can include
+            # allocations of the other stages running at the same time.
+            with self._unprofiled():
+                self._stage_memory[stage] = _take_snapshot().compare_to(
+                    started_with, "lineno"
+                )[:_MEMORY_TOP]
+
+    @contextlib.contextmanager
+    def _unprofiled(self) -> Iterator[None]:
+        # Tracing memory is slow, keep it out of the CPU profile.
+        self._cpu_profile.disable()
+
+        try:
+            yield
+        finally:
+            self._cpu_profile.enable()
+
+    def _sample_stacks(self, thread_id: int, stop: threading.Event) -> None:
+        while not stop.wait(self._sample_interval):
+            frame = sys._current_frames().get(thread_id)
+
+            if frame is not None:
+                self._stacks[_collapse_stack(frame)] += 1
+
+    async def _sample_loop_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            expected_at = loop.time() + self._lag_interval
+            await asyncio.sleep(self._lag_interval)
+            self._loop_lags.append(max(loop.time() - expected_at, 0))
+
+    def _write_reports(self) -> None:
+        pstats_path = self._output_dir / "profile.pstats"
+        collapsed_path = self._output_dir / "profile.collapsed"
+        self._cpu_profile.dump_stats(pstats_path)
+
+        with collapsed_path.open("w") as file:
+            for stack, count in self._stacks.most_common():
+                file.write("{0} {1}\n".format(stack, count))
+
+        hottest_functions = io.StringIO()
+        pstats.Stats(self._cpu_profile, stream=hottest_functions).sort_stats(
+            pstats.SortKey.TIME,
+        ).print_stats(self._top)
+        click.echo("Hottest functions by own time:", err=True)
+        click.echo(hottest_functions.getvalue().rstrip(), err=True)
+
+        if self._loop_lags:
+            lags = sorted(self._loop_lags)
+            self._logger.info(
+                "Event loop lag",
+                samples=len(lags),
+                mean_ms=round(sum(lags) / len(lags) * 1000, 1),
+                p99_ms=round(lags[int(len(lags) * 0.99)] * 1000, 1),
+                max_ms=round(lags[-1] * 1000, 1),
+            )
+
+        report_paths = [pstats_path, collapsed_path]
+
+        if self._trace_memory:
+            memory_path = self._output_dir / "memory.txt"
+            self._write_memory_report(memory_path)
+            report_paths.append(memory_path)
+
+        self._logger.info(
+            "Profile written",
+            paths=[str(path) for path in report_paths],
+        )
+
+    def _write_memory_report(self, path: pathlib.Path) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+
+        with path.open("w") as file:
+            file.write("Peak traced memory: {0} KiB\n".format(peak // 1024))
+
+            for stage, statistics in self._stage_memory.items():
+                file.write("\n[{0}]\n".format(stage))
+                file.writelines("{0}\n".format(stat) for stat in statistics)
+
+
+@contextlib.contextmanager
+def trace_stage(stage: str) -> Iterator[None]:
+    """Traces the allocations of a pipeline stage if a run is being profiled."""
+    if _active is None:
+        yield
+        return
+
+    with _active.trace_stage(stage):
+        yield
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ],
+    )
+
+
+def _collapse_stack(frame: types.FrameType | None) -> str:
+    names = []
+
+    while frame is not None:
+        names.append(
+            "{0}:{1}".format(
+                frame.f_globals.get("__name__", "?"),
+                frame.f_code.co_qualname,
+            ),
+        )
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
@@ -0,0 +1,42 @@
+import asyncio
+import pathlib
+import time
+
+from app import profiling
+
+
+async def _busy_stage() -> None:
+    with profiling.trace_stage("lookup"):
+        data: list[str] = []
+        # Blocks the event loop, which shows up as lag.
+        deadline = time.monotonic() + 0.1
+
+        while time.monotonic() < deadline:
+            data.append(str(len(data)))
+
+        await asyncio.sleep(0.1)
+
+
+def test_profile_writes_reports(tmp_path: pathlib.Path) -> None:
+    profiler = profiling.Profiler(
+        output_dir=tmp_path / "profile",
+        top=5,
+        trace_memory=True,
+        lag_interval=0.01,
+    )
+
+    with profiler.profile():
+        asyncio.run(profiler.watch(_busy_stage()))
+
+    collapsed = (tmp_path / "profile" / "profile.collapsed").read_text()
+    memory = (tmp_path / "profile" / "memory.txt").read_text()
+
+    assert (tmp_path / "profile" / "profile.pstats").stat().st_size
+    assert "profiling_test:_busy_stage" in collapsed
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines())
+    assert "[lookup]" in memory
+
+
+def test_trace_stage_without_profiler() -> None:
+    with profiling.trace_stage("read"):
+        pass
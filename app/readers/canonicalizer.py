@@ -0,0 +1,81 @@
+import abc
+import ipaddress
+import types
+from collections.abc import Callable, Mapping
+from urllib import parse
+
+_DEFAULT_PORTS = types.MappingProxyType(
+    {
+        "http": 80,
+        "https": 443,
+    },
+)
+
+
+class Canonicalizer(abc.ABC):
+    @abc.abstractmethod
+    def canonicalize(self, identifier: str) -> str:
+        pass
+
+
+class IpCanonicalizer(Canonicalizer):
+    def canonicalize(self, identifier: str) -> str:
+        try:
+            return str(ipaddress.ip_address(identifier))
+        except ValueError:
+            # Leading zeros read as octal by some resolvers are ambiguous,
+            # and such addresses are not valid input anyway.
+            return identifier
+
+
+class UrlCanonicalizer(Canonicalizer):
+    def canonicalize(self, identifier: str) -> str:
+        try:
+            parts = parse.urlsplit(identifier)
+            port = parts.port
+        except ValueError:
+            return identifier
+
+        if not parts.hostname:
+            return identifier
+
+        scheme = parts.scheme.lower()
+        netloc = parts.hostname
+
+        if ":" in netloc:
+            netloc = "[{0}]".format(netloc)
+
+        if port is not None and port != _DEFAULT_PORTS.get(scheme):
+            netloc = "{0}:{1}".format(netloc, port)
+
+        if parts.username is not None:
+            netloc = "{0}@{1}".format(parts.netloc.rpartition("@")[0], netloc)
+
+        return parse.urlunsplit(
+            (scheme, netloc, parts.path or "/", parts.query, ""),
+        )
+
+
+class HashCanonicalizer(Canonicalizer):
+    def canonicalize(self, identifier: str) -> str:
+        return identifier.lower()
+
+
+class MixedCanonicalizer(Canonicalizer):
+    """Canonicalizes every identifier as its kind requires."""
+
+    def __init__(
+        self,
+        classify: Callable[[str], str | None],
+        canonicalizers: Mapping[str, Canonicalizer],
+    ) -> None:
+        self._classify = classify
+        self._canonicalizers = canonicalizers
+
+    def canonicalize(self, identifier: str) -> str:
+        canonicalizer = self._canonicalizers.get(self._classify(identifier) or "")
+
+        if canonicalizer is None:
+            return identifier
+
+        return canonicalizer.canonicalize(identifier)
@@ -0,0 +1,29 @@
+import pytest
+
+from app.readers import canonicalizer
+
+
+@pytest.mark.parametrize(
+    ("identifier", "expected"),
+    [
+        ("2001:0db8:0:0::1", "2001:db8::1"),
+        ("2001:DB8::1", "2001:db8::1"),
+        ("010.001.0.1", "010.001.0.1"),
+        ("127.0.0.1", "127.0.0.1"),
+    ],
+)
+def test_canonicalize_ip(identifier: str, expected: str) -> None:
+    assert canonicalizer.IpCanonicalizer().canonicalize(identifier) == expected
+
+
+@pytest.mark.parametrize(
+    ("identifier", "expected"),
+    [
+        ("HTTPS://FaceBook.com", "https://facebook.com/"),
+        ("https://facebook.com:443/", "https://facebook.com/"),
+        ("http://facebook.com:8080/a?b=1#top", "http://facebook.com:8080/a?b=1"),
+        ("http://User@FB.com/Path/", "http://User@fb.com/Path/"),
+    ],
+)
+def test_canonicalize_url(identifier: str, expected: str) -> None:
+    assert canonicalizer.UrlCanonicalizer().canonicalize(identifier) == expected
@@ -0,0 +1,143 @@
+import csv
+import io
+import pathlib
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
+
+import aiofiles
+import structlog
+
+from app.readers import errors, file_reader, filters
+
+_logger = structlog.get_logger(__name__)
+
+_MAX_RECORD_SIZE = 1024 * 1024
+
+
+class CsvFileReader(file_reader.FileReader):
+    """Reads identifiers out of one column of a CSV file.
+
+    ``column`` is either a header name, in which case the first row is the
+    header, or a zero-based index of a column in a file without a header.
+    The first column of a file without a header is read by default.
+    """
+
+    def __init__(
+        self,
+        source: pathlib.Path,
+        filter_: filters.IdentifiersFilter,
+        column: str | None = None,
+    ) -> None:
+        super().__init__(source, filter_)
+        self._column = column or "0"
+
+    async def _iter_raw_identifiers(self) -> AsyncIterator[str]:
+        async with aiofiles.open(self._source, newline="") as file:
+            rows = _iter_rows(file)
+
+            if self._column.isdigit():
+                index = int(self._column)
+            else:
+                index = await self._header_index(rows)
+
+            async for row in rows:
+                if index < len(row) and row[index].strip():
+                    yield row[index].strip()
+                elif row:
+                    _logger.warning("No identifier found in row {0}".format(row))
+
+    async def _header_index(self, rows: AsyncIterator[list[str]]) -> int:
+        header = await anext(rows, None)
+
+        if header is None or self._column not in header:
+            raise errors.InvalidInputContentError(
+                "Column {0} not found in the CSV header".format(self._column)
+            )
+
+        return header.index(self._column)
+
+
+class _LineFeed:
+    """Lines of the text fed last, which can be fed more once exhausted."""
+
+    def __init__(self) -> None:
+        self._lines: Iterator[str] = iter(())
+
+    def feed(self, text: str) -> None:
+        self._lines = io.StringIO(text, newline="")
+
+    def __iter__(self) -> "_LineFeed":
+        return self
+
+    def __next__(self) -> str:
+        return next(self._lines)
+
+
+async def _iter_rows(file: Any) -> AsyncIterator[list[str]]:
+    lines = _LineFeed()
+    rows = csv.reader(lines)
+
+    async for records in _iter_complete_records(file):
+        lines.feed(records)
+
+        for row in rows:
+            yield row
+
+
+async def _iter_complete_records(file: Any) -> AsyncIterator[str]:
+    """Yields the text of ``file`` cut at line ends outside quoted fields.
+
+    The reader never runs out of lines in the middle of a record, so quoted
+    fields may span lines and chunks. The quotes of every chunk are only
+    walked through when its last line end may be quoted, and a record
+    longer than ``_MAX_RECORD_SIZE`` is refused, as it's most likely a quote
+    left open.
+    """
+    partial = ""
+    is_quoted = False
+
+    async for chunk in file_reader.iter_chunks(file):
+        was_quoted = is_quoted
+        is_quoted ^= chunk.count('"') % 2 == 1
+        end = chunk.rfind("\n") + 1
+
+        # Whether the last line end is quoted follows from the quotes after it.
+        if is_quoted ^ (chunk.count('"', end) % 2 == 1):
+            end = _last_record_end(chunk, was_quoted)
+
+        if end:
+            yield partial + chunk[:end]
+            partial = chunk[end:]
+        else:
+            partial += chunk
+
+        if len(partial) > _MAX_RECORD_SIZE:
+            raise errors.InvalidInputContentError(
+                "A CSV record is longer than {0} characters,"
+                " a quote may be left open".format(_MAX_RECORD_SIZE)
+            )
+
+    if partial:
+        yield partial
+
+
+def _last_record_end(chunk: str, is_quoted: bool) -> int:
+    """Tells where the last line end outside quoted fields is in ``chunk``.
+
+    ``is_quoted`` tells whether ``chunk`` starts in a quoted field. The
+    returned index is just after the line end, or 0 without one.
+    """
+    end = position = 0
+
+    while True:
+        quote = chunk.find('"', position)
+
+        if not is_quoted:
+            line_end = chunk.rfind("\n", position, len(chunk) if quote < 0 else quote)
+            end = line_end + 1 if line_end >= 0 else end
+
+        if quote < 0:
+            return end
+
+        is_quoted = not is_quoted
+        position = quote + 1
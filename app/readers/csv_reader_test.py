@@ -0,0 +1,77 @@
+import pathlib
+
+import pytest
+
+from app.readers import csv_reader, errors, file_reader, filters, validator
+
+
+@pytest.fixture()
+def ip_filter(ip_validator: validator.Validator) -> filters.IdentifiersFilter:
+    return filters.IdentifiersFilter(ip_validator)
+
+
+@pytest.mark.parametrize(
+    ("content", "column"),
+    [
+        ("name,ip\nlocal,127.0.0.1\nlan,10.0.0.1\n", "ip"),
+        ("local,127.0.0.1\nlan,10.0.0.1\n", "1"),
+        ("127.0.0.1\n10.0.0.1\n", None),
+    ],
+)
+async def test_column_is_read(
+    tmp_path: pathlib.Path,
+    ip_filter: filters.IdentifiersFilter,
+    content: str,
+    column: str | None,
+) -> None:
+    source = tmp_path / "ips.csv"
+    source.write_text(content)
+
+    reader = csv_reader.CsvFileReader(source=source, filter_=ip_filter, column=column)
+
+    assert await reader.read() == ["127.0.0.1", "10.0.0.1"]
+
+
+async def test_missing_header_column_raises(
+    tmp_path: pathlib.Path,
+    ip_filter: filters.IdentifiersFilter,
+) -> None:
+    source = tmp_path / "ips.csv"
+    source.write_text("name,address\nlocal,127.0.0.1\n")
+
+    with pytest.raises(errors.InvalidInputContentError):
+        await csv_reader.CsvFileReader(
+            source=source, filter_=ip_filter, column="ip"
+        ).read()
+
+
+@pytest.mark.parametrize("chunk_size", [3, 64 * 1024])
+async def test_quoted_fields_may_span_lines_and_chunks(
+    tmp_path: pathlib.Path,
+    ip_filter: filters.IdentifiersFilter,
+    monkeypatch: pytest.MonkeyPatch,
+    chunk_size: int,
+) -> None:
+    monkeypatch.setattr(file_reader, "_CHUNK_SIZE", chunk_size)
+    source = tmp_path / "ips.csv"
+    source.write_text('note,ip\r\n"two\r\nlines",127.0.0.1\r\n"a ""b""",10.0.0.1\r\n')
+
+    reader = csv_reader.CsvFileReader(source=source, filter_=ip_filter, column="ip")
+
+    assert await reader.read() == ["127.0.0.1", "10.0.0.1"]
+
+
+async def test_unclosed_quote_raises(
+    tmp_path: pathlib.Path,
+    ip_filter: filters.IdentifiersFilter,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(file_reader, "_CHUNK_SIZE", 8)
+    monkeypatch.setattr(csv_reader, "_MAX_RECORD_SIZE", 64)
+    source = tmp_path / "ips.csv"
+    source.write_text('ip\n"127.0.0.1\n' + "10.0.0.1\n" * 100)
+
+    with pytest.raises(errors.InvalidInputContentError):
+        await csv_reader.CsvFileReader(
+            source=source, filter_=ip_filter, column="ip"
+        ).read()
@@ -0,0 +1,211 @@
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import mmap
+import os
+import pathlib
+import stat
+from collections.abc import AsyncIterator, Iterator, MutableMapping
+from typing import NamedTuple
+
+import structlog
+
+from app import managers, metrics
+from app.readers import errors, hash_cache
+
+_BATCH_FILES = 64
+_BATCH_BYTES = 64 * 1024 * 1024
+_MAX_PENDING_PER_WORKER = 4
+
+_DirectoryWalk = Iterator[tuple[str, list[str], list[str]]]
+
+
+class _File(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+
+
+class DirectoryReader(managers.IdentifierReader, managers.StreamingIdentifierReader):
+    """Reads the SHA-256 hashes of every regular file under ``source``.
+
+    Files are hashed in batches on ``executor``, typically a process pool,
+    while the tree is still being walked, so lookups start before every file
+    is hashed. Hashes found in ``hash_cache`` for unchanged files are read
+    first, the others follow in the order their batches were submitted.
+    The first path of every hash read is recorded in ``sources``, if given.
+    """
+
+    def __init__(
+        self,
+        source: pathlib.Path,
+        executor: concurrent.futures.Executor,
+        max_workers: int,
+        hash_cache_: hash_cache.HashCache | None = None,
+        sources: MutableMapping[str, str] | None = None,
+    ) -> None:
+        self._source = source
+        self._executor = executor
+        self._max_pending = max_workers * _MAX_PENDING_PER_WORKER
+        self._hash_cache = hash_cache_
+        self._sources = sources
+        self._logger = structlog.get_logger(__name__)
+
+    async def read(self) -> list[str]:
+        return [identifier async for identifier in self.iter_identifiers()]
+
+    async def iter_identifiers(self) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        pending: collections.deque[tuple[list[_File], asyncio.Future]] = (
+            collections.deque()
+        )
+        batch: list[_File] = []
+        batch_bytes = 0
+        has_files = False
+        walk = os.walk(self._source)
+
+        while (
+            files := await asyncio.to_thread(_scan_next_directory, walk)
+        ) is not None:
+            for file in files:
+                has_files = True
+                cached_hash = self._get_cached_hash(file)
+
+                if cached_hash is not None:
+                    yield cached_hash
+                    continue
+
+                batch.append(file)
+                batch_bytes += file.size
+
+                if len(batch) < _BATCH_FILES and batch_bytes < _BATCH_BYTES:
+                    continue
+
+                pending.append((batch, self._submit(loop, batch)))
+                batch = []
+                batch_bytes = 0
+
+                while pending and (
+                    len(pending) >= self._max_pending or pending[0][1].done()
+                ):
+                    for sha256 in await self._collect(*pending.popleft()):
+                        yield sha256
+
+        if batch:
+            pending.append((batch, self._submit(loop, batch)))
+
+        while pending:
+            for sha256 in await self._collect(*pending.popleft()):
+                yield sha256
+
+        if not has_files:
+            raise errors.InvalidInputContentError(
+                "No file found in {0}".format(self._source),
+            )
+
+    def _get_cached_hash(self, file: _File) -> str | None:
+        if self._hash_cache is None:
+            return None
+
+        sha256 = self._hash_cache.get(*file)
+
+        if sha256 is not None:
+            metrics.get_metrics().increment("files_total", outcome="cached")
+            self._record_source(sha256, file)
+
+        return sha256
+
+    def _submit(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        batch: list[_File],
+    ) -> asyncio.Future:
+        return loop.run_in_executor(
+            self._executor,
+            hash_files,
+            [file.path for file in batch],
+        )
+
+    async def _collect(
+        self,
+        batch: list[_File],
+        future: asyncio.Future,
+    ) -> list[str]:
+        run_metrics = metrics.get_metrics()
+        hashes = []
+
+        for file, sha256 in zip(batch, await future):
+            if sha256 is None:
+                run_metrics.increment("files_total", outcome="failed")
+                self._logger.warning("Can't read file {0}".format(file.path))
+                continue
+
+            run_metrics.increment("files_total", outcome="hashed")
+            run_metrics.increment("bytes_hashed_total", file.size)
+
+            if self._hash_cache is not None:
+                self._hash_cache.put(*file, sha256=sha256)
+
+            self._record_source(sha256, file)
+            hashes.append(sha256)
+
+        return hashes
+
+    def _record_source(self, sha256: str, file: _File) -> None:
+        if self._sources is not None:
+            self._sources.setdefault(sha256, file.path)
+
+
+def hash_file(path: str) -> str:
+    """Returns the SHA-256 of a file, read through a memory map."""
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        # Empty files can't be mapped.
+        if os.fstat(file.fileno()).st_size:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+                digest.update(mapped)
+
+    return digest.hexdigest()
+
+
+def hash_files(paths: list[str]) -> list[str | None]:
+    """Hashes a batch of files, ``None`` stands for an unreadable file."""
+    hashes: list[str | None] = []
+
+    for path in paths:
+        try:
+            hashes.append(hash_file(path))
+        except (OSError, ValueError):
+            hashes.append(None)
+
+    return hashes
+
+
+def _scan_next_directory(walk: _DirectoryWalk) -> list[_File] | None:
+    """Stats the regular files of the next directory, ``None`` at the end."""
+    try:
+        root, dir_names, file_names = next(walk)
+    except StopIteration:
+        return None
+
+    # Sorted, so every run reads the tree in the same order.
+    dir_names.sort()
+    files = []
+
+    for name in sorted(file_names):
+        path = os.path.join(root, name)
+
+        try:
+            file_stat = os.stat(path, follow_symlinks=False)
+        except OSError:
+            continue
+
+        if stat.S_ISREG(file_stat.st_mode):
+            files.append(_File(path, file_stat.st_size, file_stat.st_mtime_ns))
+
+    return files
@@ -0,0 +1,85 @@
+import concurrent.futures
+import hashlib
+import os
+import pathlib
+
+import pytest
+
+from app import metrics
+from app.readers import directory_reader, errors, hash_cache
+
+
+def _write_tree(root: pathlib.Path) -> dict[str, str]:
+    contents = {
+        "a.bin": b"a" * 100_000,
+        "nested/b.bin": b"b",
+        "nested/deeper/empty.bin": b"",
+    }
+
+    for name, content in contents.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+    return {
+        name: hashlib.sha256(content).hexdigest() for name, content in contents.items()
+    }
+
+
+async def _read(
+    root: pathlib.Path,
+    cache: hash_cache.HashCache,
+    sources: dict[str, str] | None = None,
+) -> list[str]:
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        reader = directory_reader.DirectoryReader(
+            source=root,
+            executor=executor,
+            max_workers=2,
+            hash_cache_=cache,
+            sources=sources,
+        )
+
+        return await reader.read()
+
+
+async def test_files_are_hashed(tmp_path: pathlib.Path) -> None:
+    hashes = _write_tree(tmp_path / "tree")
+    sources: dict[str, str] = {}
+
+    with hash_cache.HashCache(str(tmp_path / "hashes.db")) as cache:
+        read_hashes = await _read(tmp_path / "tree", cache, sources)
+
+    assert sorted(read_hashes) == sorted(hashes.values())
+    assert sources == {
+        sha256: str(tmp_path / "tree" / name) for name, sha256 in hashes.items()
+    }
+
+
+async def test_unchanged_files_are_not_rehashed(tmp_path: pathlib.Path) -> None:
+    hashes = _write_tree(tmp_path / "tree")
+    changed = tmp_path / "tree" / "a.bin"
+
+    with hash_cache.HashCache(str(tmp_path / "hashes.db")) as cache:
+        await _read(tmp_path / "tree", cache)
+
+    changed.write_bytes(b"changed")
+    os.utime(changed, ns=(0, 0))
+    run_metrics = metrics.reset()
+
+    with hash_cache.HashCache(str(tmp_path / "hashes.db")) as cache:
+        read_hashes = await _read(tmp_path / "tree", cache)
+
+    assert hashlib.sha256(b"changed").hexdigest() in read_hashes
+    assert hashes["a.bin"] not in read_hashes
+    assert run_metrics.summary()["counters"]["files_total"] == [
+        {"labels": {"outcome": "cached"}, "value": 2},
+        {"labels": {"outcome": "hashed"}, "value": 1},
+    ]
+
+
+async def test_empty_directory_raises(tmp_path: pathlib.Path) -> None:
+    with pytest.raises(errors.InvalidInputContentError):
+        with hash_cache.HashCache(str(tmp_path / "hashes.db")) as cache:
+            (tmp_path / "tree").mkdir()
+            await _read(tmp_path / "tree", cache)
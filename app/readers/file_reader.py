@@ -0,0 +1,54 @@
+import abc
+import pathlib
+from collections.abc import AsyncIterator
+from typing import Any
+
+from app import managers
+from app.readers import filters
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class FileReader(managers.IdentifierReader, managers.StreamingIdentifierReader):
+    """Base of the readers that parse identifiers lazily out of a file."""
+
+    def __init__(
+        self,
+        source: pathlib.Path,
+        filter_: filters.IdentifiersFilter,
+    ) -> None:
+        self._source = source
+        self._filter = filter_
+
+    async def read(self) -> list[str]:
+        return [identifier async for identifier in self.iter_identifiers()]
+
+    def iter_identifiers(self) -> AsyncIterator[str]:
+        return self._filter.iter_filter(self._iter_raw_identifiers())
+
+    @abc.abstractmethod
+    def _iter_raw_identifiers(self) -> AsyncIterator[str]:
+        pass
+
+
+async def iter_chunks(file: Any) -> AsyncIterator[str]:
+    """Reads ``file`` in chunks, one thread round trip per chunk."""
+    while chunk := await file.read(_CHUNK_SIZE):
+        yield chunk
+
+
+async def iter_line_batches(file: Any) -> AsyncIterator[list[str]]:
+    """Yields the lines of ``file``, without line endings, a chunk at a time.
+
+    The partial last line of a chunk is carried over to the next one.
+    """
+    partial = ""
+
+    async for chunk in iter_chunks(file):
+        lines = (partial + chunk).split("\n")
+        partial = lines.pop()
+
+        yield lines
+
+    if partial:
+        yield [partial]
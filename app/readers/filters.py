@@ -1,30 +1,122 @@
-from collections.abc import Sequence
+import asyncio
+import collections
+import concurrent.futures
+from collections.abc import AsyncIterable, AsyncIterator, Sequence
 
 import structlog
 
+from app import metrics
 from app.readers import errors
 from app.readers import validator as validator_module
 
+_CHUNK_SIZE = 1000
+_MAX_PENDING_CHUNKS = 8
+
 
 class IdentifiersFilter:
-    def __init__(self, validator: validator_module.Validator) -> None:
+    """Keeps the identifiers accepted by ``validator``.
+
+    Identifiers are validated in batches. Given an ``executor``, typically a
+    process pool, the batches are validated there in parallel.
+    """
+
+    def __init__(
+        self,
+        validator: validator_module.Validator,
+        executor: concurrent.futures.Executor | None = None,
+    ) -> None:
         self._validator = validator
+        self._executor = executor
         self._logger = structlog.get_logger(__name__)
 
     def filter(self, identifiers: Sequence[str]) -> list[str]:
-        valid_ids = []
+        if self._executor is None:
+            result = self._validator.validate_batch(identifiers)
+        else:
+            result = validator_module.validate_in_processes(
+                self._validator,
+                identifiers,
+                self._executor,
+            )
+
+        self._record_result(result)
+
+        if not result.valid:
+            raise errors.InvalidInputContentError(
+                "No valid identifier found in the input file"
+            )
+
+        return result.valid
+
+    async def iter_filter(
+        self,
+        identifiers: AsyncIterable[str],
+    ) -> AsyncIterator[str]:
+        """Lazy version of ``filter``, raises once the input is exhausted."""
+        has_valid_ids = False
+        max_pending = 1 if self._executor is None else _MAX_PENDING_CHUNKS
+        pending: collections.deque[asyncio.Future] = collections.deque()
+        chunks = _iter_chunks(identifiers)
+        is_exhausted = False
+
+        while not is_exhausted or pending:
+            if not is_exhausted and len(pending) < max_pending:
+                chunk = await anext(chunks, None)
 
-        for idf in identifiers:
-            try:
-                self._validator.validate(idf)
-            except ValueError:
-                self._logger.warning("Invalid identifier {0}".format(idf))
-            else:
-                valid_ids.append(idf)
+                if chunk is not None:
+                    pending.append(self._validate_chunk(chunk))
+                    continue
 
-        if not valid_ids:
+                is_exhausted = True
+                continue
+
+            result = await pending.popleft()
+            self._record_result(result)
+            has_valid_ids = has_valid_ids or bool(result.valid)
+
+            for idf in result.valid:
+                yield idf
+
+        if not has_valid_ids:
             raise errors.InvalidInputContentError(
                 "No valid identifier found in the input file"
             )
 
-        return valid_ids
+    def _validate_chunk(self, chunk: list[str]) -> asyncio.Future:
+        if self._executor is None:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(self._validator.validate_batch(chunk))
+
+            return future
+
+        return asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            self._validator.validate_batch,
+            chunk,
+        )
+
+    def _record_result(self, result: validator_module.BatchValidationResult) -> None:
+        run_metrics = metrics.get_metrics()
+        run_metrics.increment("identifiers_total", len(result.valid), outcome="valid")
+        run_metrics.increment(
+            "identifiers_total",
+            result.rejected_count,
+            outcome="rejected",
+        )
+
+        for idf in result.rejected:
+            self._logger.warning("Invalid identifier {0}".format(idf))
+
+
+async def _iter_chunks(identifiers: AsyncIterable[str]) -> AsyncIterator[list[str]]:
+    chunk = []
+
+    async for idf in identifiers:
+        chunk.append(idf)
+
+        if len(chunk) >= _CHUNK_SIZE:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
@@ -0,0 +1,63 @@
+import sqlite3
+import types
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+_COMMIT_EVERY = 1000
+
+
+class HashCache:
+    """SQLite-backed store of file hashes.
+
+    A hash is only returned while the size and modification time of the
+    file are the ones it was computed for, so changed files are rehashed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._uncommitted = 0
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: types.TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def get(self, path: str, size: int, mtime_ns: int) -> str | None:
+        row = self._connection.execute(
+            "SELECT sha256 FROM file_hashes"
+            " WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, size, mtime_ns),
+        ).fetchone()
+
+        return row[0] if row else None
+
+    def put(self, path: str, size: int, mtime_ns: int, sha256: str) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256)"
+            " VALUES (?, ?, ?, ?)",
+            (path, size, mtime_ns, sha256),
+        )
+        self._uncommitted += 1
+
+        if self._uncommitted >= _COMMIT_EVERY:
+            self._connection.commit()
+            self._uncommitted = 0
+
+    def close(self) -> None:
+        self._connection.commit()
+        self._connection.close()
@@ -1,31 +1,130 @@
 import json
-import pathlib
+from collections.abc import AsyncIterator
+from typing import Any
 
 import aiofiles
+import structlog
 
-from app import managers
-from app.readers import errors, filters
+from app.readers import errors, file_reader
 
+_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
 
-class JsonFileReader(managers.IdentifierReader):
-    def __init__(
-        self,
-        source: pathlib.Path,
-        filter_: filters.IdentifiersFilter,
-    ) -> None:
-        self._source = source
-        self._filter = filter_
+_logger = structlog.get_logger(__name__)
 
-    async def read(self) -> list[str]:
-        try:
-            async with aiofiles.open(self._source) as file:
-                identifiers = json.loads(await file.read())
-        except json.JSONDecodeError as ex:
-            raise errors.InvalidInputContentError from ex
 
-        if not identifiers or not isinstance(identifiers, list):
+class JsonFileReader(file_reader.FileReader):
+    """Reads a top-level JSON array of identifiers.
+
+    The array is parsed incrementally, one element at a time, so only a
+    chunk of the file is held in memory.
+    """
+
+    async def _iter_raw_identifiers(self) -> AsyncIterator[str]:
+        async with aiofiles.open(self._source) as file:
+            is_empty = True
+
+            async for element in _iter_array_elements(file):
+                is_empty = False
+
+                if isinstance(element, str):
+                    yield element
+                else:
+                    _logger.warning("Invalid identifier {0}".format(element))
+
+        if is_empty:
             raise errors.InvalidInputContentError(
                 "Input file must contain a non-empty array"
             )
 
-        return self._filter.filter(identifiers)
+
+class _ArrayParser:
+    def __init__(self, file: Any) -> None:
+        self._file = file
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._is_exhausted = False
+
+    async def next_char(self) -> str:
+        """Skips whitespace and returns the next character without consuming it."""
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in _WHITESPACE
+            ):
+                self._position += 1
+
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+
+            if not await self._read_chunk():
+                return ""
+
+    def consume(self) -> None:
+        self._position += 1
+
+    async def decode_value(self) -> Any:
+        await self.next_char()
+
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError as ex:
+                if not await self._read_chunk():
+                    raise errors.InvalidInputContentError from ex
+                continue
+
+            # A number at the end of the buffer may continue in the next chunk.
+            if end == len(self._buffer) and await self._read_chunk():
+                continue
+
+            self._position = end
+
+            return value
+
+    async def _read_chunk(self) -> bool:
+        if self._is_exhausted:
+            return False
+
+        chunk = await self._file.read(_CHUNK_SIZE)
+
+        if not chunk:
+            self._is_exhausted = True
+            return False
+
+        self._buffer = self._buffer[self._position :] + chunk
+        self._position = 0
+
+        return True
+
+
+async def _iter_array_elements(file: Any) -> AsyncIterator[Any]:
+    parser = _ArrayParser(file)
+
+    if await parser.next_char() != "[":
+        raise errors.InvalidInputContentError(
+            "Input file must contain a non-empty array"
+        )
+
+    parser.consume()
+
+    if await parser.next_char() == "]":
+        parser.consume()
+    else:
+        while True:
+            yield await parser.decode_value()
+
+            separator = await parser.next_char()
+            parser.consume()
+
+            if separator == "]":
+                break
+
+            if separator != ",":
+                raise errors.InvalidInputContentError(
+                    "Expected ',' or ']' after an array element"
+                )
+
+    if await parser.next_char():
+        raise errors.InvalidInputContentError("Unexpected data after the array")
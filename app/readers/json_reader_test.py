@@ -0,0 +1,42 @@
+import pathlib
+
+import pytest
+
+from app.readers import errors, filters, json_reader, validator
+
+
+@pytest.fixture()
+def ip_filter(ip_validator: validator.Validator) -> filters.IdentifiersFilter:
+    return filters.IdentifiersFilter(ip_validator)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+async def test_array_is_parsed_incrementally(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    ip_filter: filters.IdentifiersFilter,
+    chunk_size: int,
+) -> None:
+    monkeypatch.setattr(json_reader, "_CHUNK_SIZE", chunk_size)
+    source = tmp_path / "ips.json"
+    source.write_text('[ "127.0.0.1",\n"blabla", 12345, "10.0.0.1" ]\n')
+
+    reader = json_reader.JsonFileReader(source=source, filter_=ip_filter)
+
+    assert await reader.read() == ["127.0.0.1", "10.0.0.1"]
+
+
+@pytest.mark.parametrize(
+    "content",
+    ["", "[]", '{"ip": "127.0.0.1"}', '["127.0.0.1" "10.0.0.1"]', '["127.0.0.1"'],
+)
+async def test_invalid_array_raises(
+    tmp_path: pathlib.Path,
+    ip_filter: filters.IdentifiersFilter,
+    content: str,
+) -> None:
+    source = tmp_path / "ips.json"
+    source.write_text(content)
+
+    with pytest.raises(errors.InvalidInputContentError):
+        await json_reader.JsonFileReader(source=source, filter_=ip_filter).read()
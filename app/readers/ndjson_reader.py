@@ -0,0 +1,60 @@
+import json
+import pathlib
+from collections.abc import AsyncIterator
+from typing import Any
+
+import aiofiles
+import structlog
+
+from app.readers import errors, file_reader, filters
+
+_logger = structlog.get_logger(__name__)
+
+
+class NdjsonFileReader(file_reader.FileReader):
+    """Reads one JSON value per line.
+
+    A line holds either an identifier string or an object whose ``column``
+    key holds the identifier.
+    """
+
+    def __init__(
+        self,
+        source: pathlib.Path,
+        filter_: filters.IdentifiersFilter,
+        column: str | None = None,
+    ) -> None:
+        super().__init__(source, filter_)
+        self._column = column
+
+    async def _iter_raw_identifiers(self) -> AsyncIterator[str]:
+        async with aiofiles.open(self._source) as file:
+            async for line_number, line in _enumerate_lines(file):
+                if not line.strip():
+                    continue
+
+                try:
+                    value = json.loads(line)
+                except json.JSONDecodeError as ex:
+                    raise errors.InvalidInputContentError(
+                        "Line {0} isn't valid JSON".format(line_number)
+                    ) from ex
+
+                if isinstance(value, dict) and self._column is not None:
+                    value = value.get(self._column)
+
+                if isinstance(value, str):
+                    yield value
+                else:
+                    _logger.warning(
+                        "No identifier found on line {0}".format(line_number)
+                    )
+
+
+async def _enumerate_lines(file: Any) -> AsyncIterator[tuple[int, str]]:
+    line_number = 0
+
+    async for lines in file_reader.iter_line_batches(file):
+        for line in lines:
+            line_number += 1
+            yield line_number, line
@@ -0,0 +1,20 @@
+from collections.abc import AsyncIterator
+
+import aiofiles
+
+from app.readers import file_reader
+
+_COMMENT_PREFIX = "#"
+
+
+class TextFileReader(file_reader.FileReader):
+    """Reads one identifier per line, skipping blank and ``#`` comment lines."""
+
+    async def _iter_raw_identifiers(self) -> AsyncIterator[str]:
+        async with aiofiles.open(self._source) as file:
+            async for lines in file_reader.iter_line_batches(file):
+                for line in lines:
+                    identifier = line.strip()
+
+                    if identifier and not identifier.startswith(_COMMENT_PREFIX):
+                        yield identifier
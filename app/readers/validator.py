@@ -1,6 +1,38 @@
 import abc
+import concurrent.futures
+import dataclasses
+import ipaddress
+import itertools
+import re
+from collections.abc import Iterable, Iterator, Mapping
 
-import validators
+# Matches the most common shape of URLs (no port, query or fragment), always a
+# subset of what ``validators.url`` accepts, everything else falls back to it.
+_SIMPLE_URL_PATTERN = re.compile(
+    r"https?://"
+    r"(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63}"
+    r"(?:/[a-z0-9\-._~!$&'()*+,;=:@/%]*)?",
+    re.IGNORECASE,
+)
+# MD5, SHA-1 or SHA-256 hex digests, the file hashes VirusTotal is queried by.
+_HASH_PATTERN = re.compile(r"[0-9a-f]{32}|[0-9a-f]{40}|[0-9a-f]{64}", re.IGNORECASE)
+_CIDR_SEPARATOR = "/"
+_AUTHORITY_PREFIX = "://"
+_DEFAULT_CHUNK_SIZE = 10_000
+
+
+@dataclasses.dataclass
+class BatchValidationResult:
+    valid: list[str] = dataclasses.field(default_factory=list)
+    rejected: list[str] = dataclasses.field(default_factory=list)
+
+    @property
+    def rejected_count(self) -> int:
+        return len(self.rejected)
+
+    def extend(self, other: "BatchValidationResult") -> None:
+        self.valid.extend(other.valid)
+        self.rejected.extend(other.rejected)
 
 
 class Validator(abc.ABC):
@@ -8,9 +40,32 @@ class Validator(abc.ABC):
     def validate(self, identifier: str) -> None:
         pass
 
+    def is_valid(self, identifier: str) -> bool:
+        try:
+            self.validate(identifier)
+        except ValueError:
+            return False
+
+        return True
+
+    def validate_batch(self, identifiers: Iterable[str]) -> BatchValidationResult:
+        result = BatchValidationResult()
+
+        for identifier in identifiers:
+            if self.is_valid(identifier):
+                result.valid.append(identifier)
+            else:
+                result.rejected.append(identifier)
+
+        return result
+
 
 class IpValidator(Validator):
     def validate(self, identifier: str) -> None:
+        # Imported on first use, the validators package is slow to import and
+        # most identifiers never reach it.
+        import validators
+
         try:
             validators.ipv6(identifier, r_ve=True)
         except validators.ValidationError:
@@ -19,12 +74,87 @@ class IpValidator(Validator):
             except validators.ValidationError as ex:
                 raise ValueError from ex
 
+    def is_valid(self, identifier: str) -> bool:
+        try:
+            ipaddress.ip_address(identifier)
+        except ValueError:
+            # CIDR notation is accepted by the validators package only.
+            return _CIDR_SEPARATOR in identifier and super().is_valid(identifier)
+
+        return True
+
 
 class UrlValidator(Validator):
     def validate(self, identifier: str) -> None:
+        import validators
+
         try:
             validators.url(
                 identifier, skip_ipv4_addr=True, skip_ipv6_addr=True, r_ve=True
             )
         except validators.ValidationError as ex:
             raise ValueError from ex
+
+    def is_valid(self, identifier: str) -> bool:
+        if _SIMPLE_URL_PATTERN.fullmatch(identifier):
+            return True
+
+        # There is no host to validate without a scheme and an authority.
+        return _AUTHORITY_PREFIX in identifier and super().is_valid(identifier)
+
+
+class HashValidator(Validator):
+    def validate(self, identifier: str) -> None:
+        if not _HASH_PATTERN.fullmatch(identifier):
+            raise ValueError("{0} is not a file hash".format(identifier))
+
+
+class MixedValidator(Validator):
+    """Accepts identifiers of any of the given kinds.
+
+    The kinds are tried in order, so put the stricter ones first.
+    """
+
+    def __init__(self, validators_: Mapping[str, Validator]) -> None:
+        self._validators = validators_
+
+    def classify(self, identifier: str) -> str | None:
+        for kind, validator in self._validators.items():
+            if validator.is_valid(identifier):
+                return kind
+
+        return None
+
+    def validate(self, identifier: str) -> None:
+        if self.classify(identifier) is None:
+            raise ValueError(
+                "{0} is none of {1}".format(identifier, ", ".join(self._validators)),
+            )
+
+    def is_valid(self, identifier: str) -> bool:
+        return self.classify(identifier) is not None
+
+
+def validate_in_processes(
+    validator: Validator,
+    identifiers: Iterable[str],
+    executor: concurrent.futures.Executor,
+    chunk_size: int = _DEFAULT_CHUNK_SIZE,
+) -> BatchValidationResult:
+    """Validates chunks of identifiers in parallel, keeping their order."""
+    result = BatchValidationResult()
+
+    for chunk_result in executor.map(
+        validator.validate_batch,
+        _iter_chunks(identifiers, chunk_size),
+    ):
+        result.extend(chunk_result)
+
+    return result
+
+
+def _iter_chunks(identifiers: Iterable[str], chunk_size: int) -> Iterator[list[str]]:
+    iterator = iter(identifiers)
+
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
@@ -21,3 +21,59 @@ def test_validate_url(url_validator: validator.Validator) -> None:
 
     with pytest.raises(ValueError):
         url_validator.validate(_INVALID_URL)
+
+
+@pytest.mark.parametrize(
+    "identifier",
+    ["127.0.0.1", "2001:db8::1", "127.0.0.0/8", "127.0.0.1.1", "010.0.0.1", "bla"],
+)
+def test_ip_fast_path_matches_validate(
+    ip_validator: validator.Validator,
+    identifier: str,
+) -> None:
+    assert ip_validator.is_valid(identifier) == validator.Validator.is_valid(
+        ip_validator, identifier
+    )
+
+
+@pytest.mark.parametrize(
+    "identifier",
+    [
+        "https://facebook.com/a/b",
+        "http://fb.com:8080/?a=1#b",
+        "http://fb.com/?a",
+        "http://-fb.com",
+        "http://127.0.0.1",
+        "facebook.com",
+    ],
+)
+def test_url_fast_path_matches_validate(
+    url_validator: validator.Validator,
+    identifier: str,
+) -> None:
+    assert url_validator.is_valid(identifier) == validator.Validator.is_valid(
+        url_validator, identifier
+    )
+
+
+def test_validate_batch(ip_validator: validator.Validator) -> None:
+    result = ip_validator.validate_batch([_VALID_IP, _INVALID_IP, _VALID_IP])
+
+    assert result.valid == [_VALID_IP, _VALID_IP]
+    assert result.rejected_count == 1
+
+
+def test_mixed_validator_classifies(
+    ip_validator: validator.Validator,
+    url_validator: validator.Validator,
+) -> None:
+    mixed_validator = validator.MixedValidator(
+        {"ip_address": ip_validator, "url": url_validator},
+    )
+
+    assert mixed_validator.classify(_VALID_IP) == "ip_address"
+    assert mixed_validator.classify(_VALID_URL) == "url"
+    assert mixed_validator.classify(_INVALID_URL) is None
+    assert mixed_validator.validate_batch(
+        [_VALID_URL, _INVALID_IP, _VALID_IP],
+    ).valid == [_VALID_URL, _VALID_IP]
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import signal
+from collections.abc import Mapping
+from typing import NamedTuple
+from urllib import parse
+
+import httpx
+import structlog
+
+from app import metrics
+from app.api import client
+from app.readers import canonicalizer, validator
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+}
+_HEALTH_PATH = "/health"
+
+
+class Route(NamedTuple):
+    client: client.LookupClient
+    validator: validator.Validator
+    canonicalizer: canonicalizer.Canonicalizer
+
+
+class LookupServer:
+    """A minimal HTTP/1.1 JSON API in front of long-lived lookup clients.
+
+    ``GET /<route>/<identifier>`` answers with the VirusTotal response of the
+    percent-encoded identifier, e.g. ``/ip_addresses/8.8.8.8`` or
+    ``/urls/https%3A%2F%2Fexample.com%2F``. Connections are kept alive and
+    ``GET /health`` tells whether the server is up.
+    """
+
+    def __init__(self, routes: Mapping[str, Route]) -> None:
+        self._routes = routes
+        self._logger = structlog.get_logger(__name__)
+
+    async def serve(
+        self,
+        host: str,
+        port: int,
+        unix_socket: str | None = None,
+    ) -> None:
+        """Serves until SIGINT or SIGTERM."""
+        if unix_socket is None:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        else:
+            server = await asyncio.start_unix_server(
+                self.handle_connection,
+                path=unix_socket,
+            )
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop.set)
+
+        self._logger.info(
+            "Serving lookups",
+            address=unix_socket
+            or "http://{0}:{1}".format(host, server.sockets[0].getsockname()[1]),
+            routes=list(self._routes),
+        )
+
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signal_number)
+
+            if unix_socket is not None and os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+
+        self._logger.info("Server stopped")
+
+    async def handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+
+                if not request_line:
+                    break
+
+                keep_alive = not request_line.rstrip().endswith(b"HTTP/1.0")
+
+                while (header := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = header.decode("latin-1").partition(":")
+
+                    if name.strip().lower() == "connection":
+                        keep_alive = value.strip().lower() != "close"
+
+                status, body = await self.respond(request_line.decode("latin-1"))
+                writer.write(
+                    "HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\n"
+                    "Content-Length: {2}\r\nConnection: {3}\r\n\r\n".format(
+                        status,
+                        _REASONS[status],
+                        len(body),
+                        "keep-alive" if keep_alive else "close",
+                    ).encode("latin-1")
+                    + body,
+                )
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request_line: str) -> tuple[int, bytes]:
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            return _error(400, "Malformed request line")
+
+        if method != "GET":
+            return _error(405, "Only GET is supported")
+
+        path = parse.urlsplit(target).path
+
+        if path == _HEALTH_PATH:
+            return 200, b'{"status": "ok"}'
+
+        route_name, _, raw_identifier = path.lstrip("/").partition("/")
+        route = self._routes.get(route_name)
+
+        if route is None or not raw_identifier:
+            return _error(404, "Unknown endpoint {0}".format(path))
+
+        identifier = parse.unquote(raw_identifier)
+
+        if not route.validator.is_valid(identifier):
+            return _error(400, "Invalid identifier {0}".format(identifier))
+
+        metrics.get_metrics().increment("server_requests_total", route=route_name)
+
+        try:
+            response = await route.client.lookup(
+                route.canonicalizer.canonicalize(identifier),
+            )
+        except httpx.HTTPStatusError as ex:
+            upstream_status = ex.response.status_code
+
+            return _error(
+                404 if upstream_status == httpx.codes.NOT_FOUND else 502,
+                "VirusTotal answered {0}".format(upstream_status),
+            )
+        except httpx.HTTPError as ex:
+            return _error(502, "VirusTotal request failed: {0}".format(ex))
+        except Exception:
+            self._logger.exception("Lookup failed", identifier=identifier)
+
+            return _error(500, "Lookup failed")
+
+        return 200, response.model_dump_json(by_alias=True).encode()
+
+
+def _error(status: int, message: str) -> tuple[int, bytes]:
+    return status, json.dumps({"error": message}).encode()
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import httpx
+
+from app import conftest, server
+from app.readers import canonicalizer, validator
+
+
+def _lookup_server(
+    upstream: conftest.RecordingLookupClient,
+) -> server.LookupServer:
+    return server.LookupServer(
+        routes={
+            "ip_addresses": server.Route(
+                client=upstream,
+                validator=validator.IpValidator(),
+                canonicalizer=canonicalizer.IpCanonicalizer(),
+            ),
+        },
+    )
+
+
+async def test_lookup_over_a_kept_alive_connection(
+    upstream_client: conftest.RecordingLookupClient,
+) -> None:
+    tcp_server = await asyncio.start_server(
+        _lookup_server(upstream_client).handle_connection,
+        "127.0.0.1",
+        0,
+    )
+    port = tcp_server.sockets[0].getsockname()[1]
+
+    async with tcp_server:
+        async with httpx.AsyncClient(
+            base_url="http://127.0.0.1:{0}".format(port),
+        ) as http_client:
+            first = await http_client.get("/ip_addresses/2001:DB8::1")
+            second = await http_client.get("/ip_addresses/bla")
+
+    assert first.status_code == 200
+    assert first.json()["data"]["id"] == "2001:db8::1"
+    assert second.status_code == 400
+    assert upstream_client.lookups == ["2001:db8::1"]
+
+
+async def test_errors(failing_upstream_client: conftest.RecordingLookupClient) -> None:
+    lookup_server = _lookup_server(failing_upstream_client)
+
+    assert (await lookup_server.respond("GET /health HTTP/1.1"))[0] == 200
+    assert (await lookup_server.respond("POST /health HTTP/1.1"))[0] == 405
+    assert (await lookup_server.respond("GET /urls/x HTTP/1.1"))[0] == 404
+
+    status, body = await lookup_server.respond("GET /ip_addresses/1.1.1.1 HTTP/1.1")
+
+    assert status == 500
+    assert json.loads(body) == {"error": "Lookup failed"}
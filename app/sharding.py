@@ -0,0 +1,182 @@
+import asyncio
+import concurrent.futures
+import contextlib
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Mapping,
+    Sequence,
+)
+from multiprocessing import util as multiprocessing_util
+
+from app import metrics
+from app.api import client, models, rate_limit
+
+ShardLookup = Callable[
+    [list[str]],
+    tuple[list[models.LookupResult | None], metrics.RunMetrics],
+]
+Quotas = Mapping[str, rate_limit.Quota]
+LookuperFactory = Callable[
+    [contextlib.AsyncExitStack],
+    Awaitable[client.PartialResultsLookuper],
+]
+
+_quotas: Quotas | None = None
+_worker: "_Worker | None" = None
+
+
+class ShardedLookuper(client.PartialResultsLookuper):
+    """Looks up identifiers in several processes at once.
+
+    The identifiers are split into one contiguous shard per worker of
+    ``executor``, which looks it up with ``lookup_shard``, e.g. on the event
+    loop and HTTP client a worker process keeps for all of its shards. The
+    responses are joined in shard order, so they keep the order of the
+    identifiers, and the metrics of every shard are merged into the ones of
+    this process. Streamed identifiers are sharded in batches of
+    ``batch_size``.
+    """
+
+    def __init__(
+        self,
+        executor: concurrent.futures.Executor,
+        workers: int,
+        lookup_shard: ShardLookup,
+        batch_size: int = 1000,
+    ) -> None:
+        self._executor = executor
+        self._workers = workers
+        self._lookup_shard = lookup_shard
+        self._batch_size = batch_size
+
+    async def lookup_each(
+        self,
+        identifiers: Sequence[str],
+    ) -> list[models.LookupResult | None]:
+        loop = asyncio.get_running_loop()
+        shard_results = await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, self._lookup_shard, shard)
+                for shard in split_shards(identifiers, self._workers)
+            ),
+        )
+        run_metrics = metrics.get_metrics()
+        responses: list[models.LookupResult | None] = []
+
+        for shard_responses, shard_metrics in shard_results:
+            responses.extend(shard_responses)
+            run_metrics.merge(shard_metrics)
+
+        return responses
+
+    async def iter_lookup_each(
+        self,
+        identifiers: AsyncIterable[str],
+    ) -> AsyncIterator[tuple[str, models.LookupResult | None]]:
+        batch: list[str] = []
+
+        async for identifier in identifiers:
+            batch.append(identifier)
+
+            if len(batch) >= self._batch_size:
+                for item in zip(batch, await self.lookup_each(batch)):
+                    yield item
+
+                batch = []
+
+        if batch:
+            for item in zip(batch, await self.lookup_each(batch)):
+                yield item
+
+
+def split_shards(identifiers: Sequence[str], count: int) -> list[list[str]]:
+    """Splits identifiers into at most ``count`` contiguous, even shards."""
+    size, remainder = divmod(len(identifiers), count)
+    shards = []
+    start = 0
+
+    for index in range(min(count, len(identifiers))):
+        end = start + size + (index < remainder)
+        shards.append(list(identifiers[start:end]))
+        start = end
+
+    return shards
+
+
+def create_quotas(
+    keys: Sequence[str],
+    requests_per_minute: int | None,
+    requests_per_day: int | None,
+) -> Quotas:
+    """Creates the quota of every API key in memory shared by processes."""
+    return {
+        key: rate_limit.Quota(
+            buckets=rate_limit.create_quota_buckets(
+                requests_per_minute=requests_per_minute,
+                requests_per_day=requests_per_day,
+                bucket_type=rate_limit.SharedTokenBucket,
+            ),
+            pause_deadline=rate_limit.SharedPauseDeadline(),
+        )
+        for key in keys
+    }
+
+
+class _Worker:
+    """The event loop and lookuper a worker process keeps for every shard.
+
+    The lookuper, with its HTTP client and warmed up connections, is entered
+    once as the process starts and closed as it exits.
+    """
+
+    def __init__(self, enter_lookuper: LookuperFactory) -> None:
+        # A forked process starts with the metrics of its parent.
+        metrics.reset()
+        self._loop = asyncio.new_event_loop()
+        self._stack = contextlib.AsyncExitStack()
+        self._lookuper = self._loop.run_until_complete(enter_lookuper(self._stack))
+        multiprocessing_util.Finalize(self, self.close, exitpriority=10)
+
+    def lookup_each(
+        self,
+        identifiers: list[str],
+    ) -> tuple[list[models.LookupResult | None], metrics.RunMetrics]:
+        results = self._loop.run_until_complete(
+            self._lookuper.lookup_each(identifiers),
+        )
+        # The metrics since the last shard, so the parent merges each once.
+        shard_metrics = metrics.get_metrics()
+        metrics.reset()
+
+        return results, shard_metrics
+
+    def close(self) -> None:
+        self._loop.run_until_complete(self._stack.aclose())
+        self._loop.close()
+
+
+def init_worker(quotas: Quotas, enter_lookuper: LookuperFactory) -> None:
+    """Initializes a worker process with the quotas it shares with the others.
+
+    The lookuper ``lookup_shard`` looks up every shard with is entered here.
+    """
+    global _quotas, _worker
+    _quotas = quotas
+    _worker = _Worker(enter_lookuper)
+
+
+def get_quotas() -> Quotas | None:
+    return _quotas
+
+
+def lookup_shard(
+    identifiers: list[str],
+) -> tuple[list[models.LookupResult | None], metrics.RunMetrics]:
+    """Looks up a shard with the lookuper of this worker process."""
+    if _worker is None:
+        raise RuntimeError("The worker process isn't initialized")
+
+    return _worker.lookup_each(identifiers)
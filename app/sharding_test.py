@@ -0,0 +1,115 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+from collections.abc import AsyncIterable, AsyncIterator, Sequence
+
+from app import conftest, metrics, sharding
+from app.api import client, models
+
+_entered_lookupers = 0
+
+
+def _lookup_shard(
+    identifiers: list[str],
+    upstream: client.LookupClient,
+) -> tuple[list[models.LookupResult | None], metrics.RunMetrics]:
+    run_metrics = metrics.RunMetrics()
+    run_metrics.increment("lookups_total", len(identifiers))
+
+    async def lookup_each() -> list[models.LookupResult | None]:
+        return [
+            (
+                models.LookupResult.from_response(await upstream.lookup(identifier))
+                if identifier != "bad"
+                else None
+            )
+            for identifier in identifiers
+        ]
+
+    return asyncio.run(lookup_each()), run_metrics
+
+
+def test_split_shards_keeps_the_order() -> None:
+    assert sharding.split_shards(["a", "b", "c", "d", "e"], 3) == [
+        ["a", "b"],
+        ["c", "d"],
+        ["e"],
+    ]
+    assert sharding.split_shards(["a"], 3) == [["a"]]
+
+
+async def test_shards_are_joined_in_input_order(
+    upstream_client: conftest.RecordingLookupClient,
+) -> None:
+    run_metrics = metrics.reset()
+    identifiers = ["8.8.8.{0}".format(i) for i in range(7)]
+    identifiers[3] = "bad"
+
+    with concurrent.futures.ThreadPoolExecutor(3) as executor:
+        responses = await sharding.ShardedLookuper(
+            executor=executor,
+            workers=3,
+            lookup_shard=functools.partial(_lookup_shard, upstream=upstream_client),
+        ).lookup_each(identifiers)
+
+    assert [response.identifier if response else None for response in responses] == [
+        *identifiers[:3],
+        None,
+        *identifiers[4:],
+    ]
+    assert sorted(upstream_client.lookups) == sorted(
+        identifier for identifier in identifiers if identifier != "bad"
+    )
+    assert run_metrics.summary()["counters"]["lookups_total"][0]["value"] == 7
+
+
+class _EnteredCountLookuper(client.PartialResultsLookuper):
+    """Reports how many lookupers its process has entered as ``harmless``."""
+
+    async def lookup_each(
+        self,
+        identifiers: Sequence[str],
+    ) -> list[models.LookupResult | None]:
+        return [
+            models.LookupResult.from_response(
+                conftest.make_response(identifier, harmless=_entered_lookupers),
+            )
+            for identifier in identifiers
+        ]
+
+    async def iter_lookup_each(
+        self,
+        identifiers: AsyncIterable[str],
+    ) -> AsyncIterator[tuple[str, models.LookupResult | None]]:
+        async for identifier in identifiers:
+            (result,) = await self.lookup_each([identifier])
+            yield identifier, result
+
+
+async def _enter_lookuper(
+    stack: contextlib.AsyncExitStack,
+) -> client.PartialResultsLookuper:
+    global _entered_lookupers
+    _entered_lookupers += 1
+
+    return _EnteredCountLookuper()
+
+
+async def test_worker_keeps_its_lookuper_for_every_shard() -> None:
+    with concurrent.futures.ProcessPoolExecutor(
+        1,
+        initializer=sharding.init_worker,
+        initargs=({}, _enter_lookuper),
+    ) as executor:
+        lookuper = sharding.ShardedLookuper(
+            executor=executor,
+            workers=1,
+            lookup_shard=sharding.lookup_shard,
+        )
+        results = [
+            *await lookuper.lookup_each(["8.8.8.8"]),
+            *await lookuper.lookup_each(["8.8.4.4"]),
+        ]
+
+    assert [result.harmless if result else None for result in results] == [1, 1]
@@ -0,0 +1,100 @@
+"""Compares the adaptive scheduler with fixed concurrencies.
+
+Run with ``python -m benchmarks.concurrency [--max-in-flight N]``. The local
+stand-in answers 429 to requests beyond ``--max-in-flight`` at a time, so
+the best fixed --group-max-size is about that many. Every fixed size and the
+adaptive scheduler, started at the smallest size, look up the same
+identifiers in a fresh process. Successful lookups per second, failed
+lookups, retries and the samples of the adaptive concurrency limit show
+whether it converges on the best rate::
+
+    python -m benchmarks.concurrency --size 5000 --max-in-flight 20 \\
+        --group-max-sizes 4,10,20,40
+"""
+
+import json
+import pathlib
+import tempfile
+from typing import Any
+
+import click
+
+from benchmarks import fake_virustotal, lookup
+
+
+def _summarize(result: dict[str, Any]) -> dict[str, Any]:
+    succeeded = result["lookups"] - result["failed_lookups"]
+
+    return {
+        "succeeded_per_second": round(succeeded / result["wall_seconds"], 2),
+        "failed_lookups": result["failed_lookups"],
+        "retries": result["retries"],
+        "wall_seconds": result["wall_seconds"],
+    }
+
+
+@click.command()
+@click.option("--size", default=5000, show_default=True)
+@click.option("--group-max-sizes", default="4,10,20,40", show_default=True)
+@click.option("--adaptive-max-size", default=50, show_default=True)
+@click.option("--max-in-flight", default=20, show_default=True)
+@click.option("--latency", default="lognormal:0.05,0.3", show_default=True)
+@click.option("--retry-after", default=1.0, show_default=True)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+    default="concurrency-results.json",
+    show_default=True,
+)
+def main(
+    size: int,
+    group_max_sizes: str,
+    adaptive_max_size: int,
+    output: pathlib.Path,
+    **server_config: Any,
+) -> None:
+    sizes = [int(item) for item in group_max_sizes.split(",")]
+    config = fake_virustotal.ServerConfig(**server_config)
+    scenarios: dict[str, dict[str, Any]] = {}
+
+    with tempfile.TemporaryDirectory() as work_dir, fake_virustotal.serve_in_process(
+        config
+    ) as api_url:
+
+        def run(cli_args: list[str]) -> dict[str, Any]:
+            return lookup.run_scenario(
+                "ip",
+                size,
+                api_url,
+                ["--no-warm-up", *cli_args],
+                pathlib.Path(work_dir),
+            )
+
+        for group_max_size in sizes:
+            name = "fixed-{0}".format(group_max_size)
+            scenarios[name] = _summarize(
+                run(["--group-max-size", str(group_max_size)]),
+            )
+            click.echo(json.dumps({"scenario": name, **scenarios[name]}))
+
+        result = run(
+            [
+                "--scheduler",
+                "adaptive",
+                "--group-max-size",
+                str(min(sizes)),
+                "--adaptive-max-size",
+                str(adaptive_max_size),
+            ],
+        )
+        scenarios["adaptive"] = {
+            **_summarize(result),
+            "concurrency_limit": result["concurrency_limit"],
+        }
+        click.echo(json.dumps({"scenario": "adaptive", **scenarios["adaptive"]}))
+
+    output.write_text(json.dumps({"scenarios": scenarios}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
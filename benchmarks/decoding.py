@@ -0,0 +1,62 @@
+"""Compares the lean response decoding with the full payload one.
+
+Run with ``python -m benchmarks.decoding [--count N]``. The legacy path
+parses the body into dicts first and keeps every attribute, like the client
+did before responses were validated straight from bytes.
+"""
+
+import gc
+import json
+import pathlib
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import click
+
+from app.api import models
+
+_FIXTURE = pathlib.Path("app/api/fixtures/good_url_lookup.json")
+
+
+def _measure(decode: Callable[[bytes], Any], content: bytes, count: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    results = [decode(content) for _ in range(count)]
+    elapsed = time.perf_counter() - started_at
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+
+    return {
+        "microseconds_per_response": round(elapsed / count * 10**6, 2),
+        "bytes_per_response": retained // count,
+    }
+
+
+@click.command()
+@click.option("--count", default=2_000, show_default=True)
+def main(count: int) -> None:
+    content = _FIXTURE.read_bytes()
+    report = {
+        "payload_bytes": len(content),
+        "legacy": _measure(
+            lambda body: models.FullLookupResponse(**json.loads(body)),
+            content,
+            count,
+        ),
+        "full_payload": _measure(
+            models.FullLookupResponse.model_validate_json,
+            content,
+            count,
+        ),
+        "lean": _measure(models.LookupResponse.model_validate_json, content, count),
+    }
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""A local stand-in for the VirusTotal lookup endpoints.
+
+It answers ``/api/v3/ip_addresses/{ip}``, ``/api/v3/urls/{id}`` and
+``/api/v3/files/{hash}`` over HTTP/1.1 with keep-alive. Latency, error and
+rate-limit rates, the requests it serves at a time and payload size are
+configurable, so benchmarks can reproduce production conditions without
+spending quota. Run it standalone with
+``python -m benchmarks.fake_virustotal --port 8080``.
+"""
+
+import asyncio
+import base64
+import contextlib
+import dataclasses
+import hashlib
+import json
+import multiprocessing
+import random
+import time
+from collections.abc import Callable, Iterator
+
+import click
+
+_IP_PREFIX = "/api/v3/ip_addresses/"
+_URL_PREFIX = "/api/v3/urls/"
+_FILE_PREFIX = "/api/v3/files/"
+_REASONS = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Error"}
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Parses ``constant:S``, ``uniform:A,B``, ``exponential:MEAN`` or
+    ``lognormal:MEDIAN,SIGMA`` into a sampler of seconds."""
+    kind, _, raw_args = spec.partition(":")
+    args = [float(arg) for arg in raw_args.split(",") if arg]
+
+    if kind == "constant":
+        return lambda rnd: args[0]
+
+    if kind == "uniform":
+        return lambda rnd: rnd.uniform(args[0], args[1])
+
+    if kind == "exponential":
+        return lambda rnd: rnd.expovariate(1 / args[0])
+
+    if kind == "lognormal":
+        median, sigma = args
+
+        return lambda rnd: median * rnd.lognormvariate(0, sigma)
+
+    raise ValueError("Unknown latency distribution {0}".format(spec))
+
+
+@dataclasses.dataclass(frozen=True)
+class ServerConfig:
+    latency: str = "constant:0"
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 0.0
+    payload_bytes: int = 0
+    # Requests beyond this many in flight are answered with 429, 0 disables it.
+    max_in_flight: int = 0
+    seed: int = 0
+
+
+class FakeVirusTotal:
+    def __init__(self, config: ServerConfig) -> None:
+        self._config = config
+        self._latency = parse_latency(config.latency)
+        self._random = random.Random(config.seed)
+        self._padding = "x" * config.payload_bytes
+        self._in_flight = 0
+        self.requests = 0
+
+    async def serve(self, host: str, port: int) -> asyncio.Server:
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+
+                if not request_line:
+                    break
+
+                keep_alive = True
+
+                while (header := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = header.decode("latin-1").partition(":")
+
+                    if name.lower() == "connection" and "close" in value.lower():
+                        keep_alive = False
+
+                _, path, _ = request_line.decode("latin-1").split(" ", 2)
+                status, headers, body = await self._respond(path)
+                head = "HTTP/1.1 {0} {1}\r\nContent-Length: {2}\r\n{3}\r\n".format(
+                    status,
+                    _REASONS[status],
+                    len(body),
+                    "".join("{0}: {1}\r\n".format(*item) for item in headers.items()),
+                )
+                writer.write(head.encode("latin-1") + body)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, path: str) -> tuple[int, dict[str, str], bytes]:
+        self.requests += 1
+
+        if 0 < self._config.max_in_flight <= self._in_flight:
+            return 429, {"Retry-After": str(self._config.retry_after)}, b""
+
+        self._in_flight += 1
+
+        try:
+            await asyncio.sleep(self._latency(self._random))
+        finally:
+            self._in_flight -= 1
+
+        roll = self._random.random()
+
+        if roll < self._config.rate_limit_rate:
+            return 429, {"Retry-After": str(self._config.retry_after)}, b""
+
+        if roll < self._config.rate_limit_rate + self._config.error_rate:
+            return 500, {}, b""
+
+        if path.startswith(_IP_PREFIX):
+            identifier, type_ = path[len(_IP_PREFIX) :], "ip_address"
+        elif path.startswith(_FILE_PREFIX):
+            identifier, type_ = path[len(_FILE_PREFIX) :], "file"
+        elif path.startswith(_URL_PREFIX):
+            url = base64.b64decode(path[len(_URL_PREFIX) :])
+            identifier, type_ = hashlib.sha256(url).hexdigest(), "url"
+        else:
+            return 404, {}, b""
+
+        return (
+            200,
+            {"Content-Type": "application/json"},
+            json.dumps(self._payload(identifier, type_)).encode(),
+        )
+
+    def _payload(self, identifier: str, type_: str) -> dict:
+        stats = {
+            "harmless": self._random.randint(0, 70),
+            "malicious": self._random.randint(0, 5),
+            "suspicious": self._random.randint(0, 2),
+            "timeout": 0,
+            "undetected": self._random.randint(0, 30),
+        }
+
+        return {
+            "data": {
+                "id": identifier,
+                "type": type_,
+                "attributes": {
+                    "last_analysis_date": int(time.time()),
+                    "last_analysis_stats": stats,
+                    "padding": self._padding,
+                },
+            },
+        }
+
+
+def _serve_forever(config: ServerConfig, host: str, port: int, ready) -> None:
+    async def main() -> None:
+        server = await FakeVirusTotal(config).serve(host, port)
+        ready.put(server.sockets[0].getsockname()[1])
+
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+@contextlib.contextmanager
+def serve_in_process(config: ServerConfig, host: str = "127.0.0.1") -> Iterator[str]:
+    """Runs the server in a child process and yields its base URL.
+
+    A separate process keeps the server's CPU time out of the measurements.
+    """
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    process = context.Process(
+        target=_serve_forever,
+        args=(config, host, 0, ready),
+        daemon=True,
+    )
+    process.start()
+
+    try:
+        yield "http://{0}:{1}".format(host, ready.get(timeout=30))
+    finally:
+        process.terminate()
+        process.join()
+
+
+class _PortPrinter:
+    def __init__(self, host: str) -> None:
+        self._host = host
+
+    def put(self, port: int) -> None:
+        click.echo("Serving on http://{0}:{1}".format(self._host, port))
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8080, show_default=True)
+@click.option("--latency", default="constant:0", show_default=True)
+@click.option("--error-rate", default=0.0, show_default=True)
+@click.option("--rate-limit-rate", default=0.0, show_default=True)
+@click.option("--retry-after", default=0.0, show_default=True)
+@click.option("--payload-bytes", default=0, show_default=True)
+@click.option("--max-in-flight", default=0, show_default=True)
+def main(host: str, port: int, **config) -> None:
+    _serve_forever(ServerConfig(**config), host, port, _PortPrinter(host))
+
+
+if __name__ == "__main__":
+    main()
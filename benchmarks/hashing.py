@@ -0,0 +1,91 @@
+"""Measures the file hashing throughput of ``lookup_files``.
+
+Run with ``python -m benchmarks.hashing [--files N] [--file-size BYTES]``. A
+tree of random files is hashed with buffered reads in one process, with
+memory-mapped reads in one process, and by the directory reader on a process
+pool. The files are read once beforehand, so the numbers are for a warm page
+cache, i.e. the upper bound a disk can't exceed.
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+import time
+
+import click
+
+from app.readers import directory_reader
+
+
+def _write_tree(root: pathlib.Path, files: int, file_size: int) -> list[str]:
+    paths = []
+
+    for index in range(files):
+        path = root / "{0:03d}".format(index % 100) / "{0}.bin".format(index)
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(os.urandom(file_size))
+        paths.append(str(path))
+
+    return paths
+
+
+def _buffered_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def _throughput(total_bytes: int, elapsed: float) -> dict:
+    return {
+        "seconds": round(elapsed, 3),
+        "mib_per_second": round(total_bytes / elapsed / 2**20, 1),
+    }
+
+
+async def _read_directory(root: pathlib.Path, workers: int) -> list[str]:
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        return await directory_reader.DirectoryReader(
+            source=root,
+            executor=executor,
+            max_workers=workers,
+        ).read()
+
+
+@click.command()
+@click.option("--files", default=2_000, show_default=True)
+@click.option("--file-size", default=256 * 1024, show_default=True)
+@click.option("--workers", type=int, default=os.cpu_count(), show_default=True)
+def main(files: int, file_size: int, workers: int) -> None:
+    total_bytes = files * file_size
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        root = pathlib.Path(work_dir)
+        paths = _write_tree(root, files, file_size)
+        report: dict = {"files": files, "file_size": file_size, "workers": workers}
+
+        for name, hash_ in (
+            ("buffered", _buffered_hash),
+            ("mmap", directory_reader.hash_file),
+        ):
+            started_at = time.perf_counter()
+
+            for path in paths:
+                hash_(path)
+
+            report[name] = _throughput(total_bytes, time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        asyncio.run(_read_directory(root, workers))
+        report["directory_reader"] = _throughput(
+            total_bytes,
+            time.perf_counter() - started_at,
+        )
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Compares lookup tail latency with and without hedged requests.
+
+Run with ``python -m benchmarks.hedging [--latency SPEC]``. The same
+identifiers are looked up in a fresh process against the local stand-in,
+whose heavy-tailed latency makes a few lookups much slower than the rest,
+once without and once with ``--hedge``. Lookup latency percentiles, wall
+time and the share of lookups that sent a second request are reported::
+
+    python -m benchmarks.hedging --size 5000 --latency lognormal:0.05,1.0
+"""
+
+import json
+import pathlib
+import tempfile
+from typing import Any
+
+import click
+
+from benchmarks import fake_virustotal, lookup
+
+
+@click.command()
+@click.option("--size", default=5000, show_default=True)
+@click.option("--group-max-size", default=50, show_default=True)
+@click.option("--hedge-percentile", default=95.0, show_default=True)
+@click.option("--hedge-max-ratio", default=0.05, show_default=True)
+@click.option("--latency", default="lognormal:0.05,1.0", show_default=True)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+    default="hedging-results.json",
+    show_default=True,
+)
+def main(
+    size: int,
+    group_max_size: int,
+    hedge_percentile: float,
+    hedge_max_ratio: float,
+    output: pathlib.Path,
+    **server_config: Any,
+) -> None:
+    config = fake_virustotal.ServerConfig(**server_config)
+    scenarios: dict[str, dict[str, Any]] = {}
+    hedge_args = [
+        "--hedge",
+        "--hedge-percentile",
+        str(hedge_percentile),
+        "--hedge-max-ratio",
+        str(hedge_max_ratio),
+    ]
+
+    with tempfile.TemporaryDirectory() as work_dir, fake_virustotal.serve_in_process(
+        config
+    ) as api_url:
+        for name, cli_args in (("no-hedge", []), ("hedge", hedge_args)):
+            result = lookup.run_scenario(
+                "ip",
+                size,
+                api_url,
+                ["--no-warm-up", "--group-max-size", str(group_max_size), *cli_args],
+                pathlib.Path(work_dir),
+            )
+            scenarios[name] = {
+                "latency_seconds": result["latency_seconds"],
+                "wall_seconds": result["wall_seconds"],
+                "hedge_ratio": round(result["hedged_lookups"] / result["lookups"], 4),
+                "failed_lookups": result["failed_lookups"],
+            }
+            click.echo(json.dumps({"scenario": name, **scenarios[name]}))
+
+    output.write_text(json.dumps({"scenarios": scenarios}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
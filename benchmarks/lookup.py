@@ -0,0 +1,258 @@
+"""End-to-end throughput benchmark of the lookup commands.
+
+Every scenario runs ``lookup-ips``, ``lookup-urls`` or ``lookup-mixed`` (half
+IPs, half URLs) through the CLI in a fresh process against the local
+stand-in server, and reports requests per second, lookup latency
+percentiles, peak RSS and CPU time. Results are saved as JSON so runs of
+different versions can be compared::
+
+    python -m benchmarks.lookup --sizes 1000,10000 --group-max-sizes 4,16,50 \\
+        --latency lognormal:0.05,0.5 --output before.json
+"""
+
+import concurrent.futures
+import dataclasses
+import datetime
+import json
+import multiprocessing
+import pathlib
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+from collections.abc import Sequence
+from typing import Any
+
+import click
+
+from benchmarks import fake_virustotal
+
+_COMMANDS = {"ip": "lookup-ips", "url": "lookup-urls", "mixed": "lookup-mixed"}
+_KINDS = tuple(_COMMANDS)
+
+
+def _identifiers(kind: str, count: int) -> list[str]:
+    if kind == "mixed":
+        ips = _identifiers("ip", (count + 1) // 2)
+        urls = _identifiers("url", count // 2)
+
+        return [idf for pair in zip(ips, urls) for idf in pair] + ips[len(urls) :]
+
+    if kind == "ip":
+        return [
+            "10.{0}.{1}.{2}".format(i >> 16 & 255, i >> 8 & 255, i & 255)
+            for i in range(count)
+        ]
+
+    return ["https://host{0}.example.com/".format(i) for i in range(count)]
+
+
+def _percentile(latencies: Sequence[float], percent: int) -> float | None:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else None
+
+    return round(statistics.quantiles(latencies, n=100)[percent - 1], 4)
+
+
+def _run_scenario(
+    kind: str,
+    source: str,
+    api_url: str,
+    cli_args: Sequence[str],
+) -> dict[str, Any]:
+    # Imported in the scenario process only, so its import time and memory
+    # are part of what is measured.
+    from app import main as app_main
+    from app import metrics
+    from app.api import client
+
+    latencies: list[float] = []
+
+    def timed(lookup):
+        async def timed_lookup(self, identifier):
+            started_at = time.perf_counter()
+
+            try:
+                return await lookup(self, identifier)
+            finally:
+                latencies.append(time.perf_counter() - started_at)
+
+        return timed_lookup
+
+    # Timed where the orchestrator starts a lookup, so retries and hedged
+    # requests are part of the latency of the lookup they belong to.
+    orchestrator = client.VirusTotalClientOrchestrator
+    orchestrator._tracked_lookup = timed(  # type: ignore[method-assign]
+        orchestrator._tracked_lookup,
+    )
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        args = [
+            _COMMANDS[kind],
+            "--api-key",
+            "benchmark",
+            "--api-url",
+            api_url,
+            "--source",
+            source,
+            "--output",
+            str(pathlib.Path(output_dir) / "results.json"),
+            *cli_args,
+        ]
+        started_at = time.perf_counter()
+        app_main.cli.main(args, standalone_mode=False)
+        elapsed = time.perf_counter() - started_at
+
+    # Counted by the run itself, so lookups of --workers processes are
+    # included, their latencies aren't.
+    summary = metrics.get_metrics().summary()
+    lookups = _counter_total(summary, "lookups_total")
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return {
+        "wall_seconds": round(elapsed, 3),
+        "requests_per_second": round(lookups / elapsed, 2),
+        "lookups": lookups,
+        "failed_lookups": _counter_total(summary, "lookups_total", outcome="failure"),
+        "latency_seconds": {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+        },
+        "retries": _counter_total(summary, "request_retries_total"),
+        "hedged_lookups": _counter_total(summary, "hedged_lookups_total"),
+        "concurrency_limit": summary["gauges"].get("concurrency_limit"),
+        "peak_rss_kib": usage.ru_maxrss,
+        "cpu_seconds": round(
+            usage.ru_utime
+            + usage.ru_stime
+            + children_usage.ru_utime
+            + children_usage.ru_stime,
+            3,
+        ),
+    }
+
+
+def _counter_total(summary: dict[str, Any], name: str, **labels: str) -> float:
+    return sum(
+        series["value"]
+        for series in summary["counters"].get(name, [])
+        if labels.items() <= series["labels"].items()
+    )
+
+
+def run_scenario(
+    kind: str,
+    size: int,
+    api_url: str,
+    cli_args: Sequence[str],
+    work_dir: pathlib.Path,
+) -> dict[str, Any]:
+    source = work_dir / "{0}-{1}.json".format(kind, size)
+
+    if not source.exists():
+        source.write_text(json.dumps(_identifiers(kind, size)))
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        return executor.submit(
+            _run_scenario,
+            kind,
+            str(source),
+            api_url,
+            list(cli_args),
+        ).result()
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _csv_ints(ctx: click.Context, param: click.Parameter, value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+@click.command()
+@click.option("--kind", "kinds", type=click.Choice(_KINDS), multiple=True)
+@click.option("--sizes", default="1000", show_default=True, callback=_csv_ints)
+@click.option(
+    "--group-max-sizes", default="4,16,50", show_default=True, callback=_csv_ints
+)
+@click.option("--latency", default="lognormal:0.05,0.5", show_default=True)
+@click.option("--error-rate", default=0.0, show_default=True)
+@click.option("--rate-limit-rate", default=0.0, show_default=True)
+@click.option("--retry-after", default=0.0, show_default=True)
+@click.option("--payload-bytes", default=2000, show_default=True)
+@click.option("--max-in-flight", default=0, show_default=True)
+@click.option(
+    "--cli-args",
+    default="",
+    help="Extra options of the lookup command, e.g. '--stream'",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+    default="benchmark-results.json",
+    show_default=True,
+)
+def main(
+    kinds: Sequence[str],
+    sizes: list[int],
+    group_max_sizes: list[int],
+    cli_args: str,
+    output: pathlib.Path,
+    **server_config: Any,
+) -> None:
+    config = fake_virustotal.ServerConfig(**server_config)
+    scenarios = []
+
+    with tempfile.TemporaryDirectory() as work_dir, fake_virustotal.serve_in_process(
+        config
+    ) as api_url:
+        for kind in kinds or _KINDS:
+            for size in sizes:
+                for group_max_size in group_max_sizes:
+                    args = ["--group-max-size", str(group_max_size), *cli_args.split()]
+                    result = run_scenario(
+                        kind, size, api_url, args, pathlib.Path(work_dir)
+                    )
+                    scenarios.append(
+                        {
+                            "kind": kind,
+                            "size": size,
+                            "group_max_size": group_max_size,
+                            "cli_args": cli_args,
+                            **result,
+                        },
+                    )
+                    click.echo(json.dumps(scenarios[-1]))
+
+    output.write_text(
+        json.dumps(
+            {
+                "created_at": datetime.datetime.now().isoformat(),
+                "git_revision": _git_revision(),
+                "python": platform.python_version(),
+                "server": dataclasses.asdict(config),
+                "scenarios": scenarios,
+            },
+            indent=4,
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
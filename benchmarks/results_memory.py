@@ -0,0 +1,71 @@
+"""Measures the memory a run holds per result.
+
+Run with ``python -m benchmarks.results_memory [--count N]``. A batch run
+keeps every result until it's presented, as the slotted ``LookupResult``
+the orchestrator makes of each response. Decoded ``LookupResponse`` graphs
+and ``LookupResult`` records are built from the fixture response with
+distinct identifiers, and the bytes still allocated per item are reported.
+``python -m benchmarks.lookup`` shows the peak RSS of whole runs.
+"""
+
+import gc
+import json
+import pathlib
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import click
+
+from app.api import models
+
+_FIXTURE = pathlib.Path("app/api/fixtures/good_url_lookup.json")
+
+
+def _bodies(count: int) -> list[bytes]:
+    payload = json.loads(_FIXTURE.read_bytes())
+
+    def body(index: int) -> bytes:
+        payload["data"]["id"] = "{0:064x}".format(index)
+
+        return json.dumps(payload).encode()
+
+    return [body(index) for index in range(count)]
+
+
+def _measure(build: Callable[[bytes], Any], bodies: list[bytes]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    results = [build(body) for body in bodies]
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+
+    return retained // len(bodies)
+
+
+@click.command()
+@click.option("--count", default=20_000, show_default=True)
+def main(count: int) -> None:
+    bodies = _bodies(count)
+    response_bytes = _measure(models.LookupResponse.model_validate_json, bodies)
+    result_bytes = _measure(
+        lambda body: models.LookupResult.from_response(
+            models.LookupResponse.model_validate_json(body),
+        ),
+        bodies,
+    )
+    report = {
+        "count": count,
+        "bytes_per_response": response_bytes,
+        "bytes_per_result": result_bytes,
+        "gib_per_million_responses": round(response_bytes * 10**6 / 2**30, 2),
+        "gib_per_million_results": round(result_bytes * 10**6 / 2**30, 2),
+    }
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Measures the cold start of the CLI.
+
+Run with ``python -m benchmarks.startup [--runs N] [--output PATH]``. Every
+scenario starts the CLI in a fresh ``python -X importtime`` process: ``--help``,
+and ``lookup-ips`` and ``lookup-urls`` looking up one identifier against the
+local stand-in server. The median wall time, the median time spent importing
+and the heavy modules that got imported are reported per scenario.
+
+Given the results of an earlier run as ``--baseline``, the command exits with
+a non-zero status when the import time of a scenario grew by more than
+``--tolerance``, or when ``--help`` imports a heavy module, so it can gate
+changes::
+
+    python -m benchmarks.startup --output before.json
+    python -m benchmarks.startup --baseline before.json
+"""
+
+import json
+import pathlib
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Sequence
+from typing import Any
+
+import click
+
+from benchmarks import fake_virustotal
+
+# Modules that are slow to import and only some commands need.
+_HEAVY_MODULES = (
+    "aiofiles",
+    "h2",
+    "httpx",
+    "pydantic",
+    "sqlite3",
+    "validators",
+    "app.handlers",
+)
+_SCENARIOS = {
+    "help": ("--help",),
+    "lookup-ips": ("lookup-ips", "--reader", "text-file"),
+    "lookup-urls": ("lookup-urls", "--reader", "text-file"),
+}
+_IDENTIFIERS = {"lookup-ips": "8.8.8.8", "lookup-urls": "https://example.com/"}
+# ``import time: self [us] | cumulative | imported package``
+_IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)")
+
+
+def parse_import_times(stderr: str) -> tuple[float, list[str]]:
+    """Returns the total import time in ms and the names of the modules."""
+    total_us = 0
+    modules = []
+
+    for match in _IMPORT_TIME_PATTERN.finditer(stderr):
+        self_us, module = match.groups()
+        total_us += int(self_us)
+        modules.append(module)
+
+    return total_us / 1000, modules
+
+
+def _run_once(args: Sequence[str]) -> tuple[float, float, list[str]]:
+    started_at = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "app.main", *args],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - started_at) * 1000
+    import_ms, modules = parse_import_times(completed.stderr)
+
+    return wall_ms, import_ms, modules
+
+
+def _scenario_args(name: str, api_url: str, work_dir: pathlib.Path) -> list[str]:
+    args = list(_SCENARIOS[name])
+
+    if name == "help":
+        return args
+
+    source = work_dir / "{0}.txt".format(name)
+    source.write_text(_IDENTIFIERS[name])
+
+    return [
+        *args,
+        "--source",
+        str(source),
+        "--output",
+        str(work_dir / "{0}.json".format(name)),
+        "--api-key",
+        "benchmark",
+        "--api-url",
+        api_url,
+        "--no-warm-up",
+    ]
+
+
+def _run_scenario(args: Sequence[str], runs: int) -> dict[str, Any]:
+    wall_times = []
+    import_times = []
+    heavy_modules: set[str] = set()
+
+    for _ in range(runs):
+        wall_ms, import_ms, modules = _run_once(args)
+        wall_times.append(wall_ms)
+        import_times.append(import_ms)
+        heavy_modules.update(set(modules).intersection(_HEAVY_MODULES))
+
+    return {
+        "wall_ms": round(statistics.median(wall_times), 1),
+        "import_ms": round(statistics.median(import_times), 1),
+        "heavy_modules": sorted(heavy_modules),
+    }
+
+
+def find_regressions(
+    scenarios: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    tolerance: float,
+) -> list[str]:
+    regressions = []
+
+    if scenarios.get("help", {}).get("heavy_modules"):
+        regressions.append(
+            "--help imports {0}".format(", ".join(scenarios["help"]["heavy_modules"])),
+        )
+
+    for name, result in scenarios.items():
+        if name not in baseline:
+            continue
+
+        limit = baseline[name]["import_ms"] * (1 + tolerance)
+
+        if result["import_ms"] > limit:
+            regressions.append(
+                "{0} imports take {1} ms, more than {2:.1f} ms".format(
+                    name,
+                    result["import_ms"],
+                    limit,
+                ),
+            )
+
+    return regressions
+
+
+@click.command()
+@click.option("--scenario", "names", type=click.Choice(list(_SCENARIOS)), multiple=True)
+@click.option("--runs", type=click.IntRange(min=1), default=5, show_default=True)
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False, path_type=pathlib.Path),
+    required=False,
+    help="Results of an earlier run the import times are compared with",
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(min=0),
+    default=0.25,
+    show_default=True,
+    help="Import time growth over --baseline that fails the run",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+    default="startup-results.json",
+    show_default=True,
+)
+def main(
+    names: Sequence[str],
+    runs: int,
+    baseline: pathlib.Path | None,
+    tolerance: float,
+    output: pathlib.Path,
+) -> None:
+    scenarios = {}
+
+    with tempfile.TemporaryDirectory() as work_dir, fake_virustotal.serve_in_process(
+        fake_virustotal.ServerConfig(),
+    ) as api_url:
+        for name in names or _SCENARIOS:
+            scenarios[name] = _run_scenario(
+                _scenario_args(name, api_url, pathlib.Path(work_dir)),
+                runs,
+            )
+            click.echo(json.dumps({"scenario": name, **scenarios[name]}))
+
+    output.write_text(json.dumps({"scenarios": scenarios}, indent=4))
+
+    regressions = find_regressions(
+        scenarios,
+        json.loads(baseline.read_text())["scenarios"] if baseline else {},
+        tolerance,
+    )
+
+    for regression in regressions:
+        click.echo("Regression: {0}".format(regression), err=True)
+
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
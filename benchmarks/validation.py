@@ -0,0 +1,115 @@
+"""Compares per-identifier validation with the batch validation API.
+
+Run with ``python -m benchmarks.validation [--count N] [--workers N]``.
+"""
+
+import concurrent.futures
+import json
+import random
+import time
+from collections.abc import Callable
+
+import click
+
+from app.readers import validator
+
+_INVALID_SHARE = 0.1
+
+
+def _random_ips(count: int, rnd: random.Random) -> list[str]:
+    ips = []
+
+    for _ in range(count):
+        if rnd.random() < _INVALID_SHARE:
+            ips.append("{0}.{1}".format(rnd.randint(0, 999), rnd.randint(0, 999)))
+        elif rnd.random() < 0.5:
+            ips.append(".".join(str(rnd.randint(0, 255)) for _ in range(4)))
+        else:
+            ips.append(
+                ":".join("{0:x}".format(rnd.randint(0, 0xFFFF)) for _ in range(8))
+            )
+
+    return ips
+
+
+def _random_urls(count: int, rnd: random.Random) -> list[str]:
+    urls = []
+
+    for index in range(count):
+        if rnd.random() < _INVALID_SHARE:
+            urls.append(".host{0}.com".format(index))
+        else:
+            urls.append(
+                "https://host{0}.example.com/path/{1}".format(
+                    index,
+                    rnd.randint(0, 10**6),
+                )
+            )
+
+    return urls
+
+
+def _legacy_validate(validator_: validator.Validator, identifiers: list[str]) -> int:
+    valid = 0
+
+    for identifier in identifiers:
+        try:
+            validator_.validate(identifier)
+        except ValueError:
+            continue
+
+        valid += 1
+
+    return valid
+
+
+def _measure(func: Callable[[], int]) -> dict[str, float]:
+    started_at = time.perf_counter()
+    valid = func()
+    elapsed = time.perf_counter() - started_at
+
+    return {"seconds": round(elapsed, 4), "valid": valid}
+
+
+@click.command()
+@click.option("--count", default=100_000, show_default=True)
+@click.option("--workers", default=4, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+def main(count: int, workers: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    cases = {
+        "ip": (validator.IpValidator(), _random_ips(count, rnd)),
+        "url": (validator.UrlValidator(), _random_urls(count, rnd)),
+    }
+    report: dict[str, dict[str, dict[str, float]]] = {}
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        for name, (validator_, identifiers) in cases.items():
+            legacy = _measure(lambda: _legacy_validate(validator_, identifiers))
+            batch = _measure(
+                lambda: len(validator_.validate_batch(identifiers).valid),
+            )
+            parallel = _measure(
+                lambda: len(
+                    validator.validate_in_processes(
+                        validator_, identifiers, executor
+                    ).valid
+                ),
+            )
+            report[name] = {
+                "legacy": legacy,
+                "batch": batch,
+                "batch_processes": parallel,
+                "speedup": {
+                    "batch": round(legacy["seconds"] / batch["seconds"], 2),
+                    "batch_processes": round(
+                        legacy["seconds"] / parallel["seconds"], 2
+                    ),
+                },
+            }
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()